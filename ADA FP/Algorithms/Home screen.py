@@ -1,19 +1,75 @@
-import pygame
-import networkx as nx
-import pandas as pd
+import gc
+import os
+import random
 import time as time_module
+
+import numpy as np
+import pygame
 from pygame.locals import *
-import random
-import itertools
+from background import SolverJob
+from instrumentation import FrameStats, enable_from_env, span
+from query_cache import QueryCache
+from render_cache import BackgroundCache, TextCache
+from routing import DATA_PATH, RouteNetwork
+from spatial_index import GridIndex, project
+from viewport import Viewport, bundle_segments, most_important
+
+
+PLANE_IMAGE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                                'vecteezy_flying-airplane-isolated-on-background-3d-rendering_37277866.png')
+FPS = 60
+
+# Routing results kept between runs of the app, next to the data they came from
+QUERY_CACHE_PATH = DATA_PATH + '.querycache.json'
+QUERY_CACHE_SIZE = 1024
+
+# Beyond these many visible edges/airports only the route gets labels and full-size nodes
+MAX_EDGE_LABELS = 40
+MAX_NODE_LABELS = 60
+
+# Level of detail: at most these many routes and airports get drawn, the busiest first, and
+# routes landing on the same line of a ROUTE_BUNDLE_PIXELS grid are drawn once. The route
+# and its alternatives are always drawn in full.
+MAX_DRAWN_ROUTES = 1200
+MAX_DRAWN_AIRPORTS = 800
+ROUTE_BUNDLE_PIXELS = 3
+
+# Mouse wheel and +/- zoom by ZOOM_STEP, from half the whole-network view up to MAX_ZOOM
+# times it; arrow keys pan by PAN_STEP pixels
+ZOOM_STEP = 1.25
+MAX_ZOOM = 500
+PAN_STEP = 100
+
+# The map is drawn this many pixels past each window edge, so panning only moves the
+# drawn map until it runs out
+MAP_MARGIN = 200
+
+# Airport buttons shown at once on the route select screen
+AIRPORT_BUTTONS = 15
+
+# Next-best routes listed and drawn next to the optimal one
+ALTERNATIVE_ROUTES = 3
+
+
+def format_time(hours):
+    if hours is None:
+        return "N/A"
+    total_minutes = int(hours * 60)
+    hours = total_minutes // 60
+    minutes = total_minutes % 60
+    return f"{hours}h {minutes}m"
 
 
 class DropDown:
-    def __init__(self, rect, options, font):
+    def __init__(self, rect, options, text_cache):
         self.rect = rect
         self.options = ["None"] + options
-        self.font = font
+        self.text_cache = text_cache
         self.active = False
         self.selected = "None"
+        # Typing while the list is open narrows it down to options containing the text
+        self.filter_text = ""
+        self.matches = self.options
         self.scroll_offset = 0
         self.visible_options = 5
         self.option_height = 30
@@ -23,7 +79,7 @@ class DropDown:
     def _calculate_option_rects(self):
         self.option_rects = []
         start_idx = self.scroll_offset
-        end_idx = min(start_idx + self.visible_options, len(self.options))
+        end_idx = min(start_idx + self.visible_options, len(self.matches))
         
         for i in range(start_idx, end_idx):
             rect = pygame.Rect(
@@ -35,24 +91,47 @@ class DropDown:
             self.option_rects.append(rect)
 
     def handle_scroll(self, event):
-        if self.active and len(self.options) > self.visible_options:
+        if self.active and len(self.matches) > self.visible_options:
             if event.button == 4:  
                 self.scroll_offset = max(0, self.scroll_offset - 1)
             elif event.button == 5:  
-                self.scroll_offset = min(len(self.options) - self.visible_options, 
+                self.scroll_offset = min(len(self.matches) - self.visible_options, 
                                       self.scroll_offset + 1)
             self._calculate_option_rects()
 
+    def handle_key(self, event):
+        if not self.active:
+            return False
+        if event.key == pygame.K_BACKSPACE:
+            self.filter_text = self.filter_text[:-1]
+        elif event.key == pygame.K_ESCAPE:
+            self.filter_text = ""
+        elif event.unicode and (event.unicode.isalnum() or event.unicode == "-"):
+            self.filter_text += event.unicode.upper()
+        else:
+            return False
+        self._filter_options()
+        return True
+
+    def _filter_options(self):
+        if self.filter_text:
+            self.matches = [option for option in self.options if self.filter_text in option]
+        else:
+            self.matches = self.options
+        self.scroll_offset = 0
+        self._calculate_option_rects()
+
     def draw(self, screen, colors):
         # Draw the main dropdown button
         pygame.draw.rect(screen, colors['blue'], self.rect)
-        text = self.font.render(self.selected, True, colors['white'])
+        label = self.filter_text + "_" if self.active and self.filter_text else self.selected
+        text = self.text_cache.render(label, colors['white'])
         screen.blit(text, (self.rect.x + 5, self.rect.y + 5))
 
         # Draw the dropdown list when active
         if self.active:
             # Draw background for dropdown area
-            dropdown_height = min(len(self.options), self.visible_options) * self.option_height
+            dropdown_height = min(len(self.matches), self.visible_options) * self.option_height
             dropdown_bg = pygame.Rect(self.rect.x, self.rect.y + self.rect.height,
                                     self.rect.width, dropdown_height)
             pygame.draw.rect(screen, colors['blue'], dropdown_bg)
@@ -60,25 +139,25 @@ class DropDown:
             # Draw options
             for i, rect in enumerate(self.option_rects):
                 option_idx = i + self.scroll_offset
-                if option_idx < len(self.options):
+                if option_idx < len(self.matches):
                     pygame.draw.rect(screen, colors['blue'], rect)
                     # Highlight on hover
                     mouse_pos = pygame.mouse.get_pos()
                     if rect.collidepoint(mouse_pos):
                         pygame.draw.rect(screen, (100, 100, 255), rect)  
                     
-                    text = self.font.render(self.options[option_idx], True, colors['white'])
+                    text = self.text_cache.render(self.matches[option_idx], colors['white'])
                     screen.blit(text, (rect.x + 5, rect.y + 5))
             
             # Draw scroll indicators if needed
-            if len(self.options) > self.visible_options:
+            if len(self.matches) > self.visible_options:
                 if self.scroll_offset > 0:  # Up arrow
                     pygame.draw.polygon(screen, colors['white'],
                         [(self.rect.right - 20, self.rect.bottom + 10),
                          (self.rect.right - 10, self.rect.bottom + 20),
                          (self.rect.right - 30, self.rect.bottom + 20)])
                 
-                if self.scroll_offset < len(self.options) - self.visible_options:  
+                if self.scroll_offset < len(self.matches) - self.visible_options:  
                     bottom_y = self.rect.bottom + dropdown_height
                     pygame.draw.polygon(screen, colors['white'],
                         [(self.rect.right - 20, bottom_y - 10),
@@ -90,8 +169,8 @@ class DropDown:
             for i, rect in enumerate(self.option_rects):
                 if rect.collidepoint(pos):
                     option_idx = i + self.scroll_offset
-                    if option_idx < len(self.options):
-                        self.selected = self.options[option_idx]
+                    if option_idx < len(self.matches):
+                        self.selected = self.matches[option_idx]
                         self.active = False
                         return True
             # Click outside the dropdown area
@@ -112,6 +191,94 @@ class DropDown:
         return False
 
 
+class SimulationSession:
+    # Route, stats and animation state for one Simulate click. The route is computed
+    # once here, on the solver thread, draw_simulation only reads it and advances the
+    # plane one step per frame.
+    steps_per_leg = 90
+
+    def __init__(self, network, algorithm, start_airport, end_airport,
+                 airport_closure, route_closure, enable_delays, progress=None):
+        self.enable_delays = enable_delays
+        self.airport_closure = airport_closure
+
+        # Remove selected closed airport and routes, apply random delays if enabled.
+        # The seed keeps the drawn edge times and the routed times in step. A fresh seed
+        # never comes back, so delayed runs skip the query cache.
+        delay_seed = random.randrange(2**32) if enable_delays else None
+        self.edge_times = network.adjusted_edge_weights(airport_closure, route_closure,
+                                                        delay_seed=delay_seed)
+
+        # The hierarchy index is preprocessing, load or build it outside the timed run.
+        # A build reports through the same progress hook, so Cancel stops it too. With
+        # closures or delays 'ch' routes with Dijkstra, so there is nothing to build.
+        if (algorithm == 'ch' and delay_seed is None and airport_closure in (None, "None")
+                and route_closure in (None, "None")):
+            network.contraction_hierarchy(progress=progress)
+
+        # Collect first so the timed run doesn't pay for earlier garbage. Memory use isn't
+        # measured here: tracemalloc is process-wide, so it would count the UI thread's
+        # allocations and slow every frame; benchmark.py reports peak memory per engine.
+        gc.collect()
+        start_time = time_module.perf_counter()
+
+        hits = network.query_cache.hits if network.query_cache is not None else 0
+        result = network.find_route(
+            algorithm, start_airport, end_airport, airport_closure, route_closure,
+            delay_seed=delay_seed, progress=progress, use_cache=not enable_delays)
+        self.path, self.flight_time = result.path, result.flight_time
+        self.nodes_expanded = result.nodes_expanded
+        self.cached = network.query_cache is not None and network.query_cache.hits > hits
+
+        self.algorithm_time_ms = (time_module.perf_counter() - start_time) * 1000
+
+        # Next-best routes under the same closures and delays, outside the timed run
+        self.alternatives = []
+        if self.path is not None:
+            routes = network.alternative_routes(start_airport, end_airport, ALTERNATIVE_ROUTES + 1,
+                                                airport_closure, route_closure, delay_seed=delay_seed,
+                                                use_cache=not enable_delays)
+            self.alternatives = [route for route in routes if route.path != self.path][:ALTERNATIVE_ROUTES]
+
+        self.leg = 0
+        self.step = 0
+
+    def stats_lines(self):
+        delay_text = " (including delays)" if self.enable_delays else ""
+        return [
+            f"Flight time: {format_time(self.flight_time)}{delay_text}",
+            f"Algorithm Run Time: {self.algorithm_time_ms:.2f} ms{' (cached)' if self.cached else ''}",
+            f"Optimal Path: {' -> '.join(self.path)}",
+            f"Nodes Expanded: {self.nodes_expanded if self.nodes_expanded is not None else 'N/A'}",
+        ]
+
+    def alternative_lines(self):
+        if not self.alternatives:
+            return []
+        lines = ["Alternatives:"]
+        for i, route in enumerate(self.alternatives, start=2):
+            lines.append(f"{i}. {' -> '.join(route.path)}  {format_time(route.flight_time)}")
+        return lines
+
+    def plane_position(self, positions):
+        if len(self.path) < 2:
+            return positions[self.path[0]]
+        plane_pos = positions[self.path[self.leg]]
+        next_pos = positions[self.path[self.leg + 1]]
+        current_x = plane_pos[0] + (next_pos[0] - plane_pos[0]) * self.step / self.steps_per_leg
+        current_y = plane_pos[1] + (next_pos[1] - plane_pos[1]) * self.step / self.steps_per_leg
+        return int(current_x), int(current_y)
+
+    def advance(self):
+        # Move to the next leg when this one is done and loop back after the last
+        self.step += 1
+        if self.step >= self.steps_per_leg:
+            self.step = 0
+            self.leg += 1
+            if self.leg >= len(self.path) - 1:
+                self.leg = 0
+
+
 class FlightOptimizer:
     def __init__(self):
         pygame.init()
@@ -121,106 +288,61 @@ class FlightOptimizer:
         self.screen = pygame.display.set_mode((self.width, self.height))
         pygame.display.set_caption("Flight Route Optimizer")
         self.font = pygame.font.Font(None, 28)  
+        self.text_cache = TextCache(self.font)
+        self.background_cache = BackgroundCache((self.width + 2 * MAP_MARGIN, self.height + 2 * MAP_MARGIN))
+        # Viewport the cached map was drawn with, over the whole margin-padded surface
+        self.map_viewport = None
         self.colors = {
             'white': (255, 255, 255),
             'black': (0, 0, 0),
             'blue': (0, 0, 255),
             'red': (255, 0, 0),
             'green': (0, 255, 0),
-            'gray': (128, 128, 128)
+            'gray': (128, 128, 128),
+            'orange': (255, 165, 0)
         }
-        self.load_data()
+        self.network = RouteNetwork()
+        self.network.query_cache = QueryCache.load(QUERY_CACHE_PATH, QUERY_CACHE_SIZE)
+        self.G = self.network.G
+        self.airports = self.network.airports
+
+        # World positions from the projected airport coordinates, indexed for viewport queries
+        coordinates = self.network.coordinates
+        self.world_positions = project(coordinates[:, 0], coordinates[:, 1])
+        endpoints = self.network.csr.endpoints
+        self.node_index = GridIndex.from_points(self.world_positions, cell_size=5)
+        self.edge_index = GridIndex.from_segments(self.world_positions[endpoints[:, 0]],
+                                                  self.world_positions[endpoints[:, 1]], cell_size=5)
+        self.viewport = Viewport.fit(self.world_positions, (0, 0, self.width, self.height))
+        self.min_scale = self.viewport.scale / 2
+        self.max_scale = self.viewport.scale * MAX_ZOOM
+
+        # Busy airports and the routes between them stay on screen longest when zooming out
+        degree = np.diff(self.network.csr.offsets)
+        self.airport_importance = degree
+        self.route_importance = np.minimum(degree[endpoints[:, 0]], degree[endpoints[:, 1]])
+
+        self.plane_image = self.load_plane_image()
+        self.clock = pygame.time.Clock()
+        # F3 toggles the frame time overlay
+        self.frame_stats = FrameStats(FPS)
+        self.show_overlay = False
         self.reset_state()
 
         # Adjusted positions for dropdowns
         self.route_closure_dropdown = DropDown(
             pygame.Rect(400, 100, 150, 30),
             [f"{a}-{b}" for a, b in self.G.edges()],
-            self.font
+            self.text_cache
         )
         self.airport_closure_dropdown = DropDown(
             pygame.Rect(600, 100, 150, 30),
             list(self.G.nodes()),
-            self.font
+            self.text_cache
         )
 
- 
-        self.positions = {
-        "LCE": (100, 200),    
-        "GCM": (700, 200),    
-        "GJA": (100, 400),    
-        "PEU": (300, 150),    
-        "TGU": (500, 150),    
-        "RTB": (550, 250),    
-        "SAP": (300, 350),    
-        "UII": (50, 500),    
-        "CLT": (650, 500),    
-        "MIA": (400, 500)     
-    }
-
-
-
     def format_time(self, hours):
-        if hours is None:
-            return "N/A"
-        total_minutes = int(hours * 60)
-        hours = total_minutes // 60
-        minutes = total_minutes % 60
-        return f"{hours}h {minutes}m"
-
-    def load_data(self):
-        df = pd.read_csv(r'C:\Users\samue\OneDrive\Desktop\ADA FP\Preprocessing and scrapping\routes and distances.csv')
-        df['FlightTime_Hours'] = df.apply(lambda x: int(x['FlightTime'].split('h')[0]) +
-                                          int(x['FlightTime'].split('h')[1].split('m')[0])/60, axis=1)
-        self.airports = ['LCE', 'GCM', 'GJA', 'PEU', 'RTB', 'SAP', 'TGU', 'UII', 'CLT', 'MIA']
-
-        filtered_df = df[df['SourceAirport'].isin(self.airports) &
-                         df['DestinationAirport'].isin(self.airports)]
-
-        self.G = nx.Graph()
-        for _, row in filtered_df.iterrows():
-            self.G.add_edge(row['SourceAirport'], row['DestinationAirport'],
-                            weight=row['FlightTime_Hours'])
-    def brute_force_route_optimization_with_delays(self, graph, start_airport, end_airport):
-        min_flight_time = float('inf')
-        best_route = None
-
-        airports_to_permute = [airport for airport in self.airports 
-                            if airport != start_airport and airport != end_airport]
-
-        for num_intermediates in range(len(airports_to_permute) + 1):
-            # Store permutations explicitly
-            all_routes = list(itertools.permutations(airports_to_permute, num_intermediates))
-
-            for route in all_routes:
-                full_route = [start_airport] + list(route) + [end_airport]
-                total_time = 0
-                valid_route = True
-
-                for i in range(len(full_route) - 1):
-                    if graph.has_edge(full_route[i], full_route[i + 1]):
-                        total_time += graph[full_route[i]][full_route[i + 1]]['weight']
-                    else:
-                        valid_route = False
-                        break
-
-                if valid_route and total_time < min_flight_time:
-                    min_flight_time = total_time
-                    best_route = full_route
-
-        return best_route, min_flight_time
-
-
-    def dijkstra_route_optimization_with_delays(self, graph, start_airport, end_airport):
-        try:
-            shortest_path = nx.dijkstra_path(graph, source=start_airport, 
-                                           target=end_airport, weight='weight')
-            total_flight_time = nx.dijkstra_path_length(graph, source=start_airport, 
-                                                      target=end_airport, weight='weight')
-            return shortest_path, total_flight_time
-        except nx.NetworkXNoPath:
-            return None, None
-
+        return format_time(hours)
 
     def reset_state(self):
         self.state = 'algorithm_select'
@@ -230,6 +352,14 @@ class FlightOptimizer:
         self.enable_delays = False
         self.airport_closure = None
         self.route_closure = None
+        self.simulation = None
+        self.airport_filter = ""
+        # Background search started by Simulate, and why the last one gave no result
+        self.job = None
+        self.job_message = None
+        # Where the current map drag last was, and the view finish_search framed
+        self.drag_from = None
+        self.route_viewport = None
 
         if hasattr(self, 'route_closure_dropdown'):
             self.route_closure_dropdown.selected = "None"
@@ -238,53 +368,57 @@ class FlightOptimizer:
             self.airport_closure_dropdown.selected = "None"
             self.airport_closure_dropdown.active = False
 
+    def screen_position(self, airport):
+        return self.viewport.to_screen_point(self.world_positions[self.network.csr.index[airport]])
+
+    def visible_airports(self):
+        # Selected airports first, then the ones matching the typed search text
+        chosen = [a for a in (self.start_airport, self.end_airport) if a]
+        matches = (a for a in self.airports if a.startswith(self.airport_filter) and a not in chosen)
+        for airport in matches:
+            if len(chosen) >= AIRPORT_BUTTONS:
+                break
+            chosen.append(airport)
+        return chosen
+
     def draw_algorithm_select(self):
         self.screen.fill(self.colors['white'])
         buttons = {}
 
         # Main title
-        main_title = self.font.render("Plane Route Optimizer", True, self.colors['black'])
+        main_title = self.text_cache.render("Plane Route Optimizer", self.colors['black'])
         main_title_x = (self.width - main_title.get_width()) // 2
         main_title_y = 50
         self.screen.blit(main_title, (main_title_x, main_title_y))
 
         # Subtitle 
-        subtitle = self.font.render("Select Algorithm", True, self.colors['black'])
+        subtitle = self.text_cache.render("Select Algorithm", self.colors['black'])
         subtitle_x = (self.width - subtitle.get_width()) // 2
         subtitle_y = main_title_y + 150  
         self.screen.blit(subtitle, (subtitle_x, subtitle_y))
 
         # Make buttons wider and taller
-        button_width = 300
+        button_width = 180
         button_height = 80
-        button_spacing = 40  
-        
+        button_spacing = 12
+
         # Calculate center positions for buttons to be side by side
-        total_width = (button_width * 2) + button_spacing
+        engines = [('dijkstra', "Greedy Algorithm"), ('brute_force', "Brute Force"),
+                   ('astar', "A* Search"), ('ch', "Hierarchies")]
+        total_width = button_width * len(engines) + button_spacing * (len(engines) - 1)
         start_x = (self.width - total_width) // 2
-        start_y = subtitle_y + 100  
+        start_y = subtitle_y + 100
 
-        # Dijkstra button
-        dijkstra_rect = pygame.Rect(start_x, start_y, button_width, button_height)
-        pygame.draw.rect(self.screen, self.colors['blue'], dijkstra_rect)
-        
-        text = self.font.render("Greedy Algorithm", True, self.colors['white'])
-        text_x = dijkstra_rect.x + (button_width - text.get_width()) // 2
-        text_y = dijkstra_rect.y + (button_height - text.get_height()) // 2
-        self.screen.blit(text, (text_x, text_y))
-
-        # Brute Force button
-        brute_force_rect = pygame.Rect(start_x + button_width + button_spacing, start_y, 
-                                    button_width, button_height)
-        pygame.draw.rect(self.screen, self.colors['blue'], brute_force_rect)
-        
-        text = self.font.render("Brute Force", True, self.colors['white'])
-        text_x = brute_force_rect.x + (button_width - text.get_width()) // 2
-        text_y = brute_force_rect.y + (button_height - text.get_height()) // 2
-        self.screen.blit(text, (text_x, text_y))
+        for i, (key, label) in enumerate(engines):
+            rect = pygame.Rect(start_x + (button_width + button_spacing) * i, start_y,
+                               button_width, button_height)
+            pygame.draw.rect(self.screen, self.colors['blue'], rect)
 
-        buttons['dijkstra'] = dijkstra_rect
-        buttons['brute_force'] = brute_force_rect
+            text = self.text_cache.render(label, self.colors['white'])
+            text_x = rect.x + (button_width - text.get_width()) // 2
+            text_y = rect.y + (button_height - text.get_height()) // 2
+            self.screen.blit(text, (text_x, text_y))
+            buttons[key] = rect
 
         return buttons
 
@@ -293,19 +427,20 @@ class FlightOptimizer:
         buttons = {}
 
         # Title
-        title = self.font.render("Select Airports and Options", True, self.colors['black'])
+        title = self.text_cache.render("Select Airports and Options", self.colors['black'])
         self.screen.blit(title, (self.width // 2 - title.get_width() // 2, 10))
 
         # Error message for invalid airport closure
         if (self.airport_closure_dropdown.selected == self.start_airport or 
             self.airport_closure_dropdown.selected == self.end_airport):
-            error_msg = self.font.render("Cannot close selected start/end airport!", True, self.colors['red'])
+            error_msg = self.text_cache.render("Cannot close selected start/end airport!", self.colors['red'])
             self.screen.blit(error_msg, (self.width // 2 - error_msg.get_width() // 2, 40))
             # Reset the dropdown selection
             self.airport_closure_dropdown.selected = "None"
 
         # Airport selection area
-        airports_label = self.font.render("Airports:", True, self.colors['black'])
+        airports_label = self.text_cache.render(f"Airports (type to search): {self.airport_filter}",
+                                                self.colors['black'])
         self.screen.blit(airports_label, (30, 70))
 
         # Create a more compact grid layout for airports
@@ -315,7 +450,7 @@ class FlightOptimizer:
         button_height = 30
         airports_per_column = 5
 
-        for i, airport in enumerate(self.airports):
+        for i, airport in enumerate(self.visible_airports()):
             column = i // airports_per_column
             row = i % airports_per_column
             
@@ -330,19 +465,19 @@ class FlightOptimizer:
                 color = self.colors['red']
             
             pygame.draw.rect(self.screen, color, rect)
-            text = self.font.render(airport, True, self.colors['white'])
+            text = self.text_cache.render(airport, self.colors['white'])
             self.screen.blit(text, (rect.x + 5, rect.y + 5))
             
             buttons[f'airport_{airport}'] = rect
 
         # Draw dropdowns
         self.route_closure_dropdown.draw(self.screen, self.colors)
-        route_closure_text = self.font.render("Route Closure:", True, self.colors['black'])
+        route_closure_text = self.text_cache.render("Route Closure:", self.colors['black'])
         self.screen.blit(route_closure_text, (self.route_closure_dropdown.rect.x, 
                                             self.route_closure_dropdown.rect.y - 25))
 
         self.airport_closure_dropdown.draw(self.screen, self.colors)
-        airport_closure_text = self.font.render("Airport Closure:", True, self.colors['black'])
+        airport_closure_text = self.text_cache.render("Airport Closure:", self.colors['black'])
         self.screen.blit(airport_closure_text, (self.airport_closure_dropdown.rect.x, 
                                             self.airport_closure_dropdown.rect.y - 25))
 
@@ -350,7 +485,7 @@ class FlightOptimizer:
         delay_rect = pygame.Rect(self.width//2 - 160, self.height - 50, 150, 35)
         color = self.colors['green'] if self.enable_delays else self.colors['blue']
         pygame.draw.rect(self.screen, color, delay_rect)
-        text = self.font.render("Toggle Delays", True, self.colors['white'])
+        text = self.text_cache.render("Toggle Delays", self.colors['white'])
         self.screen.blit(text, (delay_rect.x + 5, delay_rect.y + 5))
         buttons['delay'] = delay_rect
 
@@ -358,187 +493,211 @@ class FlightOptimizer:
         simulate_rect = pygame.Rect(self.width//2 + 10, self.height - 50, 150, 35)
         simulate_color = self.colors['blue'] if self.start_airport and self.end_airport else self.colors['gray']
         pygame.draw.rect(self.screen, simulate_color, simulate_rect)
-        text = self.font.render("Simulate", True, self.colors['white'])
+        text = self.text_cache.render("Simulate", self.colors['white'])
         self.screen.blit(text, (simulate_rect.x + 5, simulate_rect.y + 5))
         buttons['simulate'] = simulate_rect
 
-        return buttons
-
-
+        if self.job is not None:
+            buttons = self.draw_progress()
+        elif self.job_message:
+            message = self.text_cache.render(self.job_message, self.colors['red'])
+            self.screen.blit(message, (self.width // 2 - message.get_width() // 2, self.height - 80))
 
+        return buttons
 
-    def draw_simulation(self):
-        import tracemalloc
-        import gc  # For garbage collection
-        
-        self.screen.fill(self.colors['white'])
-        buttons = {}
+    def draw_progress(self):
+        # Panel over the route select screen while the search runs; Cancel is the only
+        # button, so clicks can't change the query under the solver
+        panel = pygame.Rect(self.width // 2 - 220, self.height // 2 - 80, 440, 160)
+        pygame.draw.rect(self.screen, self.colors['white'], panel)
+        pygame.draw.rect(self.screen, self.colors['black'], panel, 2)
+
+        # The bar closes in on the shortest possible time as the best route found improves;
+        # the search keeps going after that until every other route is ruled out
+        expanded, best_time, lower_bound = self.job.progress
+        if self.algorithm == 'ch':
+            # Only the first 'ch' run reports anything, while it builds the index
+            fraction = expanded / len(self.airports)
+            lines = [f"Building the route index... {self.job.elapsed:.1f} s",
+                     f"Airports contracted: {expanded:,} of {len(self.airports):,}"]
+        else:
+            best = format_time(best_time) if best_time != float('inf') else "none yet"
+            fraction = lower_bound / best_time if lower_bound and best_time != float('inf') else 0.0
+            bound_text = f"   Shortest possible: {format_time(lower_bound)}" if lower_bound else ""
+            lines = [f"Searching... {self.job.elapsed:.1f} s{bound_text}",
+                     f"Routes explored: {expanded:,}   Best: {best}"]
+        for i, line in enumerate(lines):
+            # Rendered fresh, the numbers change every frame
+            text = self.font.render(line, True, self.colors['black'])
+            self.screen.blit(text, (panel.x + 15, panel.y + 12 + i * 25))
 
-        # Draw main menu button
-        main_menu_rect = pygame.Rect(10, 10, 150, 40)
-        pygame.draw.rect(self.screen, self.colors['red'], main_menu_rect)
-        main_menu_text = self.font.render("Main Menu", True, self.colors['white'])
-        self.screen.blit(main_menu_text, (main_menu_rect.x + 5, main_menu_rect.y + 5))
-        buttons['main_menu'] = main_menu_rect
+        bar = pygame.Rect(panel.x + 15, panel.y + 70, panel.width - 30, 20)
+        pygame.draw.rect(self.screen, self.colors['gray'], bar, 1)
+        filled = bar.copy()
+        filled.width = int(bar.width * min(fraction, 1.0))
+        pygame.draw.rect(self.screen, self.colors['blue'], filled)
 
-        adjusted_graph = self.G.copy()
+        cancel_rect = pygame.Rect(self.width // 2 - 60, panel.bottom - 50, 120, 35)
+        pygame.draw.rect(self.screen, self.colors['red'], cancel_rect)
+        text = self.text_cache.render("Cancel", self.colors['white'])
+        self.screen.blit(text, (cancel_rect.x + 5, cancel_rect.y + 5))
+        return {'cancel': cancel_rect}
 
-        # Remove selected closed airport and routes
-        if self.airport_closure_dropdown.selected != "None":
-            if self.airport_closure_dropdown.selected in adjusted_graph:
-                adjusted_graph.remove_node(self.airport_closure_dropdown.selected)
 
-        if self.route_closure_dropdown.selected != "None":
-            airports = self.route_closure_dropdown.selected.split("-")
-            if adjusted_graph.has_edge(*airports):
-                adjusted_graph.remove_edge(*airports)
 
-        # Apply random delays if enabled
-        if self.enable_delays:
-            for u, v in adjusted_graph.edges():
-                delay_factor = random.uniform(1.0, 1.5)
-                adjusted_graph[u][v]['weight'] *= delay_factor
 
+    def load_plane_image(self):
+        # Load and scale plane image once, fall back to a plain marker if it is missing
         try:
-            # Clear memory before starting
-            gc.collect()
-            tracemalloc.start()
-            
-            start_time = time_module.time()
-            
-            if self.algorithm == 'dijkstra':
-                path, flight_time = self.dijkstra_route_optimization_with_delays(
-                    adjusted_graph, self.start_airport, self.end_airport)
-            elif self.algorithm == 'brute_force':
-                path, flight_time = self.brute_force_route_optimization_with_delays(
-                    adjusted_graph, self.start_airport, self.end_airport)
-
-            # Get memory usage
-            current, peak = tracemalloc.get_traced_memory()
-            tracemalloc.stop()
-            
-            # Convert to MB
-            memory_mb = peak / 1024 / 1024
-
-            total_algorithm_time = time_module.time() - start_time
-            total_algorithm_time_ms = total_algorithm_time * 1000
-
-            if path is None or flight_time is None:
-                raise nx.NetworkXNoPath()
-
-            # Pre-render text
-            delay_text = " (including delays)" if self.enable_delays else ""
-            flight_time_text = f"Flight time: {self.format_time(flight_time)}{delay_text}"
-            algorithm_time_text = f"Algorithm Run Time: {total_algorithm_time_ms:.2f} ms"
-            path_text = f"Optimal Path: {' -> '.join(path)}"
-            memory_text = f"Memory Usage: {memory_mb:.2f} MB"
-           
-
-            text1 = self.font.render(flight_time_text, True, self.colors['black'])
-            text2 = self.font.render(algorithm_time_text, True, self.colors['black'])
-            text3 = self.font.render(path_text, True, self.colors['black'])
-            text4 = self.font.render(memory_text, True, self.colors['black'])
-
-            text1 = self.font.render(flight_time_text, True, self.colors['black'])
-            text2 = self.font.render(algorithm_time_text, True, self.colors['black'])
-            text3 = self.font.render(path_text, True, self.colors['black'])
-            text4 = self.font.render(memory_text, True, self.colors['black'])
-          
-
-            # Load and scale plane image
-            plane_image = pygame.image.load(r"C:\Users\samue\OneDrive\Desktop\ADA FP\vecteezy_flying-airplane-isolated-on-background-3d-rendering_37277866.png")
+            plane_image = pygame.image.load(PLANE_IMAGE_PATH)
             scale_factor = 0.02
             new_width = int(plane_image.get_width() * scale_factor)
             new_height = int(plane_image.get_height() * scale_factor)
-            plane_image = pygame.transform.scale(plane_image, (new_width, new_height))
+            return pygame.transform.scale(plane_image, (new_width, new_height))
+        except (pygame.error, FileNotFoundError):
+            plane_image = pygame.Surface((20, 20), pygame.SRCALPHA)
+            pygame.draw.polygon(plane_image, self.colors['black'], [(0, 0), (20, 10), (0, 20)])
+            return plane_image
+
+    def draw_network(self, surface, session, viewport):
+        csr = self.network.csr
+        path = session.path
+        path_ids = {csr.index[airport] for airport in path}
+        closed_id = csr.index.get(session.airport_closure)
+        screen = viewport.to_screen(self.world_positions)
+        screen_positions = screen.tolist()
+
+        # Only what the spatial index finds inside the viewport gets drawn
+        with span('render.cull'):
+            world_rect = viewport.world_rect
+            node_ids = self.node_index.query(world_rect)
+            in_view = np.zeros(len(csr.airports), dtype=bool)
+            in_view[node_ids] = True
+
+            # Open edges that start or end at an airport in view
+            edge_ids = self.edge_index.query(world_rect)
+            ends = csr.endpoints[edge_ids]
+            edge_ids = edge_ids[np.isfinite(session.edge_times[edge_ids]) &
+                                (in_view[ends[:, 0]] | in_view[ends[:, 1]])]
+        label_edges = len(edge_ids) <= MAX_EDGE_LABELS
+        detailed_nodes = len(node_ids) <= MAX_NODE_LABELS
+        # Zoomed out, minor airports and the routes between them drop out first
+        with span('render.lod'):
+            edge_ids = most_important(edge_ids, self.route_importance, MAX_DRAWN_ROUTES)
+            shown = [node for node in path_ids | {closed_id} if node is not None and in_view[node]]
+            node_ids = np.union1d(most_important(node_ids, self.airport_importance, MAX_DRAWN_AIRPORTS),
+                                  np.asarray(shown, dtype=np.int64))
+
+        surface.fill(self.colors['white'])
+
+        # Draw edges
+        with span('render.edges', edges=len(edge_ids)):
+            if label_edges:
+                for edge in edge_ids.tolist():
+                    u, v = csr.endpoints[edge].tolist()
+                    start_pos = screen_positions[u]
+                    end_pos = screen_positions[v]
+                    pygame.draw.line(surface, self.colors['gray'], start_pos, end_pos, 2)
+                    self.draw_edge_label(surface, session.edge_times[edge], start_pos, end_pos)
+            else:
+                # Dense view: thin lines, no labels, overlapping ones merged and drawn in one tight loop
+                ends = csr.endpoints[edge_ids]
+                segments = bundle_segments(screen[ends[:, 0]], screen[ends[:, 1]], ROUTE_BUNDLE_PIXELS)
+                line, gray = pygame.draw.line, self.colors['gray']
+                for x0, y0, x1, y1 in segments.tolist():
+                    line(surface, gray, (x0, y0), (x1, y1))
+
+        # Alternatives in orange underneath the optimal path
+        for route in session.alternatives:
+            for i in range(len(route.path) - 1):
+                start_pos = screen_positions[csr.index[route.path[i]]]
+                end_pos = screen_positions[csr.index[route.path[i + 1]]]
+                pygame.draw.line(surface, self.colors['orange'], start_pos, end_pos, 2)
+
+        # Draw the optimal path in red, keeping its leg times when the other labels are hidden
+        for i in range(len(path) - 1):
+            start_pos = screen_positions[csr.index[path[i]]]
+            end_pos = screen_positions[csr.index[path[i + 1]]]
+            pygame.draw.line(surface, self.colors['red'], start_pos, end_pos, 2)
+            if not label_edges:
+                edge = csr.edge_id(csr.index[path[i]], csr.index[path[i + 1]])
+                self.draw_edge_label(surface, session.edge_times[edge], start_pos, end_pos)
+
+        # Draw nodes
+        with span('render.nodes', airports=len(node_ids)):
+            for node in node_ids.tolist():
+                node_color = self.colors['blue']
+                if node in path_ids:
+                    node_color = self.colors['green']
+                if node == closed_id:
+                    node_color = self.colors['red']
+
+                position = screen_positions[node]
+                pygame.draw.circle(surface, node_color, position, 15 if detailed_nodes or node in path_ids else 3)
+                if detailed_nodes or node in path_ids:
+                    text = self.text_cache.render(csr.airports[node], self.colors['black'])
+                    surface.blit(text, (position[0] - 20, position[1] - 30))
+
+    def draw_panels(self, surface, session, main_menu_rect, main_menu_text):
+        pygame.draw.rect(surface, self.colors['red'], main_menu_rect)
+        surface.blit(main_menu_text, (main_menu_rect.x + 5, main_menu_rect.y + 5))
+
+        # Draw stats
+        for i, line in enumerate(session.stats_lines()):
+            text = self.text_cache.render(line, self.colors['black'])
+            surface.blit(text, (self.width // 2 - text.get_width() // 2, 10 + i * 30))
+
+        # Alternatives listed bottom left, on a panel so the map doesn't show through
+        texts = [self.text_cache.render(line, self.colors['black']) for line in session.alternative_lines()]
+        if texts:
+            top = self.height - 10 - len(texts) * 25
+            panel = pygame.Rect(5, top - 5, max(text.get_width() for text in texts) + 10, len(texts) * 25 + 10)
+            pygame.draw.rect(surface, self.colors['white'], panel)
+            pygame.draw.rect(surface, self.colors['orange'], panel, 2)
+            for i, text in enumerate(texts):
+                surface.blit(text, (10, top + i * 25))
+
+    def map_offset(self):
+        # Where the cached map goes on screen for the current view, None if it can't cover it
+        if self.map_viewport is None or self.map_viewport.scale != self.viewport.scale:
+            return None
+        x, y = self.viewport.to_screen_point(self.map_viewport.to_world((0, 0)))
+        if not (-2 * MAP_MARGIN <= x <= 0 and -2 * MAP_MARGIN <= y <= 0):
+            return None
+        return x, y
+
+    def draw_edge_label(self, surface, edge_time, start_pos, end_pos):
+        # Calculate label position
+        mid_x = (start_pos[0] + end_pos[0]) // 2
+        mid_y = (start_pos[1] + end_pos[1]) // 2
+        time_text = self.text_cache.render(self.format_time(edge_time), self.colors['black'])
+
+        offset = 10
+        if abs(end_pos[1] - start_pos[1]) < 100:
+            mid_y += offset
+
+        surface.blit(time_text, (mid_x - time_text.get_width()//2,
+                                mid_y - time_text.get_height()//2))
 
-            # Function to redraw the base visualization
-            def redraw_base():
-                self.screen.fill(self.colors['white'])
-                pygame.draw.rect(self.screen, self.colors['red'], main_menu_rect)
-                self.screen.blit(main_menu_text, (main_menu_rect.x + 5, main_menu_rect.y + 5))
-                
-                # Draw edges
-                for (u, v) in adjusted_graph.edges():
-                    start_pos = self.positions[u]
-                    end_pos = self.positions[v]
-                    pygame.draw.line(self.screen, self.colors['gray'], start_pos, end_pos, 2)
-                    
-                    # Calculate label position
-                    mid_x = (start_pos[0] + end_pos[0]) // 2
-                    mid_y = (start_pos[1] + end_pos[1]) // 2
-                    edge_time = adjusted_graph[u][v]['weight']
-                    time_text = self.font.render(self.format_time(edge_time), True, self.colors['black'])
-                    
-                    offset = 10
-                    if abs(end_pos[1] - start_pos[1]) < 100:
-                        mid_y += offset
-                    
-                    self.screen.blit(time_text, (mid_x - time_text.get_width()//2, 
-                                            mid_y - time_text.get_height()//2))
-
-                # Draw the optimal path in red
-                for i in range(len(path) - 1):
-                    u = path[i]
-                    v = path[i + 1]
-                    start_pos = self.positions[u]
-                    end_pos = self.positions[v]
-                    pygame.draw.line(self.screen, self.colors['red'], start_pos, end_pos, 2)
-
-                # Draw nodes
-                for node in adjusted_graph.nodes():
-                    node_color = self.colors['blue']
-                    if node in path:
-                        node_color = self.colors['green']
-                    if node == self.airport_closure_dropdown.selected:
-                        node_color = self.colors['red']
-                        
-                    pygame.draw.circle(self.screen, node_color, self.positions[node], 15)
-                    text = self.font.render(node, True, self.colors['black'])
-                    self.screen.blit(text, (self.positions[node][0] - 20, self.positions[node][1] - 30))
-
-                # Draw stats
-                self.screen.blit(text1, (self.width // 2 - text1.get_width() // 2, 10))
-                self.screen.blit(text2, (self.width // 2 - text2.get_width() // 2, 40))
-                self.screen.blit(text3, (self.width // 2 - text3.get_width() // 2, 70))
-                self.screen.blit(text4, (self.width // 2 - text4.get_width() // 2, 100))
-              
-
-            # Start animation
-            plane_pos = self.positions[path[0]]
-            for i in range(1, len(path)):
-                next_pos = self.positions[path[i]]
-                steps = 30
-                
-                for step in range(steps):
-                    redraw_base()
-                    
-                    # Calculate current position
-                    current_x = plane_pos[0] + (next_pos[0] - plane_pos[0]) * step / steps
-                    current_y = plane_pos[1] + (next_pos[1] - plane_pos[1]) * step / steps
-                    
-                    # Draw plane
-                    plane_rect = plane_image.get_rect(center=(int(current_x), int(current_y)))
-                    self.screen.blit(plane_image, plane_rect.topleft)
-                    
-                    pygame.display.flip()
-                    pygame.time.delay(50)
-                
-                plane_pos = next_pos
+    def draw_simulation(self):
+        session = self.simulation
+        buttons = {}
 
-        except (nx.NetworkXNoPath):
-            # Draw only error message without background graph
+        main_menu_rect = pygame.Rect(10, 10, 150, 40)
+        main_menu_text = self.text_cache.render("Main Menu", self.colors['white'])
+        buttons['main_menu'] = main_menu_rect
+
+        if session.path is None:
             self.screen.fill(self.colors['white'])
-            
-            # Redraw main menu button
             pygame.draw.rect(self.screen, self.colors['red'], main_menu_rect)
             self.screen.blit(main_menu_text, (main_menu_rect.x + 5, main_menu_rect.y + 5))
-            
-            error_text1 = self.font.render("No valid path available!", True, self.colors['red'])
-            error_text2 = self.font.render("Please check:", True, self.colors['black'])
-            error_text3 = self.font.render("- Airport closures", True, self.colors['black'])
-            error_text4 = self.font.render("- Route closures", True, self.colors['black'])
-            error_text5 = self.font.render("- Start/End airport selection", True, self.colors['black'])
+
+            # Draw only error message without background graph
+            error_text1 = self.text_cache.render("No valid path available!", self.colors['red'])
+            error_text2 = self.text_cache.render("Please check:", self.colors['black'])
+            error_text3 = self.text_cache.render("- Airport closures", self.colors['black'])
+            error_text4 = self.text_cache.render("- Route closures", self.colors['black'])
+            error_text5 = self.text_cache.render("- Start/End airport selection", self.colors['black'])
             
             # Position error messages
             y_start = 150
@@ -548,11 +707,95 @@ class FlightOptimizer:
             self.screen.blit(error_text3, (self.width // 2 - error_text3.get_width() // 2, y_start + spacing * 2))
             self.screen.blit(error_text4, (self.width // 2 - error_text4.get_width() // 2, y_start + spacing * 3))
             self.screen.blit(error_text5, (self.width // 2 - error_text5.get_width() // 2, y_start + spacing * 4))
+            return buttons
+
+        # Network and path come from the cached map, shifted to follow panning; it is only
+        # redrawn on zoom or once panning runs past its margin
+        with span('render.background'):
+            offset = self.map_offset()
+            if offset is None:
+                self.map_viewport = Viewport(self.viewport.to_world((self.width / 2, self.height / 2)),
+                                             self.viewport.scale, (0, 0) + self.background_cache.size)
+                offset = (-MAP_MARGIN, -MAP_MARGIN)
+            map_viewport = self.map_viewport
+            background = self.background_cache.get(
+                (session, map_viewport.center, map_viewport.scale),
+                lambda surface: self.draw_network(surface, session, map_viewport))
+            self.screen.fill(self.colors['white'])
+            self.screen.blit(background, offset)
+            self.draw_panels(self.screen, session, main_menu_rect, main_menu_text)
+
+        # Draw plane, one animation step per frame
+        with span('render.plane'):
+            positions = {airport: self.screen_position(airport) for airport in session.path}
+            plane_rect = self.plane_image.get_rect(center=session.plane_position(positions))
+            self.screen.blit(self.plane_image, plane_rect.topleft)
+            session.advance()
 
         return buttons
 
 
+    def start_search(self):
+        self.job_message = None
+        query = (self.network, self.algorithm, self.start_airport, self.end_airport,
+                 self.airport_closure_dropdown.selected, self.route_closure_dropdown.selected,
+                 self.enable_delays)
+
+        def solve(progress):
+            with span('simulate', algorithm=self.algorithm):
+                return SimulationSession(*query, progress=progress)
+
+        self.job = SolverJob(solve)
+
+    def finish_search(self):
+        # Called once the job is done: show the route, or say why there is none
+        job, self.job = self.job, None
+        if job.cancelled:
+            self.job_message = "Search cancelled"
+            return
+        if job.error is not None:
+            self.job_message = f"Search failed: {job.error}"
+            return
+        self.simulation = job.result
+        # Frame the route and its alternatives above the alternatives panel,
+        # or both selected airports when there is no route
+        framed = self.simulation.path or [self.start_airport, self.end_airport]
+        for route in self.simulation.alternatives:
+            framed = framed + route.path
+        panel_height = len(self.simulation.alternative_lines()) * 25
+        self.viewport = self.route_viewport = Viewport.fit(
+            [self.world_positions[self.network.csr.index[a]] for a in framed],
+            (0, 160, self.width, self.height - 160 - panel_height))
+        self.state = 'simulation'
+
+    def zoom(self, factor, anchor=None):
+        self.viewport = self.viewport.zoomed(factor, anchor, self.min_scale, self.max_scale)
+
+    def handle_map_event(self, event, buttons):
+        # Pan and zoom on the simulation map: wheel zooms around the cursor, dragging
+        # anywhere off the buttons pans. True when the event was used up here.
+        if event.type == pygame.MOUSEBUTTONDOWN:
+            if event.button in (4, 5):
+                self.zoom(ZOOM_STEP if event.button == 4 else 1 / ZOOM_STEP, event.pos)
+                return True
+            if event.button == 1 and not any(rect.collidepoint(event.pos) for rect in buttons.values()):
+                self.drag_from = event.pos
+                return True
+        elif event.type == pygame.MOUSEMOTION and self.drag_from is not None:
+            self.viewport = self.viewport.panned(event.pos[0] - self.drag_from[0],
+                                                 event.pos[1] - self.drag_from[1])
+            self.drag_from = event.pos
+            return True
+        elif event.type == pygame.MOUSEBUTTONUP and event.button == 1 and self.drag_from is not None:
+            self.drag_from = None
+            return True
+        return False
+
     def handle_click(self, pos, buttons):
+        if self.job is not None:
+            if 'cancel' in buttons and buttons['cancel'].collidepoint(pos):
+                self.job.cancel()
+            return
         if self.state == 'route_select':
             if self.route_closure_dropdown.handle_click(pos):
                 return
@@ -574,26 +817,81 @@ class FlightOptimizer:
                     elif key == 'delay':
                         self.enable_delays = not self.enable_delays
                     elif key == 'simulate' and self.start_airport and self.end_airport:
-                        self.state = 'simulation'
+                        self.start_search()
                 elif self.state == 'simulation':
                     if key == 'main_menu':
                         self.reset_state()
                         self.state = 'algorithm_select' 
     
 
+    def handle_key(self, event):
+        if event.key == pygame.K_F3:
+            self.show_overlay = not self.show_overlay
+            return
+        if self.state == 'simulation':
+            # Arrow keys pan, +/- zoom on the center, Home goes back to the route
+            steps = {pygame.K_LEFT: (PAN_STEP, 0), pygame.K_RIGHT: (-PAN_STEP, 0),
+                     pygame.K_UP: (0, PAN_STEP), pygame.K_DOWN: (0, -PAN_STEP)}
+            if event.key in steps:
+                self.viewport = self.viewport.panned(*steps[event.key])
+            elif event.key in (pygame.K_PLUS, pygame.K_EQUALS, pygame.K_KP_PLUS):
+                self.zoom(ZOOM_STEP)
+            elif event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+                self.zoom(1 / ZOOM_STEP)
+            elif event.key == pygame.K_HOME and self.route_viewport is not None:
+                self.viewport = self.route_viewport
+            return
+        if self.state != 'route_select':
+            return
+        if self.job is not None:
+            if event.key == pygame.K_ESCAPE:
+                self.job.cancel()
+            return
+        if self.route_closure_dropdown.handle_key(event):
+            return
+        if self.airport_closure_dropdown.handle_key(event):
+            return
+
+        # Anything else typed narrows down the airport buttons
+        if event.key == pygame.K_BACKSPACE:
+            self.airport_filter = self.airport_filter[:-1]
+        elif event.key == pygame.K_ESCAPE:
+            self.airport_filter = ""
+        elif event.unicode and event.unicode.isalnum():
+            self.airport_filter += event.unicode.upper()
+
+    def draw_overlay(self):
+        # Frame time against the FPS budget, top right. Rendered fresh each frame instead
+        # of through the text cache since the numbers keep changing.
+        lines = [self.font.render(line, True, self.colors['white'])
+                 for line in self.frame_stats.overlay_lines(self.clock.get_fps())]
+        if not lines:
+            return
+        width = max(line.get_width() for line in lines) + 10
+        panel = pygame.Rect(self.width - width - 5, 5, width, len(lines) * 22 + 6)
+        pygame.draw.rect(self.screen, self.colors['black'], panel)
+        for i, line in enumerate(lines):
+            self.screen.blit(line, (panel.x + 5, panel.y + 3 + i * 22))
+
     def run(self):
         running = True
         while running:
-            if self.state == 'algorithm_select':
-                buttons = self.draw_algorithm_select()
-            elif self.state == 'route_select':
-                buttons = self.draw_route_select()
-            elif self.state == 'simulation':
-                buttons = self.draw_simulation()
+            frame_start = time_module.perf_counter()
+            if self.job is not None and self.job.done:
+                self.finish_search()
+            with span('frame.draw', state=self.state):
+                if self.state == 'algorithm_select':
+                    buttons = self.draw_algorithm_select()
+                elif self.state == 'route_select':
+                    buttons = self.draw_route_select()
+                elif self.state == 'simulation':
+                    buttons = self.draw_simulation()
 
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
                     running = False
+                elif self.state == 'simulation' and self.handle_map_event(event, buttons):
+                    continue
                 elif event.type == pygame.MOUSEBUTTONDOWN:
                     pos = pygame.mouse.get_pos()
                     # Handle scrolling for dropdowns
@@ -602,11 +900,25 @@ class FlightOptimizer:
                         self.airport_closure_dropdown.handle_scroll(event)
                     else:
                         self.handle_click(pos, buttons)
-
-            pygame.display.flip()
+                elif event.type == pygame.KEYDOWN:
+                    self.handle_key(event)
+
+            if self.show_overlay:
+                self.draw_overlay()
+            with span('frame.flip'):
+                pygame.display.flip()
+            # Work done this frame, not counting the wait for the next tick
+            self.frame_stats.add(time_module.perf_counter() - frame_start)
+            self.clock.tick(FPS)
+        # The solver thread is a daemon, a search still running doesn't hold up the exit
+        if self.job is not None:
+            self.job.cancel()
+        self.network.query_cache.save()
         pygame.quit()
 
 
 if __name__ == "__main__":
+    # ADA_PROFILE=<prefix> records timings and writes <prefix>.json and <prefix>.trace.json on exit
+    enable_from_env()
     optimizer = FlightOptimizer()
     optimizer.run()
@@ -0,0 +1,58 @@
+import threading
+import time
+
+
+class Cancelled(Exception):
+    pass
+
+
+class SolverJob:
+    # Runs one solve on a daemon thread so the UI keeps drawing and handling events.
+    # The target is called with progress=job.report; the search calls it now and then,
+    # which publishes how far it got and raises Cancelled once cancel() was asked for.
+    # The UI polls `progress` and `done` each frame and never blocks on the thread.
+
+    def __init__(self, target, *args, **kwargs):
+        self.progress = (0, float('inf'), None)
+        self.result = None
+        self.error = None
+        self.started = time.perf_counter()
+        self.cancel_requested = threading.Event()
+        self.finished = threading.Event()
+        self.thread = threading.Thread(target=self._run, args=(target, args, kwargs), daemon=True)
+        self.thread.start()
+
+    def _run(self, target, args, kwargs):
+        try:
+            self.result = target(*args, progress=self.report, **kwargs)
+        except Cancelled:
+            pass
+        except Exception as error:
+            self.error = error
+        finally:
+            self.finished.set()
+
+    def report(self, nodes_expanded, best_time, lower_bound):
+        # One tuple assignment, so a reader on the UI thread never sees a torn update
+        self.progress = (nodes_expanded, best_time, lower_bound)
+        if self.cancel_requested.is_set():
+            raise Cancelled()
+
+    def cancel(self):
+        self.cancel_requested.set()
+
+    @property
+    def done(self):
+        return self.finished.is_set()
+
+    @property
+    def cancelled(self):
+        # Cancel wins even when the solve finished before noticing it
+        return self.done and self.cancel_requested.is_set()
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def wait(self, timeout=None):
+        return self.finished.wait(timeout)
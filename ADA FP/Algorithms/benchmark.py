@@ -0,0 +1,223 @@
+import argparse
+import csv
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from collections import deque
+
+import numpy as np
+
+from geo import AVERAGE_SPEED_KMH, haversine
+from instrumentation import export, recorder
+from parallel import RoutingPool
+from routing import ALGORITHMS, DATA_PATH, RouteNetwork
+
+
+# Engines that enumerate simple paths and blow up on big graphs
+EXHAUSTIVE_ENGINES = {'brute_force'}
+
+RESULT_FIELDS = ['case', 'source', 'airports', 'routes', 'density', 'engine', 'queries', 'repeat',
+                 'warmup', 'min_ms', 'median_ms', 'mean_ms', 'stdev_ms', 'peak_memory_mb',
+                 'mean_nodes_expanded', 'routes_found']
+
+
+def synthetic_network(num_airports, density, seed):
+    # Random airports over the inhabited latitudes, each pair linked with probability
+    # `density` plus a chain through all of them so every query has an answer.
+    # Flight times follow the notebook: great-circle distance / 850 km/h.
+    rng = np.random.default_rng(seed)
+    coordinates = np.column_stack([rng.uniform(-50, 60, num_airports),
+                                   rng.uniform(-150, 150, num_airports)])
+    u, v = np.triu_indices(num_airports, k=1)
+    linked = rng.random(len(u)) < density
+    linked[(v - u) == 1] = True
+    edges = np.column_stack([u[linked], v[linked]]).astype(np.int32)
+
+    lat, lon = coordinates[:, 0], coordinates[:, 1]
+    weights = haversine(lat[edges[:, 0]], lon[edges[:, 0]], lat[edges[:, 1]], lon[edges[:, 1]]) / AVERAGE_SPEED_KMH
+    airports = np.array([f"S{i:04d}" for i in range(num_airports)])
+    return RouteNetwork.from_edge_list(airports, edges, weights, coordinates)
+
+
+def hub_subset(network, size):
+    # `size` airports grown breadth-first from the busiest hub, so the subset stays connected
+    csr = network.csr
+    degrees = np.diff(csr.offsets)
+    hub = int(np.argmax(degrees))
+    seen = {hub}
+    queue = deque([hub])
+    while queue and len(seen) < size:
+        u = queue.popleft()
+        for v in csr.neighbors[csr.offsets[u]:csr.offsets[u + 1]].tolist():
+            if v not in seen and len(seen) < size:
+                seen.add(v)
+                queue.append(v)
+    return [csr.airports[i] for i in sorted(seen)]
+
+
+def make_queries(network, count, seed, delays=True):
+    # Fixed (start, end, delay seed) triples, the same for every engine and every run
+    rng = np.random.default_rng(seed)
+    airports = network.airports
+    queries = []
+    for i in range(count):
+        start, end = rng.choice(len(airports), size=2, replace=False).tolist()
+        queries.append((airports[start], airports[end], seed + i if delays else None))
+    return queries
+
+
+def run_queries(network, engine, queries, pool=None):
+    # With a pool the exhaustive search is split over its workers instead
+    results = []
+    for start, end, delay_seed in queries:
+        if pool is not None:
+            results.append(pool.exhaustive_search(start, end, delay_seed=delay_seed))
+        else:
+            results.append(network.find_route(engine, start, end, delay_seed=delay_seed))
+    return results
+
+
+def measure(network, engine, queries, repeat, warmup, pool=None):
+    for _ in range(warmup):
+        run_queries(network, engine, queries, pool)
+
+    # Timing runs, collector paused so one pass doesn't pay for another's garbage
+    timings = []
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start_time = time.perf_counter()
+            results = run_queries(network, engine, queries, pool)
+            timings.append((time.perf_counter() - start_time) * 1000 / len(queries))
+    finally:
+        gc.enable()
+
+    # Separate memory run, tracemalloc slows everything down too much to time under it.
+    # It only sees this process, not a pool's workers.
+    gc.collect()
+    tracemalloc.start()
+    run_queries(network, engine, queries, pool)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    expanded = [r.nodes_expanded for r in results if r.nodes_expanded is not None]
+    return {
+        'engine': engine if pool is None else f"{engine}-pool{pool.processes}",
+        'queries': len(queries),
+        'repeat': repeat,
+        'warmup': warmup,
+        'min_ms': min(timings),
+        'median_ms': statistics.median(timings),
+        'mean_ms': statistics.mean(timings),
+        'stdev_ms': statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        'peak_memory_mb': peak / 1024 / 1024,
+        'mean_nodes_expanded': statistics.mean(expanded) if expanded else None,
+        'routes_found': sum(r.path is not None for r in results),
+    }
+
+
+def benchmark_cases(args):
+    for size in args.sizes:
+        for density in args.densities:
+            network = synthetic_network(size, density, args.seed)
+            yield {'case': f"synthetic-{size}-{density}", 'source': 'synthetic', 'density': density}, network
+
+    if args.real_sizes:
+        if not os.path.exists(args.data):
+            print(f"Skipping real network cases, {args.data} not found", file=sys.stderr)
+            return
+        full = RouteNetwork(args.data)
+        for size in args.real_sizes:
+            network = full if size >= len(full.airports) else RouteNetwork(args.data, hub_subset(full, size))
+            yield {'case': f"real-{len(network.airports)}", 'source': 'real', 'density': None}, network
+
+
+def run_benchmarks(args):
+    records = []
+    for case, network in benchmark_cases(args):
+        queries = make_queries(network, args.queries, args.seed, not args.no_delays)
+        for engine in args.engines:
+            if engine in EXHAUSTIVE_ENGINES and len(network.airports) > args.exhaustive_max:
+                continue
+            runs = [None]
+            if engine in EXHAUSTIVE_ENGINES and args.processes:
+                runs.append(RoutingPool(network, args.processes))
+            for pool in runs:
+                record = dict(case, airports=len(network.airports), routes=network.csr.num_edges)
+                try:
+                    record.update(measure(network, engine, queries, args.repeat, args.warmup, pool))
+                finally:
+                    if pool is not None:
+                        pool.close()
+                records.append(record)
+                print(f"{record['case']:>24} {record['engine']:>18} {record['median_ms']:10.3f} ms/query "
+                      f"{record['peak_memory_mb']:8.2f} MB", file=sys.stderr)
+    return records
+
+
+def write_results(records, args):
+    if args.json:
+        metadata = {
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'numpy': np.__version__,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'seed': args.seed,
+        }
+        with open(args.json, 'w') as f:
+            json.dump({'metadata': metadata, 'results': records}, f, indent=2)
+    if args.csv:
+        with open(args.csv, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+            writer.writeheader()
+            writer.writerows(records)
+
+
+def parse_list(cast):
+    return lambda text: [cast(item) for item in text.split(',') if item]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the routing engines headlessly")
+    parser.add_argument('--engines', type=parse_list(str), default=list(ALGORITHMS))
+    parser.add_argument('--sizes', type=parse_list(int), default=[10, 20, 50, 100, 200])
+    parser.add_argument('--densities', type=parse_list(float), default=[0.1, 0.3])
+    parser.add_argument('--real-sizes', type=parse_list(int), default=[10, 15, 20, 100, 1000])
+    parser.add_argument('--data', default=DATA_PATH)
+    parser.add_argument('--queries', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--exhaustive-max', type=int, default=50,
+                        help="skip exhaustive engines above this many airports")
+    parser.add_argument('--processes', type=int, default=0,
+                        help="also time the exhaustive engines split over a worker pool this size")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-delays', action='store_true',
+                        help="route on the base flight times; the ch engine only uses its index "
+                             "for these, with delays it falls back to Dijkstra")
+    parser.add_argument('--json', default='benchmark_results.json')
+    parser.add_argument('--csv', default='benchmark_results.csv')
+    parser.add_argument('--trace', help="also record spans and counters to <prefix>.json and "
+                                        "<prefix>.trace.json, at some cost to the timings")
+    args = parser.parse_args(argv)
+
+    unknown = set(args.engines) - set(ALGORITHMS)
+    if unknown:
+        parser.error(f"unknown engines: {', '.join(sorted(unknown))}")
+
+    if args.trace:
+        recorder.enable()
+    records = run_benchmarks(args)
+    write_results(records, args)
+    if args.trace:
+        export(args.trace)
+
+
+if __name__ == "__main__":
+    main()
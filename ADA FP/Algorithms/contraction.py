@@ -0,0 +1,301 @@
+import argparse
+import heapq
+import os
+import time
+
+import numpy as np
+
+from instrumentation import span
+
+
+# Witness searches give up after settling this many airports and just add the shortcut,
+# which is always safe, only a little wasteful
+WITNESS_SETTLE_LIMIT = 60
+
+# Contraction stops once the cheapest airport left would need more than this many
+# shortcuts per route it takes away, and everything left becomes a core searched both
+# ways at query time. Hub-and-spoke networks contract down to their backbone; a network
+# without hubs, where most detours through an airport are shortest paths, stops almost
+# straight away and is searched as a plain bidirectional Dijkstra.
+MAX_SHORTCUTS_PER_ROUTE = 4
+
+# Slack when comparing times summed in different orders
+EPSILON = 1e-9
+
+# Bump whenever the layout of the saved arrays changes
+HIERARCHY_VERSION = 3
+
+
+class ContractionHierarchy:
+    # Contraction hierarchy over an undirected CSRGraph with its base flight times. Airports
+    # are contracted one by one, least important first, adding a shortcut between two
+    # neighbours whenever a bounded witness search finds no other path as short as the one
+    # through the contracted airport. A query then searches only upward in rank from both
+    # ends and meets at the top. The upward edges are kept in CSR form; middles[k] is the
+    # airport a shortcut skips, -1 for a real route. Closures and delays change the weights
+    # the hierarchy was built for, so those queries have to go to the plain searches instead.
+
+    def __init__(self, airports, rank, offsets, neighbors, weights, middles, version=None):
+        self.airports = list(airports)
+        self.index = {airport: i for i, airport in enumerate(self.airports)}
+        self.rank = np.asarray(rank, dtype=np.int32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.neighbors = np.asarray(neighbors, dtype=np.int32)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.middles = np.asarray(middles, dtype=np.int32)
+        self.version = version
+
+        # Queries run on plain lists, and unpacking looks up an upward edge by its ends
+        neighbors, weights, middles = self.neighbors.tolist(), self.weights.tolist(), self.middles.tolist()
+        offsets = self.offsets.tolist()
+        self._up = [list(zip(neighbors[offsets[u]:offsets[u + 1]], weights[offsets[u]:offsets[u + 1]]))
+                    for u in range(len(self.airports))]
+        self._middle = [dict(zip(neighbors[offsets[u]:offsets[u + 1]], middles[offsets[u]:offsets[u + 1]]))
+                        for u in range(len(self.airports))]
+
+    def arrays(self):
+        # Everything the constructor takes, for saving or shipping to another process
+        return (self.airports, self.rank, self.offsets, self.neighbors, self.weights, self.middles,
+                self.version)
+
+    @property
+    def num_shortcuts(self):
+        return int((self.middles >= 0).sum())
+
+    @property
+    def core_size(self):
+        # Airports sharing the top rank; 1 when contraction went all the way
+        return int((self.rank == self.rank.max()).sum()) if len(self.rank) else 0
+
+    @classmethod
+    def build(cls, csr, version=None, progress=None, settle_limit=WITNESS_SETTLE_LIMIT,
+              max_shortcuts_per_route=MAX_SHORTCUTS_PER_ROUTE):
+        # progress is called every 64 contractions with (airports contracted, inf, None)
+        # and may raise to abandon the build
+        n = len(csr.airports)
+        adjacency = [{} for _ in range(n)]
+        for (u, v), w in zip(csr.endpoints.tolist(), csr.edge_weights.tolist()):
+            if u != v and w < adjacency[u].get(v, float('inf')):
+                adjacency[u][v] = adjacency[v][u] = w
+        # Airport a shortcut between the pair skips, keyed by (low id, high id)
+        middle = {}
+        contracted_neighbours = [0] * n
+        # Longest chain of contracted airports below each airport
+        level = [0] * n
+
+        def witness_distances(source, skip, targets, limit):
+            # Dijkstra from source around `skip`, done once every target is settled and
+            # abandoned past `limit` or the settle limit
+            dist = {source: 0.0}
+            heap = [(0.0, source)]
+            settled = 0
+            remaining = len(targets)
+            while heap and remaining:
+                d, u = heapq.heappop(heap)
+                if d > dist[u]:
+                    continue
+                if settled >= settle_limit:
+                    break
+                settled += 1
+                if u in targets:
+                    remaining -= 1
+                for v, w in adjacency[u].items():
+                    nd = d + w
+                    if v != skip and nd <= limit and nd < dist.get(v, float('inf')):
+                        dist[v] = nd
+                        heapq.heappush(heap, (nd, v))
+            return dist
+
+        def shortcuts(v):
+            # Shortcuts needed to contract v, as (u, w, length) with u < w
+            legs = list(adjacency[v].items())
+            needed = []
+            for i, (u, uv) in enumerate(legs[:-1]):
+                # A direct route no longer than the detour is witness enough, search for the rest
+                direct = adjacency[u]
+                later = [(w, vw) for w, vw in legs[i + 1:] if direct.get(w, float('inf')) > uv + vw + EPSILON]
+                if not later:
+                    continue
+                limit = uv + max(vw for _, vw in later) + EPSILON
+                dist = witness_distances(u, v, {w for w, _ in later}, limit)
+                for w, vw in later:
+                    if dist.get(w, float('inf')) > uv + vw + EPSILON:
+                        needed.append((min(u, w), max(u, w), uv + vw))
+            return needed
+
+        def priority(v, needed):
+            # Edge difference, plus contracted neighbours and level to spread contraction evenly
+            return len(needed) - len(adjacency[v]) + contracted_neighbours[v] + level[v]
+
+        with span('ch.contract', airports=n):
+            # Busy airports start from the most shortcuts they could need instead of a costly
+            # count; they only come up late, and get an exact count then
+            heap = [(priority(v, shortcuts(v)) if len(adjacency[v]) <= 16 else
+                     len(adjacency[v]) * (len(adjacency[v]) - 3) // 2 + 1, v) for v in range(n)]
+            heapq.heapify(heap)
+            rank = np.zeros(n, dtype=np.int32)
+            upward = [[] for _ in range(n)]
+            order = 0
+            core = []
+            while heap:
+                _, v = heapq.heappop(heap)
+                # Lazy update: contract v only if it is still the cheapest after a recount
+                needed = shortcuts(v)
+                current = priority(v, needed)
+                if heap and current > heap[0][0]:
+                    heapq.heappush(heap, (current, v))
+                    continue
+                if len(needed) > max_shortcuts_per_route * len(adjacency[v]):
+                    core.append(v)
+                    core.extend(u for _, u in heap)
+                    break
+
+                for u, w, length in needed:
+                    if length < adjacency[u].get(w, float('inf')):
+                        adjacency[u][w] = adjacency[w][u] = length
+                        middle[(u, w)] = v
+                # Everything still attached to v ranks above it
+                for u, w in adjacency[v].items():
+                    upward[v].append((u, w, middle.get((min(u, v), max(u, v)), -1)))
+                    del adjacency[u][v]
+                    contracted_neighbours[u] += 1
+                    level[u] = max(level[u], level[v] + 1)
+                adjacency[v] = {}
+                rank[v] = order
+                order += 1
+                if progress is not None and order % 64 == 0:
+                    progress(order, float('inf'), None)
+
+        # The core shares the top rank, and each core airport keeps all its remaining routes
+        for v in core:
+            upward[v] = [(u, w, middle.get((min(u, v), max(u, v)), -1)) for u, w in adjacency[v].items()]
+            rank[v] = order
+
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum([len(edges) for edges in upward], out=offsets[1:])
+        edges = [edge for edges in upward for edge in edges]
+        return cls(csr.airports, rank, offsets,
+                   [u for u, _, _ in edges], [w for _, w, _ in edges], [m for _, _, m in edges], version)
+
+    def save(self, path):
+        # Write then rename so an interrupted save leaves the old file intact
+        with open(path + '.tmp', 'wb') as f:
+            np.savez(f, format=np.array(HIERARCHY_VERSION), version=np.array(self.version or ''),
+                     airports=np.asarray(self.airports, dtype=str), rank=self.rank, offsets=self.offsets,
+                     neighbors=self.neighbors, weights=self.weights, middles=self.middles)
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, path, version=None):
+        # None when the file is missing, unreadable or built for another network version
+        try:
+            with np.load(path) as data:
+                if int(data['format']) != HIERARCHY_VERSION:
+                    return None
+                if version is not None and str(data['version']) != version:
+                    return None
+                return cls(data['airports'].tolist(), data['rank'], data['offsets'], data['neighbors'],
+                           data['weights'], data['middles'], str(data['version']) or None)
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def unpack(self, u, v):
+        # Real routes between u and v, replacing each shortcut by the two edges it skips
+        m = self._middle[u].get(v, -1) if self.rank[u] < self.rank[v] else self._middle[v].get(u, -1)
+        if m == -1:
+            return [u, v]
+        return self.unpack(u, m) + self.unpack(m, v)[1:]
+
+    def shortest_path(self, start_airport, end_airport, stats=None):
+        if start_airport not in self.index or end_airport not in self.index:
+            return None, None
+        source, target = self.index[start_airport], self.index[end_airport]
+        up = self._up
+
+        # Forward and backward searches over the same upward graph, since routes run both ways
+        n = len(self.airports)
+        inf = float('inf')
+        dist = ([inf] * n, [inf] * n)
+        pred = ([-1] * n, [-1] * n)
+        dist[0][source] = dist[1][target] = 0.0
+        heaps = ([(0.0, source)], [(0.0, target)])
+        best, meet = (0.0, source) if source == target else (inf, -1)
+        expanded = 0
+        push, pop = heapq.heappush, heapq.heappop
+
+        while heaps[0] or heaps[1]:
+            # Step whichever side has the closer airport; stop once neither can improve `best`
+            side = 0 if heaps[0] and (not heaps[1] or heaps[0][0][0] <= heaps[1][0][0]) else 1
+            d, u = pop(heaps[side])
+            if d >= best:
+                break
+            reached = dist[side]
+            if d > reached[u]:
+                continue
+            if d + dist[1 - side][u] < best:
+                best, meet = d + dist[1 - side][u], u
+            # Stall on demand: a higher airport already reached reaches u cheaper going
+            # down, so nothing above u is on a shortest path through it
+            edges = up[u]
+            for v, w in edges:
+                if reached[v] + w < d:
+                    break
+            else:
+                expanded += 1
+                heap, came_from = heaps[side], pred[side]
+                for v, w in edges:
+                    nd = d + w
+                    if nd < reached[v]:
+                        reached[v] = nd
+                        came_from[v] = u
+                        push(heap, (nd, v))
+
+        if stats is not None:
+            stats['nodes_expanded'] = expanded
+        if meet == -1:
+            return None, None
+
+        # Source up to the meeting airport, then back down to the target, shortcuts unpacked
+        ups = [meet]
+        while pred[0][ups[-1]] != -1:
+            ups.append(pred[0][ups[-1]])
+        downs = [meet]
+        while pred[1][downs[-1]] != -1:
+            downs.append(pred[1][downs[-1]])
+        hops = ups[::-1] + downs[1:]
+        path = [source]
+        for u, v in zip(hops, hops[1:]):
+            path.extend(self.unpack(u, v)[1:])
+        return [self.airports[i] for i in path], best
+
+
+def main(argv=None):
+    from routing import DATA_PATH, RouteNetwork
+
+    parser = argparse.ArgumentParser(description="Build the contraction hierarchy index and time queries on it")
+    parser.add_argument('start', nargs='?')
+    parser.add_argument('end', nargs='?')
+    parser.add_argument('--data', default=DATA_PATH)
+    parser.add_argument('--rebuild', action='store_true', help="ignore a saved index")
+    args = parser.parse_args(argv)
+
+    network = RouteNetwork(args.data)
+    start_time = time.perf_counter()
+    with span('ch.prepare'):
+        hierarchy = network.contraction_hierarchy(rebuild=args.rebuild)
+    print(f"{len(hierarchy.airports)} airports, {network.csr.num_edges} routes, "
+          f"{hierarchy.num_shortcuts} shortcuts, core of {hierarchy.core_size}, "
+          f"ready in {time.perf_counter() - start_time:.2f} s")
+
+    if args.start and args.end:
+        start_time = time.perf_counter()
+        path, flight_time = hierarchy.shortest_path(args.start, args.end)
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+        if path is None:
+            print("No valid path available!")
+            return
+        print(f"{' -> '.join(path)}  {flight_time:.2f}h  ({elapsed_ms:.3f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+import heapq
+
+import numpy as np
+
+
+class CSRGraph:
+    # Immutable undirected graph in compressed sparse row form. Airports are int ids,
+    # every undirected edge is stored once in `endpoints`/`edge_weights` and twice as
+    # half-edges in the CSR arrays, where edge_ids maps a half-edge back to its edge.
+    # Closures and delays never touch the arrays, they produce a per-query weight
+    # vector over half-edges with closed legs set to inf.
+    __slots__ = ('airports', 'index', 'endpoints', 'edge_weights',
+                 'offsets', 'neighbors', 'edge_ids', 'weights')
+
+    def __init__(self, airports, endpoints, edge_weights):
+        self.airports = list(airports)
+        self.index = {airport: i for i, airport in enumerate(self.airports)}
+        self.endpoints = np.asarray(endpoints, dtype=np.int32).reshape(-1, 2)
+        self.edge_weights = np.asarray(edge_weights, dtype=np.float64)
+
+        # Both directions of every edge, grouped by tail
+        m = len(self.edge_weights)
+        tails = np.concatenate([self.endpoints[:, 0], self.endpoints[:, 1]])
+        heads = np.concatenate([self.endpoints[:, 1], self.endpoints[:, 0]])
+        ids = np.concatenate([np.arange(m, dtype=np.int32), np.arange(m, dtype=np.int32)])
+        order = np.argsort(tails, kind='stable')
+
+        self.neighbors = heads[order].astype(np.int32)
+        self.edge_ids = ids[order]
+        self.weights = self.edge_weights[self.edge_ids]
+        self.offsets = np.zeros(len(self.airports) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(tails, minlength=len(self.airports)), out=self.offsets[1:])
+
+        for array in (self.endpoints, self.edge_weights, self.neighbors,
+                      self.edge_ids, self.weights, self.offsets):
+            array.flags.writeable = False
+
+    @property
+    def num_edges(self):
+        return len(self.edge_weights)
+
+    def edge_pairs(self):
+        # Airport codes of every undirected edge, in edge id order
+        for u, v in self.endpoints.tolist():
+            yield self.airports[u], self.airports[v]
+
+    def delay_factors(self, seed=None):
+        return np.random.default_rng(seed).uniform(1.0, 1.5, self.num_edges)
+
+    def closure_mask(self, airport_closure=None, route_closures=()):
+        # True for every undirected edge still open
+        open_edges = np.ones(self.num_edges, dtype=bool)
+        if airport_closure is not None and airport_closure in self.index:
+            c = self.index[airport_closure]
+            open_edges &= (self.endpoints[:, 0] != c) & (self.endpoints[:, 1] != c)
+        for u, v in route_closures:
+            if u not in self.index or v not in self.index:
+                continue
+            a, b = self.index[u], self.index[v]
+            open_edges &= ~(((self.endpoints[:, 0] == a) & (self.endpoints[:, 1] == b)) |
+                            ((self.endpoints[:, 0] == b) & (self.endpoints[:, 1] == a)))
+        return open_edges
+
+    def adjusted_edge_weights(self, open_edges=None, delay_factors=None):
+        # Per-edge weights for one query, closed edges cost inf
+        edge_weights = self.edge_weights
+        if delay_factors is not None:
+            edge_weights = edge_weights * delay_factors
+        if open_edges is not None:
+            edge_weights = np.where(open_edges, edge_weights, np.inf)
+        return edge_weights
+
+    def half_edge_weights(self, edge_weights):
+        if edge_weights is self.edge_weights:
+            return self.weights
+        return edge_weights[self.edge_ids]
+
+    def query_weights(self, open_edges=None, delay_factors=None):
+        # Half-edge weights for one query, closed edges cost inf
+        return self.half_edge_weights(self.adjusted_edge_weights(open_edges, delay_factors))
+
+    def shortest_path_tree(self, source, weights=None, target=None, heuristic=None, stats=None):
+        # Dijkstra from an airport id, stopping early once `target` is settled. With a
+        # heuristic (a consistent lower bound on the time from each airport to `target`)
+        # this is A*. `stats` collects how many airports were expanded and edges relaxed.
+        weights = self.weights if weights is None else weights
+        offsets = self.offsets
+        n = len(self.airports)
+        dist = [float('inf')] * n
+        pred = [-1] * n
+        settled = [False] * n
+        h = [0.0] * n if heuristic is None else heuristic.tolist()
+        dist[source] = 0.0
+        heap = [(h[source], source)]
+        expanded = 0
+        relaxed = 0
+
+        while heap:
+            _, u = heapq.heappop(heap)
+            if settled[u]:
+                continue
+            settled[u] = True
+            expanded += 1
+            if u == target:
+                break
+            d = dist[u]
+            start, end = offsets[u], offsets[u + 1]
+            for v, w in zip(self.neighbors[start:end].tolist(), weights[start:end].tolist()):
+                nd = d + w
+                if nd < dist[v]:
+                    dist[v] = nd
+                    pred[v] = u
+                    relaxed += 1
+                    heapq.heappush(heap, (nd + h[v], v))
+
+        if stats is not None:
+            stats['nodes_expanded'] = expanded
+            stats['edges_relaxed'] = relaxed
+        return dist, pred
+
+    def unpack_path(self, pred, source, target):
+        path = [target]
+        while path[-1] != source:
+            path.append(pred[path[-1]])
+        return [self.airports[i] for i in reversed(path)]
+
+    def dijkstra(self, start_airport, end_airport, weights=None, stats=None):
+        return self.astar(start_airport, end_airport, None, weights, stats)
+
+    def astar(self, start_airport, end_airport, heuristic, weights=None, stats=None):
+        if start_airport not in self.index or end_airport not in self.index:
+            return None, None
+        source, target = self.index[start_airport], self.index[end_airport]
+        dist, pred = self.shortest_path_tree(source, weights, target, heuristic, stats)
+        if dist[target] == float('inf'):
+            return None, None
+        return self.unpack_path(pred, source, target), dist[target]
+
+    def edge_id(self, u, v):
+        # Undirected edge id between airport ids u and v, None if there is no such route
+        start, end = self.offsets[u], self.offsets[u + 1]
+        hits = np.flatnonzero(self.neighbors[start:end] == v)
+        return int(self.edge_ids[start + hits[0]]) if len(hits) else None
+
+    def k_shortest_paths(self, start_airport, end_airport, edge_weights=None, stats=None):
+        # Yen's loopless k shortest paths as a generator of (path, time), cheapest first, so
+        # callers take as many as they need. One reverse shortest path tree from the target
+        # serves every spur search: if the tree path from the spur airport avoids what the
+        # spur bans it is already the best spur path, otherwise it is the A* heuristic,
+        # since bans only ever lengthen routes. edge_weights are per undirected edge.
+        if start_airport not in self.index or end_airport not in self.index:
+            return
+        edge_weights = self.edge_weights if edge_weights is None else edge_weights
+        source, target = self.index[start_airport], self.index[end_airport]
+        time_to_end, next_hop = self.shortest_path_tree(target, self.half_edge_weights(edge_weights))
+        if time_to_end[source] == float('inf'):
+            return
+        heuristic = np.array(time_to_end)
+        if stats is not None:
+            stats.update(spur_searches=0, tree_hits=0)
+
+        def tree_path(u):
+            path = [u]
+            while path[-1] != target:
+                path.append(next_hop[path[-1]])
+            return path
+
+        leg_times = edge_weights.tolist()
+
+        def path_times(path):
+            # Time after each airport of the path, from its start
+            times = [0.0]
+            for u, v in zip(path, path[1:]):
+                times.append(times[-1] + leg_times[self.edge_id(u, v)])
+            return times
+
+        first = tree_path(source)
+        found = [(first, path_times(first))]
+        candidates = []
+        seen = {tuple(first)}
+        yield [self.airports[i] for i in first], found[0][1][-1]
+
+        while True:
+            path, times = found[-1]
+            for i in range(len(path) - 1):
+                spur, root = path[i], path[:i + 1]
+                # Leave the spur airport by a leg no accepted path with this root used,
+                # without touching the root's earlier airports
+                banned_edges = {self.edge_id(p[i], p[i + 1]) for p, _ in found
+                                if len(p) > i + 1 and p[:i + 1] == root}
+                blocked = set(root[:-1])
+
+                spur_path = tree_path(spur)
+                if self.edge_id(spur_path[0], spur_path[1]) in banned_edges or blocked.intersection(spur_path):
+                    # Tree path unusable, search with the bans applied
+                    weights = np.array(edge_weights, dtype=np.float64)
+                    weights[list(banned_edges)] = np.inf
+                    for node in blocked:
+                        weights[self.edge_ids[self.offsets[node]:self.offsets[node + 1]]] = np.inf
+                    dist, pred = self.shortest_path_tree(spur, self.half_edge_weights(weights), target, heuristic)
+                    if stats is not None:
+                        stats['spur_searches'] += 1
+                    if dist[target] == float('inf'):
+                        continue
+                    spur_path = [target]
+                    while spur_path[-1] != spur:
+                        spur_path.append(pred[spur_path[-1]])
+                    spur_path.reverse()
+                elif stats is not None:
+                    stats['tree_hits'] += 1
+
+                candidate = root[:-1] + spur_path
+                if tuple(candidate) not in seen:
+                    seen.add(tuple(candidate))
+                    candidate_times = path_times(candidate)
+                    heapq.heappush(candidates, (candidate_times[-1], candidate, candidate_times))
+
+            if not candidates:
+                return
+            flight_time, path, times = heapq.heappop(candidates)
+            found.append((path, times))
+            yield [self.airports[i] for i in path], flight_time
+
+    def fewest_legs_route(self, source, target, weights=None):
+        # Breadth-first over the open legs: (airport ids from source to target, its time),
+        # (None, inf) when target can't be reached
+        weights = (self.weights if weights is None else weights).tolist()
+        offsets, neighbors = self.offsets.tolist(), self.neighbors.tolist()
+        # Airport each one was reached from, and the weight of that leg
+        via = {source: (-1, 0.0)}
+        frontier = [source]
+        while frontier and target not in via:
+            next_frontier = []
+            for u in frontier:
+                for k in range(offsets[u], offsets[u + 1]):
+                    v = neighbors[k]
+                    if v not in via and weights[k] != float('inf'):
+                        via[v] = (u, weights[k])
+                        next_frontier.append(v)
+            frontier = next_frontier
+        if target not in via:
+            return None, float('inf')
+        route, flight_time = [target], 0.0
+        while route[-1] != source:
+            u, w = via[route[-1]]
+            flight_time += w
+            route.append(u)
+        return route[::-1], flight_time
+
+    def exhaustive_search(self, start_airport, end_airport, weights=None, stats=None,
+                          first_hops=None, incumbent=None, progress=None, time_to_end=None):
+        # Depth-first search over simple paths, cheapest leg first, pruned by a lower bound:
+        # a prefix dies once its time plus the shortest remaining time can't beat the best.
+        # first_hops restricts the search to routes leaving through those airports, and
+        # incumbent is a shared multiprocessing.Value holding the best time any worker has
+        # found, so searches over different first hops prune each other. progress is called
+        # every 1024 steps with (nodes expanded, best time so far, shortest possible time)
+        # and may raise to abandon the search. time_to_end, the shortest time from every
+        # airport to end_airport under `weights`, saves the reverse search when the caller
+        # already has it.
+        min_flight_time = float('inf')
+        best_route = None
+        if start_airport not in self.index or end_airport not in self.index:
+            return best_route, min_flight_time
+
+        weights = self.weights if weights is None else weights
+        source, target = self.index[start_airport], self.index[end_airport]
+        if time_to_end is None:
+            time_to_end, _ = self.shortest_path_tree(target, weights)
+        if time_to_end[source] == float('inf'):
+            return best_route, min_flight_time
+        # Without a route to beat, cheapest leg first can wander through exponentially many
+        # prefixes before it reaches the end, so the route with the fewest legs starts as
+        # the best one. It is rarely the fastest, which is left for the search to find;
+        # pool workers get theirs through the incumbent instead.
+        if first_hops is None and incumbent is None:
+            best_route, min_flight_time = self.fewest_legs_route(source, target, weights)
+
+        offsets = self.offsets
+
+        def legs_by_weight(u):
+            # Lazily hand out open legs cheapest first
+            start, end = offsets[u], offsets[u + 1]
+            legs = sorted(zip(weights[start:end].tolist(), self.neighbors[start:end].tolist()))
+            for w, v in legs:
+                if w == float('inf'):
+                    return
+                yield v, w
+
+        route = [source]
+        route_times = [0.0]
+        on_route = [False] * len(self.airports)
+        on_route[source] = True
+        stack = [legs_by_weight(source)]
+        expanded = 1
+        pruned = 0
+        if first_hops is not None:
+            first_hops = {self.index[airport] for airport in first_hops}
+        bound = min_flight_time if incumbent is None else min(min_flight_time, incumbent.value)
+        steps = 0
+
+        while stack:
+            steps += 1
+            if steps % 1024 == 0:
+                if incumbent is not None:
+                    bound = min(min_flight_time, incumbent.value)
+                if progress is not None:
+                    progress(expanded, min_flight_time, time_to_end[source])
+
+            leg = next(stack[-1], None)
+            if leg is None:
+                stack.pop()
+                on_route[route.pop()] = False
+                route_times.pop()
+                continue
+
+            v, w = leg
+            if on_route[v]:
+                continue
+            if first_hops is not None and len(route) == 1 and v not in first_hops:
+                continue
+            total_time = route_times[-1] + w
+            if total_time + time_to_end[v] >= bound:
+                pruned += 1
+                continue
+
+            if v == target:
+                min_flight_time = bound = total_time
+                best_route = route + [v]
+                if incumbent is not None:
+                    with incumbent.get_lock():
+                        if total_time < incumbent.value:
+                            incumbent.value = total_time
+                continue
+
+            route.append(v)
+            route_times.append(total_time)
+            on_route[v] = True
+            stack.append(legs_by_weight(v))
+            expanded += 1
+
+        if stats is not None:
+            stats['nodes_expanded'] = expanded
+            stats['prefixes_pruned'] = pruned
+        if best_route is None:
+            return best_route, min_flight_time
+        return [self.airports[i] for i in best_route], min_flight_time
@@ -0,0 +1,16 @@
+import numpy as np
+
+
+EARTH_RADIUS_KM = 6371.0
+
+# Cruise speed the preprocessing notebook uses to turn distance into FlightTime
+AVERAGE_SPEED_KMH = 850
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    # Great-circle distance in km, works element-wise on whole arrays
+    lat1, lon1, lat2, lon2 = map(np.radians, [lat1, lon1, lat2, lon2])
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = np.sin(dlat / 2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2)**2
+    return EARTH_RADIUS_KM * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
@@ -0,0 +1,144 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from geo import AVERAGE_SPEED_KMH
+from instrumentation import span
+
+
+# Bump whenever the layout of the cached arrays changes
+CACHE_VERSION = 3
+CACHE_ARRAYS = ('airports', 'edges', 'weights', 'coordinates', 'distances', 'stops')
+
+
+def parse_flight_time(flight_time):
+    # "Xh Ym" strings to decimal hours in one pass over the column
+    parts = flight_time.str.extract(r'(\d+)h\s*(\d+)m').astype(float)
+    return parts[0] + parts[1] / 60
+
+
+def file_digest(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def default_cache_dir(data_path):
+    return data_path + '.graphcache'
+
+
+def read_routes_table(path, columns):
+    # The notebook's CSV, or the Parquet/Feather written by preprocess.py
+    import pandas as pd
+
+    if path.endswith('.parquet') or path.endswith('.feather'):
+        import pyarrow.dataset
+
+        # Ask for whichever wanted columns the file actually has
+        dataset = pyarrow.dataset.dataset(path, format='parquet' if path.endswith('.parquet') else 'ipc')
+        present = [column for column in columns if column in dataset.schema.names]
+        return dataset.to_table(columns=present).to_pandas()
+    return pd.read_csv(path, usecols=lambda column: column in columns)
+
+
+def read_edge_list(data_path):
+    # Cold path: the only place pandas is needed
+    import pandas as pd
+
+    coordinate_columns = ['SourceLatitude', 'SourceLongitude', 'DestinationLatitude', 'DestinationLongitude']
+    df = read_routes_table(data_path, ['SourceAirport', 'DestinationAirport', 'FlightTime',
+                                       'FlightTime_Hours', 'Distance', 'Stops'] + coordinate_columns)
+    if 'FlightTime_Hours' not in df:
+        df['FlightTime_Hours'] = parse_flight_time(df['FlightTime'])
+    df = df.dropna(subset=['SourceAirport', 'DestinationAirport', 'FlightTime_Hours'])
+
+    # One shared index for source and destination codes, in first-seen order
+    codes, airports = pd.factorize(pd.concat([df['SourceAirport'], df['DestinationAirport']],
+                                             ignore_index=True))
+    edges = codes.reshape(2, -1).T.astype(np.int32)
+
+    # (latitude, longitude) per airport from whichever end of a route carries it, NaN if none does
+    coordinates = np.full((len(airports), 2), np.nan)
+    if all(column in df for column in coordinate_columns):
+        located = pd.DataFrame({
+            'code': codes,
+            'lat': np.concatenate([df['SourceLatitude'].to_numpy(), df['DestinationLatitude'].to_numpy()]),
+            'lon': np.concatenate([df['SourceLongitude'].to_numpy(), df['DestinationLongitude'].to_numpy()]),
+        }).dropna().drop_duplicates('code')
+        coordinates[located['code'].to_numpy()] = located[['lat', 'lon']].to_numpy()
+
+    # Route distance in km and scheduled intermediate stops. Without a Distance column the
+    # distance is recovered from the flight time the same way the notebook derived it.
+    weights = df['FlightTime_Hours'].to_numpy(dtype=np.float64)
+    if 'Distance' in df:
+        distances = df['Distance'].to_numpy(dtype=np.float64)
+        distances = np.where(np.isnan(distances), weights * AVERAGE_SPEED_KMH, distances)
+    else:
+        distances = weights * AVERAGE_SPEED_KMH
+    if 'Stops' in df:
+        stops = df['Stops'].fillna(0).to_numpy(dtype=np.int32)
+    else:
+        stops = np.zeros(len(df), dtype=np.int32)
+
+    return (np.asarray(airports, dtype=str), np.ascontiguousarray(edges), weights, coordinates,
+            distances, stops)
+
+
+def _read_meta(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, 'meta.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_cache(cache_dir, meta, arrays):
+    os.makedirs(cache_dir, exist_ok=True)
+    for name, array in zip(CACHE_ARRAYS, arrays):
+        np.save(os.path.join(cache_dir, name + '.npy'), array)
+    # Meta goes last so a half written cache is never taken as valid
+    with open(os.path.join(cache_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+
+def load_edge_list(data_path, cache_dir=None):
+    # Returns (airport codes, int32 edge index pairs, float64 flight hours, per-airport
+    # latitude/longitude, per-route km, per-route stops). Warm starts memory-map the
+    # arrays compiled from the data file; a changed file is detected by its mtime and
+    # size, and only re-hashed when those differ.
+    cache_dir = cache_dir or default_cache_dir(data_path)
+    stat = os.stat(data_path)
+    meta = _read_meta(cache_dir)
+
+    if meta is not None and meta.get('version') == CACHE_VERSION:
+        fresh = meta['mtime_ns'] == stat.st_mtime_ns and meta['size'] == stat.st_size
+        if not fresh and meta['size'] == stat.st_size and meta['sha1'] == file_digest(data_path):
+            # Touched but unchanged, just record the new mtime
+            meta['mtime_ns'] = stat.st_mtime_ns
+            try:
+                with open(os.path.join(cache_dir, 'meta.json'), 'w') as f:
+                    json.dump(meta, f)
+            except OSError:
+                pass
+            fresh = True
+        if fresh:
+            try:
+                return tuple(np.load(os.path.join(cache_dir, name + '.npy'), mmap_mode='r')
+                             for name in CACHE_ARRAYS)
+            except (OSError, ValueError):
+                pass
+
+    with span('read_edge_list'):
+        arrays = read_edge_list(data_path)
+    meta = {'version': CACHE_VERSION, 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size,
+            'sha1': file_digest(data_path)}
+    try:
+        _write_cache(cache_dir, meta, arrays)
+    except OSError:
+        # A read-only data directory only costs us the warm start
+        pass
+    return arrays
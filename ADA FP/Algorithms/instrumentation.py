@@ -0,0 +1,164 @@
+import atexit
+import json
+import os
+import threading
+import time
+from collections import deque
+
+
+# Set to a file prefix to record from startup and write <prefix>.json and
+# <prefix>.trace.json on exit
+PROFILE_ENV = 'ADA_PROFILE'
+
+# Oldest spans are dropped past this many, totals keep counting
+MAX_EVENTS = 200_000
+
+
+class _NullSpan:
+    # Handed out while recording is off, so an unused span costs one attribute check
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def annotate(self, **args):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Span:
+    __slots__ = ('recorder', 'name', 'args', 'start')
+
+    def __init__(self, recorder, name, args):
+        self.recorder = recorder
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.recorder.record(self.name, self.start, time.perf_counter_ns() - self.start, self.args)
+        return False
+
+    def annotate(self, **args):
+        # Attach values only known once the work is done, e.g. nodes expanded
+        self.args.update(args)
+
+
+class Recorder:
+    # Timed spans and running counters, off until enable(). Spans are kept for the
+    # Chrome trace, per-name totals for the JSON summary.
+
+    def __init__(self, max_events=MAX_EVENTS):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.events = deque(maxlen=max_events)
+        self.totals = {}
+        self.counters = {}
+        self.origin = time.perf_counter_ns()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self.lock:
+            self.events.clear()
+            self.totals.clear()
+            self.counters.clear()
+            self.origin = time.perf_counter_ns()
+
+    def span(self, name, **args):
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, args)
+
+    def count(self, name, value=1):
+        if self.enabled:
+            with self.lock:
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def record(self, name, start, duration, args):
+        with self.lock:
+            self.events.append((name, start, duration, threading.get_ident(), args))
+            totals = self.totals.get(name)
+            if totals is None:
+                self.totals[name] = [1, duration, duration]
+            else:
+                totals[0] += 1
+                totals[1] += duration
+                totals[2] = max(totals[2], duration)
+
+    def summary(self):
+        with self.lock:
+            spans = {name: {'count': count, 'total_ms': total / 1e6, 'mean_ms': total / count / 1e6,
+                            'max_ms': longest / 1e6}
+                     for name, (count, total, longest) in self.totals.items()}
+            return {'spans': dict(sorted(spans.items(), key=lambda item: -item[1]['total_ms'])),
+                    'counters': dict(self.counters)}
+
+    def export_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def export_chrome_trace(self, path):
+        # Complete ("X") events in microseconds, loadable in chrome://tracing or Perfetto
+        pid = os.getpid()
+        with self.lock:
+            events = [{'name': name, 'ph': 'X', 'ts': (start - self.origin) / 1000,
+                       'dur': duration / 1000, 'pid': pid, 'tid': tid, 'args': args}
+                      for name, start, duration, tid, args in self.events]
+            counters = dict(self.counters)
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms',
+                       'otherData': {'counters': counters}}, f)
+
+
+class FrameStats:
+    # Rolling frame times for the on-screen overlay, measured whether or not the
+    # recorder is on
+    def __init__(self, fps, window=120):
+        self.budget_ms = 1000 / fps
+        self.frames = deque(maxlen=window)
+
+    def add(self, seconds):
+        self.frames.append(seconds * 1000)
+
+    def overlay_lines(self, fps):
+        # fps is the rate actually shown, frame times are the work inside each frame
+        if not self.frames:
+            return []
+        mean = sum(self.frames) / len(self.frames)
+        worst = max(self.frames)
+        over = sum(frame > self.budget_ms for frame in self.frames)
+        return [f"FPS {fps:.0f}",
+                f"Frame {mean:.1f} / {self.budget_ms:.1f} ms",
+                f"Worst {worst:.1f} ms, {over} over budget"]
+
+
+recorder = Recorder()
+span = recorder.span
+count = recorder.count
+
+
+def export(prefix):
+    recorder.export_json(prefix + '.json')
+    recorder.export_chrome_trace(prefix + '.trace.json')
+
+
+def enable_from_env():
+    # Opt in with ADA_PROFILE=<prefix>; the files are written when the process exits
+    prefix = os.environ.get(PROFILE_ENV)
+    if prefix:
+        recorder.enable()
+        atexit.register(export, prefix)
+    return prefix
@@ -0,0 +1,287 @@
+import argparse
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from instrumentation import span
+from routing import DATA_PATH, RouteNetwork
+
+
+# Held-Karp keeps a (2^stops, stops) table of float64 times plus int8 parents, about 190 MB
+# at 20 stops; larger sets go to branch and bound
+MAX_HELD_KARP_STOPS = 20
+
+# Subgradient steps spent tightening the branch and bound penalties at the root
+PENALTY_ROUNDS = 100
+
+# order = start, the stops in visiting order, end; path = every airport flown through;
+# legs = flight time of each hop in `order`; method = which solver found it
+Itinerary = namedtuple('Itinerary', ['order', 'path', 'flight_time', 'legs', 'method'])
+
+
+def held_karp(start_times, times, end_times):
+    # Exact open tour start -> every stop once -> end over a stop-to-stop time matrix.
+    # cost[mask, j] is the fastest way from the start through exactly the stops in `mask`
+    # ending at j. Masks are filled a popcount layer at a time and each layer is one
+    # vectorized min over the previous stop for every mask at once.
+    # Returns (flight_time, stop order), (inf, None) when no order connects.
+    k = len(start_times)
+    if k == 0:
+        return float('inf'), None
+    full = 1 << k
+    cost = np.full((full, k), np.inf)
+    parent = np.full((full, k), -1, dtype=np.int8)
+    stops = np.arange(k)
+    cost[1 << stops, stops] = start_times
+
+    masks = np.arange(full)
+    sizes = np.zeros(full, dtype=np.int8)
+    for j in range(k):
+        sizes += (masks >> j) & 1
+    for size in range(2, k + 1):
+        layer = masks[sizes == size]
+        for j in range(k):
+            ending = layer[(layer >> j) & 1 == 1]
+            # cost[previous, i] is inf for every i outside `previous`, so no extra masking
+            candidates = cost[ending ^ (1 << j)] + times[:, j]
+            best = candidates.argmin(axis=1)
+            cost[ending, j] = candidates[np.arange(len(ending)), best]
+            parent[ending, j] = best
+
+    totals = cost[full - 1] + end_times
+    last = int(totals.argmin())
+    if not np.isfinite(totals[last]):
+        return float('inf'), None
+    order = []
+    mask, j = full - 1, last
+    while j != -1:
+        order.append(j)
+        mask, j = mask ^ (1 << j), int(parent[mask, j])
+    return float(totals[last]), order[::-1]
+
+
+def tour_time(order, start_times, times, end_times):
+    if not order:
+        return float('inf')
+    total = start_times[order[0]] + end_times[order[-1]]
+    for i, j in zip(order, order[1:]):
+        total += times[i, j]
+    return float(total)
+
+
+def greedy_order(start_times, times, end_times):
+    # Nearest stop next, then 2-opt reversals while any of them helps
+    remaining = set(range(len(start_times)))
+    order = []
+    previous = start_times
+    while remaining:
+        j = min(remaining, key=lambda stop: previous[stop])
+        order.append(j)
+        remaining.discard(j)
+        previous = times[j]
+    best = tour_time(order, start_times, times, end_times)
+    improved = True
+    while improved and best < float('inf'):
+        improved = False
+        for a in range(len(order) - 1):
+            for b in range(a + 1, len(order)):
+                candidate = order[:a] + order[a:b + 1][::-1] + order[b + 1:]
+                candidate_time = tour_time(candidate, start_times, times, end_times)
+                if candidate_time < best - 1e-9:
+                    order, best, improved = candidate, candidate_time, True
+    return best, order
+
+
+def spanning_tree(nodes, lengths):
+    # Prim's minimum spanning tree over `nodes`: (total length, degree of each node)
+    m = len(nodes)
+    degrees = np.zeros(m, dtype=np.int64)
+    if m < 2:
+        return 0.0, degrees
+    lengths = lengths[np.ix_(nodes, nodes)]
+    closest = lengths[0].copy()
+    nearest = np.zeros(m, dtype=np.int64)
+    in_tree = np.zeros(m, dtype=bool)
+    in_tree[0] = True
+    closest[0] = np.inf
+    total = 0.0
+    for _ in range(m - 1):
+        j = int(closest.argmin())
+        total += closest[j]
+        degrees[j] += 1
+        degrees[nearest[j]] += 1
+        in_tree[j] = True
+        closer = lengths[j] < closest
+        nearest[closer] = j
+        closest = np.where(in_tree, np.inf, np.minimum(closest, lengths[j]))
+    return float(total), degrees
+
+
+def path_bound(lengths, penalties, last, left):
+    # Lower bound on a path from `last` through every node of `left`, which ends at the
+    # end node: the cheapest hop out of `last` plus a spanning tree over `left`. A path is
+    # one such tree. The lengths carry penalties[i] + penalties[j] on every hop, which adds
+    # the same to every path, twice the penalty of each node it passes through and once
+    # that of each end; taking that back out keeps the bound valid for any penalties.
+    tree, degrees = spanning_tree(left, lengths)
+    hops = lengths[last, left]
+    first = int(hops.argmin())
+    degrees[first] += 1
+    owed = 2 * penalties[left].sum() - penalties[left[-1]] + penalties[last]
+    return tree + float(hops[first]) - owed, degrees
+
+
+def branch_and_bound(start_times, times, end_times, stats=None):
+    # Depth-first over stop orders, nearest stop first, starting from the greedy tour as
+    # incumbent. A prefix is dropped when the same set of stops was already reached at the
+    # same last stop at least as fast, or when its time plus path_bound on the rest can't
+    # beat the incumbent. The penalties in the bound come from a Held-Karp subgradient
+    # ascent at the root, pushing the trees towards paths: every stop of degree 2, the end
+    # of degree 1. Trees are cached per set of stops left.
+    k = len(start_times)
+    if k == 0:
+        return float('inf'), None
+    best, best_order = greedy_order(start_times, times, end_times)
+    times_list = times.tolist()
+    end_list = end_times.tolist()
+    by_distance = [sorted(range(k), key=lambda j: times_list[i][j]) for i in range(k)]
+    # Stops, then the end as node k and the start as node k + 1, the faster direction of each pair
+    lengths = np.zeros((k + 2, k + 2))
+    lengths[:k, :k] = np.minimum(times, times.T)
+    lengths[:k, k] = lengths[k, :k] = end_times
+    lengths[:k, k + 1] = lengths[k + 1, :k] = start_times
+    lengths[k, k + 1] = lengths[k + 1, k] = np.inf
+
+    penalties = np.zeros(k + 2)
+    everything = list(range(k + 1))
+    wanted = np.array([2] * k + [1])
+    best_penalties, root = penalties.copy(), -np.inf
+    step = 1.0
+    for _ in range(PENALTY_ROUNDS):
+        adjusted = lengths + penalties[:, None] + penalties[None, :]
+        value, degrees = path_bound(adjusted, penalties, k + 1, everything)
+        if value > root:
+            best_penalties, root = penalties.copy(), value
+        slack = degrees - wanted
+        # Without a greedy tour to aim for, the penalties stay at zero
+        if max(best, value) == float('inf') or not slack.any() or best - value < 1e-9:
+            break
+        penalties[:k + 1] += step * (best - value) / (slack @ slack) * slack
+        step *= 0.95
+    if root == float('inf'):
+        # Some stop can't be reached at all
+        return float('inf'), None
+    penalties = best_penalties
+    adjusted = lengths + penalties[:, None] + penalties[None, :]
+
+    trees = {}
+
+    def bound(mask, last):
+        if mask not in trees:
+            left = [j for j in range(k) if not mask >> j & 1] + [k]
+            trees[mask] = (left, spanning_tree(left, adjusted)[0] - 2 * penalties[left].sum() + penalties[k])
+        left, tree = trees[mask]
+        return tree + float(adjusted[last, left].min()) - penalties[last]
+
+    reached = {}
+    expanded = 0
+    full = (1 << k) - 1
+    # Stack of (time so far, visited mask, last stop, order so far)
+    stack = [(float(start_times[j]), 1 << j, j, [j]) for j in sorted(range(k), key=lambda j: -start_times[j])]
+    while stack:
+        spent, mask, last, order = stack.pop()
+        if spent >= best or reached.get((mask, last), float('inf')) <= spent:
+            continue
+        reached[(mask, last)] = spent
+        if mask == full:
+            if spent + end_list[last] < best:
+                best, best_order = spent + end_list[last], order
+            continue
+        if spent + bound(mask, last) >= best - 1e-9:
+            continue
+        expanded += 1
+        # Pushed farthest first so the nearest stop is tried next
+        for j in reversed(by_distance[last]):
+            if not mask >> j & 1 and spent + times_list[last][j] < best:
+                stack.append((spent + times_list[last][j], mask | 1 << j, j, order + [j]))
+
+    if stats is not None:
+        stats['nodes_expanded'] = expanded
+        stats['root_bound'] = float(root)
+    return best, (best_order if best < float('inf') else None)
+
+
+def plan_itinerary(network, start_airport, stops, end_airport, airport_closure=None, route_closure=None,
+                   enable_delays=False, delay_seed=None, method=None, stats=None):
+    # Fastest itinerary from start to end through every airport in `stops`, in any order.
+    # One shortest path tree per start/stop airport gives the leg times between them; the
+    # order comes from Held-Karp, or branch and bound past MAX_HELD_KARP_STOPS stops or
+    # with method='branch_and_bound'. None when some stop can't be reached.
+    csr = network.csr
+    stops = [stop for stop in dict.fromkeys(stops) if stop not in (start_airport, end_airport)]
+    chosen = [start_airport] + stops + [end_airport]
+    if any(airport not in csr.index for airport in chosen):
+        return None
+    ids = [csr.index[airport] for airport in chosen]
+
+    weights = network.query_weights(airport_closure, route_closure, enable_delays, delay_seed)
+    with span('itinerary.legs', airports=len(chosen)):
+        trees = [csr.shortest_path_tree(source, weights) for source in ids[:-1]]
+    table = np.array([[dist[target] for target in ids] for dist, _ in trees])
+    k = len(stops)
+    start_times, times, end_times = table[0, 1:k + 1], table[1:, 1:k + 1], table[1:, k + 1]
+
+    if method is None:
+        method = 'held_karp' if k <= MAX_HELD_KARP_STOPS else 'branch_and_bound'
+    with span('itinerary.order', method=method, stops=k):
+        if k == 0:
+            flight_time, order = table[0, 1], []
+        elif method == 'held_karp':
+            flight_time, order = held_karp(start_times, times, end_times)
+        else:
+            flight_time, order = branch_and_bound(start_times, times, end_times, stats)
+    if order is None or not np.isfinite(flight_time):
+        return None
+
+    # Stitch the legs together from the trees of each leg's origin
+    hops = [0] + [stop + 1 for stop in order] + [k + 1]
+    path = [start_airport]
+    legs = []
+    for a, b in zip(hops, hops[1:]):
+        path.extend(csr.unpack_path(trees[a][1], ids[a], ids[b])[1:])
+        legs.append(float(table[a, b]))
+    return Itinerary([chosen[i] for i in hops], path, float(flight_time), legs, method)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fastest itinerary visiting every given airport")
+    parser.add_argument('start')
+    parser.add_argument('stops', nargs='+')
+    parser.add_argument('--end', help="defaults to returning to the start")
+    parser.add_argument('--method', choices=['held_karp', 'branch_and_bound'])
+    parser.add_argument('--delay-seed', type=int)
+    parser.add_argument('--airport-closure')
+    parser.add_argument('--route-closure')
+    parser.add_argument('--data', default=DATA_PATH)
+    args = parser.parse_args(argv)
+
+    network = RouteNetwork(args.data)
+    stats = {}
+    start_time = time.perf_counter()
+    itinerary = plan_itinerary(network, args.start, args.stops, args.end or args.start, args.airport_closure,
+                               args.route_closure, delay_seed=args.delay_seed, method=args.method, stats=stats)
+    elapsed = time.perf_counter() - start_time
+    if itinerary is None:
+        print("No valid itinerary available!")
+        return
+
+    print(f"{' -> '.join(itinerary.order)}  {itinerary.flight_time:.2f}h  "
+          f"({itinerary.method}, {elapsed:.2f} s)")
+    for a, b, leg in zip(itinerary.order, itinerary.order[1:], itinerary.legs):
+        print(f"  {a} -> {b}  {leg:.2f}h")
+    print(f"Flown: {' -> '.join(itinerary.path)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import argparse
+from collections import Counter, namedtuple
+
+import numpy as np
+
+from routing import DATA_PATH, RouteNetwork
+
+
+# Same delay model as a single delayed simulation: every leg multiplied by U(low, high)
+DELAY_LOW = 1.0
+DELAY_HIGH = 1.5
+
+# Scenarios are solved in chunks so scenarios x legs never gets much bigger than this
+MAX_CHUNK_CELLS = 8_000_000
+
+PathRisk = namedtuple('PathRisk', ['path', 'wins', 'win_rate', 'mean_time', 'p95_time',
+                                   'worst_time', 'mean_regret'])
+RobustnessReport = namedtuple('RobustnessReport', ['scenarios', 'best_times', 'percentiles', 'routes'])
+
+
+def sample_delays(num_scenarios, num_edges, seed=None, low=DELAY_LOW, high=DELAY_HIGH):
+    # One row of delay factors per scenario, one column per leg
+    return np.random.default_rng(seed).uniform(low, high, (num_scenarios, num_edges))
+
+
+def candidate_edges(csr, edge_weights, source, target, high):
+    # Legs that can be on a best route in some scenario. Delays only ever stretch a leg by
+    # up to `high`, so a route whose undelayed time exceeds high x the undelayed optimum
+    # can never win, and neither can any leg only such routes use.
+    half_weights = csr.half_edge_weights(edge_weights)
+    from_start = np.array(csr.shortest_path_tree(source, half_weights)[0])
+    to_end = np.array(csr.shortest_path_tree(target, half_weights)[0])
+    if not np.isfinite(from_start[target]):
+        return np.array([], dtype=np.int64)
+    budget = from_start[target] * high * (1 + 1e-9)
+
+    u, v = csr.endpoints[:, 0], csr.endpoints[:, 1]
+    through = np.minimum(from_start[u] + edge_weights + to_end[v],
+                         from_start[v] + edge_weights + to_end[u])
+    return np.flatnonzero(through <= budget)
+
+
+def solve_scenarios(num_nodes, tails, heads, half_weights, source):
+    # Bellman-Ford for every scenario at once: each round relaxes all legs of all
+    # scenarios with one scatter-min, and stops when no distance changes
+    dist = np.full((half_weights.shape[0], num_nodes), np.inf)
+    dist[:, source] = 0.0
+    for _ in range(num_nodes):
+        candidates = dist[:, tails] + half_weights
+        relaxed = dist.copy()
+        np.minimum.at(relaxed.T, heads, candidates.T)
+        if np.array_equal(relaxed, dist):
+            break
+        dist = relaxed
+
+    # A leg is on a shortest path tree when it lands exactly on its head's distance
+    tight = np.isclose(dist[:, tails] + half_weights, dist[:, heads], rtol=1e-12, atol=0.0)
+    pred = np.full(dist.shape, -1, dtype=np.int64)
+    scenario_ids, leg_ids = np.nonzero(tight)
+    pred[scenario_ids, heads[leg_ids]] = tails[leg_ids]
+    return dist, pred
+
+
+def simulate_delays(network, start_airport, end_airport, scenarios=1000, seed=None,
+                    airport_closure=None, route_closure=None, low=DELAY_LOW, high=DELAY_HIGH):
+    csr = network.csr
+    if start_airport not in csr.index or end_airport not in csr.index:
+        return None
+    source, target = csr.index[start_airport], csr.index[end_airport]
+    edge_weights = network.adjusted_edge_weights(airport_closure, route_closure)
+    legs = candidate_edges(csr, edge_weights, source, target, high)
+    if len(legs) == 0:
+        return None
+
+    # Work on the small subgraph of candidate legs with local airport ids
+    nodes, local_ends = np.unique(csr.endpoints[legs], return_inverse=True)
+    local_ends = local_ends.reshape(-1, 2)
+    local = {int(node): i for i, node in enumerate(nodes)}
+    tails = np.concatenate([local_ends[:, 0], local_ends[:, 1]])
+    heads = np.concatenate([local_ends[:, 1], local_ends[:, 0]])
+
+    delays = sample_delays(scenarios, len(legs), seed, low, high)
+    delayed = delays * edge_weights[legs]
+
+    best_times = np.empty(scenarios)
+    best_paths = []
+    chunk = max(1, MAX_CHUNK_CELLS // (2 * len(legs)))
+    for first in range(0, scenarios, chunk):
+        block = delayed[first:first + chunk]
+        dist, pred = solve_scenarios(len(nodes), tails, heads, np.hstack([block, block]), local[source])
+        best_times[first:first + len(block)] = dist[:, local[target]]
+        for row in pred:
+            path = [local[target]]
+            while path[-1] != local[source]:
+                path.append(row[path[-1]])
+            best_paths.append(tuple(csr.airports[nodes[i]] for i in reversed(path)))
+
+    # Time every winning route in every scenario to rank them by risk, not just by wins
+    leg_column = {}
+    for column, (u, v) in enumerate(csr.endpoints[legs].tolist()):
+        leg_column[(u, v)] = leg_column[(v, u)] = column
+    wins = Counter(best_paths)
+    routes = []
+    for path, count in wins.items():
+        columns = [leg_column[(csr.index[a], csr.index[b])] for a, b in zip(path, path[1:])]
+        path_times = delayed[:, columns].sum(axis=1)
+        routes.append(PathRisk(list(path), count, count / scenarios, float(path_times.mean()),
+                               float(np.percentile(path_times, 95)), float(path_times.max()),
+                               float((path_times - best_times).mean())))
+    routes.sort(key=lambda route: (route.p95_time, route.mean_time))
+
+    percentiles = {p: float(np.percentile(best_times, p)) for p in (5, 25, 50, 75, 95)}
+    return RobustnessReport(scenarios, best_times, percentiles, routes)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rank routes by delay risk over many random scenarios")
+    parser.add_argument('start')
+    parser.add_argument('end')
+    parser.add_argument('--scenarios', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--airport-closure')
+    parser.add_argument('--route-closure')
+    parser.add_argument('--data', default=DATA_PATH)
+    args = parser.parse_args(argv)
+
+    network = RouteNetwork(args.data)
+    report = simulate_delays(network, args.start, args.end, args.scenarios, args.seed,
+                             args.airport_closure, args.route_closure)
+    if report is None:
+        print("No valid path available!")
+        return
+
+    print(f"{report.scenarios} scenarios, best time percentiles (h): "
+          + ", ".join(f"p{p}={t:.2f}" for p, t in report.percentiles.items()))
+    for route in report.routes:
+        print(f"{' -> '.join(route.path):40} wins {route.win_rate:6.1%}  mean {route.mean_time:.2f}h  "
+              f"p95 {route.p95_time:.2f}h  regret {route.mean_regret:.3f}h")
+
+
+if __name__ == "__main__":
+    main()
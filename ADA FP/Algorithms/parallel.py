@@ -0,0 +1,111 @@
+import multiprocessing
+import os
+import threading
+
+from routing import RouteNetwork, RouteQuery, RouteResult
+
+
+# Per-worker state, set once by _init_worker
+_network = None
+_incumbent = None
+# Weights of the last query a worker searched, reused by its other first hops
+_weights_key = None
+_weights = None
+
+
+def _init_worker(network_arrays, incumbent):
+    global _network, _incumbent
+    _network = RouteNetwork.from_edge_list(*network_arrays)
+    _incumbent = incumbent
+
+
+def _search_first_hop(task):
+    global _weights_key, _weights
+    start_airport, end_airport, first_hop, airport_closure, route_closure, delay_seed, time_to_end = task
+    key = (airport_closure, route_closure, delay_seed)
+    if key != _weights_key:
+        _weights_key, _weights = key, _network.query_weights(airport_closure, route_closure, delay_seed=delay_seed)
+    stats = {}
+    path, flight_time = _network.csr.exhaustive_search(
+        start_airport, end_airport, _weights, stats, first_hops=[first_hop], incumbent=_incumbent,
+        time_to_end=time_to_end)
+    return path, flight_time, stats.get('nodes_expanded', 0)
+
+
+def _solve_chunk(task):
+    algorithm, queries = task
+    return _network.solve_batch(queries, algorithm)
+
+
+class RoutingPool:
+    # Worker processes that each hold their own copy of the network. Exhaustive searches
+    # are split by first hop and share the best time found so far through `incumbent`;
+    # batches of independent queries are split into chunks. One exhaustive search runs
+    # at a time since they share the incumbent.
+
+    def __init__(self, network, processes=None):
+        self.network = network
+        self.processes = processes or os.cpu_count() or 1
+        context = multiprocessing.get_context()
+        self.incumbent = context.Value('d', float('inf'))
+        network_arrays = (network.csr.airports, network.csr.endpoints, network.csr.edge_weights,
+                          network.coordinates, network.route_distances, network.route_stops)
+        self.pool = context.Pool(self.processes, initializer=_init_worker,
+                                 initargs=(network_arrays, self.incumbent))
+        self.search_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+    def exhaustive_search(self, start_airport, end_airport, airport_closure=None,
+                          route_closure=None, delay_seed=None):
+        csr = self.network.csr
+        if start_airport not in csr.index or end_airport not in csr.index:
+            return RouteResult(None, None)
+
+        # The reverse shortest path tree is solved once here and shared by every task as
+        # their bound. The route with the fewest legs is the first incumbent, as in the
+        # serial search, so the workers start pruning against a real route.
+        weights = self.network.query_weights(airport_closure, route_closure, delay_seed=delay_seed)
+        source, target = csr.index[start_airport], csr.index[end_airport]
+        time_to_end, _ = csr.shortest_path_tree(target, weights)
+        if time_to_end[source] == float('inf'):
+            return RouteResult(None, None, 0)
+        best_path, best_time = csr.fewest_legs_route(source, target, weights)
+        best_path = [csr.airports[i] for i in best_path]
+
+        # One task per open leg out of the start airport, cheapest first
+        start, end = csr.offsets[source], csr.offsets[source + 1]
+        legs = sorted(zip(weights[start:end].tolist(), csr.neighbors[start:end].tolist()))
+        tasks = [(start_airport, end_airport, csr.airports[v], airport_closure, route_closure, delay_seed,
+                  time_to_end) for w, v in legs if w != float('inf')]
+
+        with self.search_lock:
+            self.incumbent.value = best_time
+            expanded = 0
+            for path, flight_time, nodes in self.pool.imap_unordered(_search_first_hop, tasks):
+                expanded += nodes
+                if path is not None and flight_time < best_time:
+                    best_path, best_time = path, flight_time
+
+        return RouteResult(best_path, best_time, expanded)
+
+    def solve_batch(self, queries, algorithm='dijkstra', chunksize=None):
+        queries = [RouteQuery(*query) if not isinstance(query, RouteQuery) else query
+                   for query in queries]
+        if not queries:
+            return []
+        # A few chunks per worker keeps them busy without losing solve_batch's grouping
+        chunksize = chunksize or max(1, len(queries) // (self.processes * 4))
+        chunks = [(algorithm, queries[i:i + chunksize]) for i in range(0, len(queries), chunksize)]
+        results = []
+        for chunk_results in self.pool.imap(_solve_chunk, chunks):
+            results.extend(chunk_results)
+        return results
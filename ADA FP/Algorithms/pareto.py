@@ -0,0 +1,140 @@
+import argparse
+import heapq
+from collections import namedtuple
+
+import numpy as np
+
+from geo import AVERAGE_SPEED_KMH
+from routing import DATA_PATH, RouteNetwork
+
+
+# Largest front returned; the search stops once this many routes reach the destination
+MAX_FRONT = 20
+
+# Routes with more stops than this are never considered
+MAX_STOPS = 3
+
+# stops = intermediate airports on the route plus scheduled stops within its flights
+ParetoRoute = namedtuple('ParetoRoute', ['path', 'flight_time', 'stops', 'distance'])
+
+
+def dominated(label, front):
+    # True when some label in `front` is at least as good on every criterion
+    for other in front:
+        if other[0] <= label[0] and other[1] <= label[1] and other[2] <= label[2]:
+            return True
+    return False
+
+
+def pareto_routes(network, start_airport, end_airport, airport_closure=None, route_closure=None,
+                  delay_seed=None, max_front=MAX_FRONT, max_stops=MAX_STOPS, stats=None):
+    # Multi-criteria label setting (Martins' algorithm) over (flight time, stops, distance).
+    # Labels come off the heap in time order and each airport keeps its settled
+    # non-dominated labels. A label is dropped when it is dominated at its own airport, or
+    # when its criteria plus lower bounds to the destination are dominated by a route that
+    # already arrived. Every leg costs at least one stop, so no kept label revisits an
+    # airport. Returns the front sorted by flight time, at most `max_front` routes.
+    csr = network.csr
+    if start_airport not in csr.index or end_airport not in csr.index:
+        return []
+    source, target = csr.index[start_airport], csr.index[end_airport]
+
+    times = network.query_weights(airport_closure, route_closure, delay_seed=delay_seed)
+    hops = csr.half_edge_weights(network.route_stops + 1.0)
+    distances = csr.half_edge_weights(network.route_distances)
+    # Lower bounds to the destination per criterion. Time and stops are exact over the open
+    # legs; distance uses the great-circle distance, scaled down so it stays below every
+    # route's recorded distance.
+    time_bound = csr.shortest_path_tree(target, times)[0]
+    if time_bound[source] == float('inf'):
+        return []
+    hop_bound = csr.shortest_path_tree(target, np.where(np.isfinite(times), hops, np.inf))[0]
+    ends = csr.endpoints
+    route_km = network.great_circle_hours(ends[:, 0], ends[:, 1]) * AVERAGE_SPEED_KMH
+    measured = np.isfinite(route_km) & (route_km > 0)
+    scale = min(1.0, (network.route_distances[measured] / route_km[measured]).min(initial=1.0))
+    everywhere = np.arange(len(csr.airports))
+    to_target = network.great_circle_hours(everywhere, np.full(len(everywhere), target)) * AVERAGE_SPEED_KMH
+    distance_bound = np.nan_to_num(to_target * scale, nan=0.0).tolist()
+
+    max_hops = float('inf') if max_stops is None else max_stops + 1
+    offsets = csr.offsets
+    neighbors = csr.neighbors.tolist()
+    times, hops, distances = times.tolist(), hops.tolist(), distances.tolist()
+
+    # Label i is (time, hops, distance) at airport nodes[i], reached from label parents[i]
+    labels = [(0.0, 0.0, 0.0)]
+    nodes = [source]
+    parents = [-1]
+    settled = [[] for _ in csr.airports]
+    arrived = []
+    heap = [(0.0, 0.0, 0.0, 0)]
+    expanded = 0
+
+    while heap and len(arrived) < max_front:
+        t, h, d, i = heapq.heappop(heap)
+        u = nodes[i]
+        if dominated((t, h, d), settled[u]):
+            continue
+        settled[u].append((t, h, d))
+        if u == target:
+            arrived.append(i)
+            continue
+        expanded += 1
+
+        for k in range(offsets[u], offsets[u + 1]):
+            v = neighbors[k]
+            nt = t + times[k]
+            if nt == float('inf'):
+                continue
+            nh, nd = h + hops[k], d + distances[k]
+            if nh + hop_bound[v] > max_hops:
+                continue
+            optimistic = (nt + time_bound[v], nh + hop_bound[v], nd + distance_bound[v])
+            if dominated(optimistic, settled[target]) or dominated((nt, nh, nd), settled[v]):
+                continue
+            labels.append((nt, nh, nd))
+            nodes.append(v)
+            parents.append(i)
+            heapq.heappush(heap, (nt, nh, nd, len(labels) - 1))
+
+    if stats is not None:
+        stats['labels_created'] = len(labels)
+        stats['labels_expanded'] = expanded
+
+    front = []
+    for i in arrived:
+        t, h, d = labels[i]
+        path = []
+        while i != -1:
+            path.append(csr.airports[nodes[i]])
+            i = parents[i]
+        front.append(ParetoRoute(path[::-1], t, int(h) - 1, d))
+    return front
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pareto-optimal routes by flight time, stops and distance")
+    parser.add_argument('start')
+    parser.add_argument('end')
+    parser.add_argument('--max-front', type=int, default=MAX_FRONT)
+    parser.add_argument('--delay-seed', type=int)
+    parser.add_argument('--airport-closure')
+    parser.add_argument('--route-closure')
+    parser.add_argument('--data', default=DATA_PATH)
+    args = parser.parse_args(argv)
+
+    network = RouteNetwork(args.data)
+    front = pareto_routes(network, args.start, args.end, args.airport_closure, args.route_closure,
+                          args.delay_seed, args.max_front)
+    if not front:
+        print("No valid path available!")
+        return
+
+    for route in front:
+        print(f"{' -> '.join(route.path):40} {route.flight_time:6.2f}h  {route.stops} stops  "
+              f"{route.distance:8.0f} km")
+
+
+if __name__ == "__main__":
+    main()
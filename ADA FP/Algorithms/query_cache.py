@@ -0,0 +1,101 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from instrumentation import count
+from routing import RouteResult
+
+
+class QueryCache:
+    # LRU of routing results keyed by the full query plus the network's version stamp,
+    # so results from a different network or data file never come back. Values are a
+    # RouteResult or a list of them. With a path the cache can be saved and reloaded
+    # between runs.
+
+    def __init__(self, max_size=1024, path=None):
+        self.max_size = max_size
+        self.path = path
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self.lock:
+            result = self.entries.get(key)
+            if result is None:
+                self.misses += 1
+                count('query_cache.miss')
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            count('query_cache.hit')
+            return result
+
+    def put(self, key, result):
+        with self.lock:
+            self.entries[key] = result
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'size': len(self.entries), 'max_size': self.max_size, 'hits': self.hits,
+                'misses': self.misses, 'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0}
+
+    @classmethod
+    def load(cls, path, max_size=1024):
+        # A missing or unreadable file just means starting empty
+        cache = cls(max_size, path)
+        try:
+            with open(path) as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return cache
+        for key, value in entries[-max_size:]:
+            cache.entries[_freeze(key)] = _decode(value)
+        return cache
+
+    def save(self, path=None):
+        path = path or self.path
+        if path is None:
+            return
+        with self.lock:
+            entries = [[list(key), _encode(value)] for key, value in self.entries.items()]
+        # Write then rename so an interrupted save leaves the old file intact
+        try:
+            with open(path + '.tmp', 'w') as f:
+                json.dump(entries, f)
+            os.replace(path + '.tmp', path)
+        except OSError:
+            pass
+
+
+def _freeze(value):
+    # JSON turns the tuples in keys into lists, turn them back so they hash
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _encode(value):
+    if isinstance(value, list):
+        return [_encode(item) for item in value]
+    return {'path': value.path,
+            'flight_time': None if value.flight_time is None else float(value.flight_time),
+            'nodes_expanded': None if value.nodes_expanded is None else int(value.nodes_expanded)}
+
+
+def _decode(value):
+    if isinstance(value, list):
+        return [_decode(item) for item in value]
+    return RouteResult(**value)
@@ -0,0 +1,50 @@
+from collections import OrderedDict
+
+import pygame
+
+from instrumentation import count
+
+
+class TextCache:
+    # Memoized font.render keyed by (string, color), least recently used entries go first
+    def __init__(self, font, max_size=512):
+        self.font = font
+        self.max_size = max_size
+        self.surfaces = OrderedDict()
+
+    def render(self, text, color):
+        key = (text, tuple(color))
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            return surface
+
+        count('text_cache.miss')
+        surface = self.font.render(text, True, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_size:
+            self.surfaces.popitem(last=False)
+        return surface
+
+    def clear(self):
+        self.surfaces.clear()
+
+
+class BackgroundCache:
+    # One pre-rendered surface, redrawn only when the key describing its contents changes
+    def __init__(self, size):
+        self.size = size
+        self.key = None
+        self.surface = None
+
+    def get(self, key, draw):
+        if self.surface is None or key != self.key:
+            count('background_cache.redraw')
+            self.surface = pygame.Surface(self.size)
+            draw(self.surface)
+            self.key = key
+        return self.surface
+
+    def invalidate(self):
+        self.key = None
+        self.surface = None
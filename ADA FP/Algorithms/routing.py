@@ -0,0 +1,378 @@
+import hashlib
+import os
+from collections import OrderedDict, namedtuple
+from itertools import islice
+
+import networkx as nx
+import numpy as np
+
+from contraction import ContractionHierarchy
+from csr_graph import CSRGraph
+from geo import AVERAGE_SPEED_KMH, haversine
+from graph_cache import default_cache_dir, load_edge_list
+from instrumentation import count, span
+from shortest_paths import ShortestPathTable
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Preprocessing and scrapping')
+
+# Prefer the columnar dataset written by preprocess.py, fall back to the notebook's CSV
+DATA_PATH = next((path for path in (os.path.join(DATA_DIR, 'routes and distances.parquet'),
+                                    os.path.join(DATA_DIR, 'routes and distances.feather'))
+                  if os.path.exists(path)),
+                 os.path.join(DATA_DIR, 'routes and distances.csv'))
+
+# The original ten-airport demo network, RouteNetwork(airports=AIRPORTS) restricts to it
+AIRPORTS = ['LCE', 'GCM', 'GJA', 'PEU', 'RTB', 'SAP', 'TGU', 'UII', 'CLT', 'MIA']
+
+# How many closure variants of the all-pairs table are kept next to the open network
+MAX_CLOSURE_TABLES = 16
+
+# Above this many airports the dense all-pairs table costs more than it saves
+MAX_TABLE_AIRPORTS = 500
+
+# A contraction hierarchy left with a bigger uncontracted core than this routes slower
+# than plain Dijkstra
+MAX_HIERARCHY_CORE = 256
+
+# delay_seed=None means the query runs without delays
+RouteQuery = namedtuple('RouteQuery', ['start', 'end', 'airport_closure', 'route_closure', 'delay_seed'],
+                        defaults=[None, None, None])
+RouteResult = namedtuple('RouteResult', ['path', 'flight_time', 'nodes_expanded'], defaults=[None])
+
+ALGORITHMS = ('dijkstra', 'brute_force', 'astar', 'ch')
+
+
+def parse_route(route):
+    # Accepts the "LCE-GCM" labels used by the route closure dropdown as well as pairs
+    if route is None or route == "None":
+        return None
+    if isinstance(route, str):
+        return tuple(route.split("-"))
+    return tuple(route)
+
+
+class RouteNetwork:
+    # Set to a query_cache.QueryCache to memoize find_route and alternative_routes
+    query_cache = None
+
+    def __init__(self, data_path=DATA_PATH, airports=None):
+        # airports=None routes over every airport in the data
+        self.data_path = data_path
+        self.selected_airports = None if airports is None else list(airports)
+        self.load_data()
+
+    @classmethod
+    def from_edge_list(cls, airports, edges, weights, coordinates, distances=None, stops=None):
+        # Build straight from arrays shaped like graph_cache.load_edge_list output, no CSV needed
+        network = cls.__new__(cls)
+        network.data_path = None
+        network.selected_airports = None
+        network.build(np.asarray(airports, dtype=str), np.asarray(edges), np.asarray(weights),
+                      np.asarray(coordinates, dtype=np.float64), distances, stops)
+        return network
+
+    def load_data(self):
+        with span('load_data', path=str(self.data_path)):
+            arrays = load_edge_list(self.data_path)
+            with span('build_network'):
+                self.build(*arrays)
+
+    def build(self, airports, edges, weights, coordinates, distances=None, stops=None):
+        # Without distances they follow from flight time at cruise speed, without stops
+        # every route is nonstop
+        airports = np.asarray(airports)
+        edges = np.asarray(edges, dtype=np.int64)
+        weights = np.asarray(weights, dtype=np.float64)
+        distances = weights * AVERAGE_SPEED_KMH if distances is None else np.asarray(distances, dtype=np.float64)
+        stops = np.zeros(len(weights), dtype=np.int32) if stops is None else np.asarray(stops, dtype=np.int32)
+
+        # Keep only routes between the selected airports
+        if self.selected_airports is not None:
+            selected = np.isin(airports, self.selected_airports)
+            mask = selected[edges[:, 0]] & selected[edges[:, 1]]
+            edges, weights, distances, stops = edges[mask], weights[mask], distances[mask], stops[mask]
+
+        # One undirected route per airport pair. As when adding rows to an nx.Graph one by
+        # one, a pair keeps the position of its first row and the data of its last.
+        keys = np.minimum(edges[:, 0], edges[:, 1]) * len(airports) + np.maximum(edges[:, 0], edges[:, 1])
+        _, first = np.unique(keys, return_index=True)
+        _, last_reversed = np.unique(keys[::-1], return_index=True)
+        order = np.argsort(first)
+        endpoints = edges[first[order]]
+        last = len(keys) - 1 - last_reversed[order]
+        route_weights = weights[last]
+
+        # Airports with at least one route get compact ids in data order. Building the
+        # CSR graph from arrays keeps edge ids stable for anything rebuilt from them.
+        used = np.unique(endpoints)
+        compact = np.full(len(airports), -1, dtype=np.int64)
+        compact[used] = np.arange(len(used))
+        self.csr = CSRGraph(airports[used].tolist(), compact[endpoints], route_weights)
+
+        # (latitude, longitude) per airport, aligned with self.csr.airports
+        self.coordinates = np.asarray(coordinates, dtype=np.float64)[used]
+        # Distance in km and scheduled intermediate stops per route, aligned with csr edge ids
+        self.route_distances = distances[last]
+        self.route_stops = stops[last]
+
+        self.G = nx.Graph()
+        self.G.add_nodes_from(self.csr.airports)
+        self.G.add_weighted_edges_from((u, v, w) for (u, v), w in
+                                       zip(self.csr.edge_pairs(), self.csr.edge_weights.tolist()))
+        self.airports = sorted(self.csr.airports)
+
+        # Flight times are great-circle distance / AVERAGE_SPEED_KMH rounded to the minute,
+        # so scale the A* bound by the smallest time/bound ratio of any route. That keeps it
+        # below every leg and, with the triangle inequality, consistent. Delays only
+        # lengthen legs and closures remove them, so it holds for every query.
+        ends = self.csr.endpoints
+        leg_bounds = self.great_circle_hours(ends[:, 0], ends[:, 1])
+        measured = np.isfinite(leg_bounds) & (leg_bounds > 0)
+        ratios = self.csr.edge_weights[measured] / leg_bounds[measured]
+        self.heuristic_scale = float(min(1.0, ratios.min())) if len(ratios) else 0.0
+
+        # Stamp of the routed network, part of every query cache key so a rebuilt or
+        # different network never reuses results
+        digest = hashlib.sha1()
+        digest.update('\n'.join(self.csr.airports).encode())
+        digest.update(self.csr.endpoints.tobytes())
+        digest.update(self.csr.edge_weights.tobytes())
+        self.version = digest.hexdigest()[:16]
+
+        # All-pairs tables per closure combination, built on first use, least recently used first
+        self._tables = OrderedDict()
+        # Contraction hierarchy over the open network, loaded or built on first use
+        self._hierarchy = None
+
+    def shortest_path_table(self, airport_closure=None, route_closure=None):
+        if airport_closure == "None":
+            airport_closure = None
+        route_closure = parse_route(route_closure)
+        key = (airport_closure, route_closure)
+        if key in self._tables:
+            self._tables.move_to_end(key)
+            return self._tables[key]
+
+        if (None, None) not in self._tables:
+            with span('table.build', airports=len(self.csr.airports)):
+                self._tables[(None, None)] = ShortestPathTable.from_graph(self.G)
+        table = self._tables[(None, None)]
+
+        # Derive closure tables from the open network, repairing only what the closure touches
+        if key != (None, None):
+            with span('table.repair'):
+                table = table.copy()
+                if airport_closure is not None:
+                    table.remove_airport(airport_closure)
+                if route_closure is not None:
+                    table.remove_route(*route_closure)
+            # The open network's table is never evicted, the closure variants take turns
+            while len(self._tables) > MAX_CLOSURE_TABLES:
+                oldest = next(k for k in self._tables if k != (None, None))
+                del self._tables[oldest]
+            self._tables[key] = table
+        return table
+
+    def contraction_hierarchy(self, rebuild=False, progress=None):
+        # Saved next to the graph cache and reused while the network version matches.
+        # progress reaches the build, which can take a while on big networks.
+        if self._hierarchy is not None and not rebuild:
+            return self._hierarchy
+        path = None
+        if self.data_path is not None and self.selected_airports is None:
+            path = os.path.join(default_cache_dir(self.data_path), 'contraction_hierarchy.npz')
+        if path is not None and not rebuild:
+            with span('ch.load'):
+                self._hierarchy = ContractionHierarchy.load(path, self.version)
+        if self._hierarchy is None or rebuild:
+            with span('ch.build', airports=len(self.csr.airports)):
+                self._hierarchy = ContractionHierarchy.build(self.csr, self.version, progress)
+            if path is not None:
+                try:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    self._hierarchy.save(path)
+                except OSError:
+                    pass
+        return self._hierarchy
+
+    def adjusted_edge_weights(self, airport_closure=None, route_closure=None, enable_delays=False,
+                              delay_seed=None):
+        # Closures and delays as a weight per self.csr edge instead of a graph copy, closed edges are inf
+        if airport_closure == "None":
+            airport_closure = None
+        route_closure = parse_route(route_closure)
+        with span('adjust_weights'):
+            open_edges = None
+            if airport_closure is not None or route_closure is not None:
+                route_closures = [route_closure] if route_closure is not None else []
+                open_edges = self.csr.closure_mask(airport_closure, route_closures)
+            delay_factors = None
+            if enable_delays or delay_seed is not None:
+                delay_factors = self.csr.delay_factors(delay_seed)
+            return self.csr.adjusted_edge_weights(open_edges, delay_factors)
+
+    def query_weights(self, airport_closure=None, route_closure=None, enable_delays=False, delay_seed=None):
+        # The same adjusted weights spread over self.csr half-edges
+        edge_weights = self.adjusted_edge_weights(airport_closure, route_closure, enable_delays, delay_seed)
+        return self.csr.half_edge_weights(edge_weights)
+
+    def great_circle_hours(self, sources, targets):
+        lat1, lon1 = self.coordinates[sources, 0], self.coordinates[sources, 1]
+        lat2, lon2 = self.coordinates[targets, 0], self.coordinates[targets, 1]
+        return haversine(lat1, lon1, lat2, lon2) / AVERAGE_SPEED_KMH
+
+    def time_lower_bounds(self, end_airport):
+        # A* heuristic: scaled great-circle time from every airport to end_airport, 0 where unknown
+        target = np.full(len(self.csr.airports), self.csr.index[end_airport])
+        bounds = self.great_circle_hours(np.arange(len(self.csr.airports)), target)
+        return np.nan_to_num(bounds * self.heuristic_scale, nan=0.0)
+
+    def use_table(self):
+        return len(self.csr.airports) <= MAX_TABLE_AIRPORTS
+
+    def solve(self, algorithm, weights, start_airport, end_airport, stats=None, progress=None):
+        # progress reaches the exhaustive search and a hierarchy build, everything else
+        # finishes in milliseconds
+        if algorithm == 'dijkstra':
+            return self.csr.dijkstra(start_airport, end_airport, weights, stats)
+        elif algorithm == 'brute_force':
+            return self.csr.exhaustive_search(start_airport, end_airport, weights, stats,
+                                              progress=progress)
+        elif algorithm == 'astar':
+            if end_airport not in self.csr.index:
+                return None, None
+            heuristic = self.time_lower_bounds(end_airport)
+            return self.csr.astar(start_airport, end_airport, heuristic, weights, stats)
+        elif algorithm == 'ch':
+            # The hierarchy only knows the base flight times; query_weights hands those
+            # back unchanged when there are no closures or delays, anything else, or a
+            # network that barely contracts, is routed with plain Dijkstra
+            if weights is None or weights is self.csr.weights:
+                hierarchy = self.contraction_hierarchy(progress=progress)
+                if hierarchy.core_size <= MAX_HIERARCHY_CORE:
+                    return hierarchy.shortest_path(start_airport, end_airport, stats)
+            return self.csr.dijkstra(start_airport, end_airport, weights, stats)
+        raise ValueError(f"Unknown algorithm: {algorithm}")
+
+    def query_key(self, algorithm, start_airport, end_airport, airport_closure=None,
+                  route_closure=None, enable_delays=False, delay_seed=None):
+        # None when the query can't be cached: delays without a seed are random every run
+        if enable_delays and delay_seed is None:
+            return None
+        if airport_closure == "None":
+            airport_closure = None
+        return (algorithm, start_airport, end_airport, airport_closure, parse_route(route_closure),
+                delay_seed, self.version)
+
+    def cached(self, key, solve):
+        if key is None or self.query_cache is None:
+            return solve()
+        result = self.query_cache.get(key)
+        if result is None:
+            result = solve()
+            self.query_cache.put(key, result)
+        return result
+
+    def find_route(self, algorithm, start_airport, end_airport, airport_closure=None,
+                   route_closure=None, enable_delays=False, delay_seed=None, progress=None, use_cache=True):
+        # use_cache=False for one-off queries, such as a freshly drawn delay seed, whose
+        # results would only push reusable ones out of the cache
+        key = None
+        if use_cache:
+            key = self.query_key(algorithm, start_airport, end_airport, airport_closure, route_closure,
+                                 enable_delays, delay_seed)
+        return self.cached(key, lambda: self._find_route(algorithm, start_airport, end_airport, airport_closure,
+                                                         route_closure, enable_delays, delay_seed, progress))
+
+    def _find_route(self, algorithm, start_airport, end_airport, airport_closure, route_closure,
+                    enable_delays, delay_seed, progress):
+        if algorithm == 'dijkstra' and not enable_delays and delay_seed is None and self.use_table():
+            with span('route.table'):
+                table = self.shortest_path_table(airport_closure, route_closure)
+                path = table.path(start_airport, end_airport)
+            if path is None:
+                return RouteResult(None, None)
+            return RouteResult(path, table.distance(start_airport, end_airport))
+
+        weights = self.query_weights(airport_closure, route_closure, enable_delays, delay_seed)
+        stats = {}
+        with span('route.' + algorithm) as route_span:
+            path, flight_time = self.solve(algorithm, weights, start_airport, end_airport, stats, progress)
+            route_span.annotate(**stats)
+        for name, value in stats.items():
+            count(algorithm + '.' + name, value)
+        if path is None:
+            return RouteResult(None, None, stats.get('nodes_expanded'))
+        return RouteResult(path, flight_time, stats.get('nodes_expanded'))
+
+    def alternative_routes(self, start_airport, end_airport, k=3, airport_closure=None,
+                           route_closure=None, enable_delays=False, delay_seed=None, use_cache=True):
+        # The k fastest loopless routes, fastest first; fewer when fewer exist
+        key = None
+        if use_cache:
+            key = self.query_key(f'alternatives-{k}', start_airport, end_airport, airport_closure,
+                                 route_closure, enable_delays, delay_seed)
+        return self.cached(key, lambda: self._alternative_routes(start_airport, end_airport, k, airport_closure,
+                                                                 route_closure, enable_delays, delay_seed))
+
+    def _alternative_routes(self, start_airport, end_airport, k, airport_closure, route_closure,
+                            enable_delays, delay_seed):
+        edge_weights = self.adjusted_edge_weights(airport_closure, route_closure, enable_delays, delay_seed)
+        stats = {}
+        with span('route.alternatives', k=k) as route_span:
+            routes = self.csr.k_shortest_paths(start_airport, end_airport, edge_weights, stats)
+            results = [RouteResult(path, flight_time) for path, flight_time in islice(routes, k)]
+            route_span.annotate(**stats)
+        return results
+
+    def solve_batch(self, queries, algorithm='dijkstra'):
+        queries = [RouteQuery(*query) if not isinstance(query, RouteQuery) else query
+                   for query in queries]
+        with span('route.batch', algorithm=algorithm, queries=len(queries)):
+            return self._solve_batch(queries, algorithm)
+
+    def _solve_batch(self, queries, algorithm):
+        # Undelayed Dijkstra queries are table lookups. Otherwise queries sharing closures
+        # and delay seed share one weight vector, and Dijkstra queries that also share a
+        # start share one single-source search
+        results = [None] * len(queries)
+
+        groups = {}
+        for index, query in enumerate(queries):
+            key = (query.airport_closure, parse_route(query.route_closure), query.delay_seed)
+            groups.setdefault(key, []).append(index)
+
+        for (airport_closure, route_closure, delay_seed), indices in groups.items():
+            if algorithm == 'dijkstra' and delay_seed is None and self.use_table():
+                table = self.shortest_path_table(airport_closure, route_closure)
+                for index in indices:
+                    path = table.path(queries[index].start, queries[index].end)
+                    flight_time = table.distance(queries[index].start, queries[index].end)
+                    results[index] = RouteResult(path, flight_time)
+                continue
+
+            weights = self.query_weights(airport_closure, route_closure, delay_seed=delay_seed)
+
+            if algorithm != 'dijkstra':
+                for index in indices:
+                    path, flight_time = self.solve(algorithm, weights, queries[index].start, queries[index].end)
+                    results[index] = RouteResult(path, flight_time if path is not None else None)
+                continue
+
+            by_start = {}
+            for index in indices:
+                by_start.setdefault(queries[index].start, []).append(index)
+
+            for start_airport, start_indices in by_start.items():
+                if start_airport in self.csr.index:
+                    source = self.csr.index[start_airport]
+                    times, pred = self.csr.shortest_path_tree(source, weights)
+                for index in start_indices:
+                    target = self.csr.index.get(queries[index].end)
+                    if start_airport not in self.csr.index or target is None or times[target] == float('inf'):
+                        results[index] = RouteResult(None, None)
+                    else:
+                        results[index] = RouteResult(self.csr.unpack_path(pred, source, target), times[target])
+
+        return results
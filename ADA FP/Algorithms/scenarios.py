@@ -0,0 +1,256 @@
+import argparse
+import heapq
+from collections import namedtuple
+
+import numpy as np
+
+from instrumentation import span
+from routing import DATA_PATH, RouteNetwork, parse_route
+
+
+# Above this many airports the sweep measures travel time from a seeded sample of this
+# many origins to every airport, instead of over all pairs
+MAX_SOURCES = 200
+
+# A set of simultaneous closures: airport codes and (airport, airport) routes
+Scenario = namedtuple('Scenario', ['airports', 'routes'], defaults=[(), ()])
+
+# Measured over (origin, destination) pairs with both ends open and connected before the
+# closures: extra_hours is the added travel time over pairs still connected, disconnected
+# the pairs left without any route, affected the pairs that got slower or disconnected
+Impact = namedtuple('Impact', ['scenario', 'extra_hours', 'disconnected', 'affected'])
+
+
+def describe(scenario):
+    closed = list(scenario.airports) + ['-'.join(route) for route in scenario.routes]
+    return ', '.join(closed) or "nothing"
+
+
+def rank_impacts(impacts):
+    # Worst first: lost connections outweigh any amount of extra travel time
+    return sorted(impacts, key=lambda impact: (-impact.disconnected, -impact.extra_hours))
+
+
+class ScenarioEngine:
+    # What-if closures as overlays on the base network. Shortest path trees from every
+    # origin are solved once; a closure set never copies the graph, it only cuts the
+    # subtrees hanging below closed legs and airports, and re-labels just those airports
+    # from the rest of the tree. Trees the closures don't touch are reused as they are,
+    # so a sweep costs about the size of the subtrees it cuts.
+
+    def __init__(self, network, sources=None, max_sources=MAX_SOURCES, seed=0):
+        csr = self.csr = network.csr
+        self.network = network
+        n = len(csr.airports)
+        if sources is None:
+            if n <= max_sources:
+                sources = range(n)
+            else:
+                sources = np.sort(np.random.default_rng(seed).choice(n, max_sources, replace=False))
+        else:
+            sources = [csr.index[airport] for airport in sources]
+        self.sources = [int(source) for source in sources]
+
+        # The base network as plain lists for the repair loop
+        self._offsets = csr.offsets.tolist()
+        self._neighbors = csr.neighbors.tolist()
+        self._weights = csr.weights.tolist()
+        self._edge_ids = csr.edge_ids.tolist()
+
+        with span('scenarios.trees', sources=len(self.sources)):
+            self._dist = []
+            self._pred = []
+            self._children = []
+            tree_edges = []
+            for source in self.sources:
+                dist, pred = csr.shortest_path_tree(source)
+                children = [[] for _ in range(n)]
+                for v, u in enumerate(pred):
+                    if u != -1:
+                        children[u].append(v)
+                self._dist.append(dist)
+                self._pred.append(pred)
+                self._children.append(children)
+                tree_edges.append(self._tree_edges(pred))
+
+        # Which trees use each route, so a route closure goes straight to the trees it cuts
+        tree_ids = np.repeat(np.arange(len(self.sources)), [len(edges) for edges in tree_edges])
+        edges = np.concatenate(tree_edges) if tree_edges else np.array([], dtype=np.int64)
+        order = np.argsort(edges, kind='stable')
+        self._users = tree_ids[order]
+        self._user_offsets = np.zeros(csr.num_edges + 1, dtype=np.int64)
+        np.cumsum(np.bincount(edges, minlength=csr.num_edges), out=self._user_offsets[1:])
+
+    def _tree_edges(self, pred):
+        # Edge id of the tree leg into every reached airport other than the root
+        pred = np.asarray(pred)
+        heads = np.flatnonzero(pred >= 0)
+        tails = pred[heads]
+        offsets = self._offsets
+        edges = np.empty(len(heads), dtype=np.int64)
+        for i, (u, v) in enumerate(zip(tails.tolist(), heads.tolist())):
+            start = offsets[u]
+            legs = self._neighbors[start:offsets[u + 1]]
+            edges[i] = self._edge_ids[start + legs.index(v)]
+        return edges
+
+    def closed_edges(self, scenario):
+        # Edge ids of every route the scenario closes, directly or through an airport
+        csr = self.csr
+        closed = set()
+        for airport in scenario.airports:
+            if airport in csr.index:
+                c = csr.index[airport]
+                closed.update(csr.edge_ids[csr.offsets[c]:csr.offsets[c + 1]].tolist())
+        for route in scenario.routes:
+            route = parse_route(route)
+            if route is not None and all(airport in csr.index for airport in route):
+                edge = csr.edge_id(csr.index[route[0]], csr.index[route[1]])
+                if edge is not None:
+                    closed.add(edge)
+        return closed
+
+    def overlay_weights(self, scenario):
+        # Half-edge weights with the scenario's routes closed, for any csr search
+        open_edges = np.ones(self.csr.num_edges, dtype=bool)
+        open_edges[list(self.closed_edges(scenario))] = False
+        return self.csr.query_weights(open_edges)
+
+    def evaluate(self, scenario):
+        return self.evaluate_many([scenario])[0]
+
+    def evaluate_many(self, scenarios):
+        with span('scenarios.evaluate', scenarios=len(scenarios)):
+            return [self._evaluate(scenario) for scenario in scenarios]
+
+    def _evaluate(self, scenario):
+        csr = self.csr
+        closed_edges = self.closed_edges(scenario)
+        closed_airports = {csr.index[airport] for airport in scenario.airports if airport in csr.index}
+
+        # Trees cut by a closed route; an airport closure cuts every tree through its legs
+        touched = set()
+        for edge in closed_edges:
+            touched.update(self._users[self._user_offsets[edge]:self._user_offsets[edge + 1]].tolist())
+
+        extra_hours = 0.0
+        disconnected = affected = 0
+        for tree in touched:
+            if self.sources[tree] in closed_airports:
+                continue
+            hours, lost, changed = self._repair(tree, closed_edges, closed_airports)
+            extra_hours += hours
+            disconnected += lost
+            affected += changed
+        return Impact(scenario, extra_hours, disconnected, affected)
+
+    def _repair(self, tree, closed_edges, closed_airports):
+        # Cut every subtree hanging below a closed leg, then Dijkstra over just the cut
+        # airports, seeded from their open legs into the intact rest of the tree
+        dist, pred, children = self._dist[tree], self._pred[tree], self._children[tree]
+        offsets, neighbors, weights, edge_ids = self._offsets, self._neighbors, self._weights, self._edge_ids
+
+        cut = set()
+        stack = []
+        for edge in closed_edges:
+            a, b = self.csr.endpoints[edge].tolist()
+            for child, parent in ((a, b), (b, a)):
+                if pred[child] == parent and child not in cut:
+                    cut.add(child)
+                    stack.append(child)
+        while stack:
+            for child in children[stack.pop()]:
+                if child not in cut:
+                    cut.add(child)
+                    stack.append(child)
+
+        new_dist = {}
+        heap = []
+        for v in cut:
+            if v in closed_airports:
+                continue
+            best = float('inf')
+            for k in range(offsets[v], offsets[v + 1]):
+                u = neighbors[k]
+                if u not in cut and edge_ids[k] not in closed_edges and dist[u] + weights[k] < best:
+                    best = dist[u] + weights[k]
+            if best < float('inf'):
+                new_dist[v] = best
+                heap.append((best, v))
+        heapq.heapify(heap)
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > new_dist[u]:
+                continue
+            for k in range(offsets[u], offsets[u + 1]):
+                v = neighbors[k]
+                if v in cut and v not in closed_airports and edge_ids[k] not in closed_edges:
+                    nd = d + weights[k]
+                    if nd < new_dist.get(v, float('inf')):
+                        new_dist[v] = nd
+                        heapq.heappush(heap, (nd, v))
+
+        extra_hours = 0.0
+        disconnected = changed = 0
+        for v in cut:
+            if v in closed_airports:
+                continue
+            if v not in new_dist:
+                disconnected += 1
+                changed += 1
+            elif new_dist[v] > dist[v] + 1e-9:
+                extra_hours += new_dist[v] - dist[v]
+                changed += 1
+        return extra_hours, disconnected, changed
+
+    def sweep_airports(self, airports=None):
+        # Close each airport on its own, worst first
+        airports = self.csr.airports if airports is None else airports
+        return rank_impacts(self.evaluate_many([Scenario(airports=(airport,)) for airport in airports]))
+
+    def sweep_routes(self, routes=None):
+        # Close each route on its own, worst first. Routes on no shortest path tree can't
+        # change any travel time, so the default sweep skips them.
+        if routes is None:
+            used = np.flatnonzero(np.diff(self._user_offsets) > 0)
+            pairs = list(self.csr.edge_pairs())
+            routes = [pairs[edge] for edge in used.tolist()]
+        return rank_impacts(self.evaluate_many([Scenario(routes=(tuple(route),)) for route in routes]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rank airport or route closures by their impact on travel times")
+    parser.add_argument('--sweep', choices=['airports', 'routes'],
+                        help="close each airport or route in turn")
+    parser.add_argument('--close-airport', action='append', default=[], metavar='CODE',
+                        help="close this airport, repeat for more")
+    parser.add_argument('--close-route', action='append', default=[], metavar='A-B',
+                        help="close this route, repeat for more")
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--sources', type=int, default=MAX_SOURCES,
+                        help="origins sampled on networks with more airports than this")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data', default=DATA_PATH)
+    args = parser.parse_args(argv)
+    if args.sweep is None and not args.close_airport and not args.close_route:
+        parser.error("give --sweep or at least one --close-airport/--close-route")
+
+    network = RouteNetwork(args.data)
+    engine = ScenarioEngine(network, max_sources=args.sources, seed=args.seed)
+    print(f"Travel times from {len(engine.sources)} of {len(network.csr.airports)} airports")
+
+    if args.sweep == 'airports':
+        impacts = engine.sweep_airports()[:args.top]
+    elif args.sweep == 'routes':
+        impacts = engine.sweep_routes()[:args.top]
+    else:
+        impacts = [engine.evaluate(Scenario(tuple(args.close_airport),
+                                            tuple(parse_route(route) for route in args.close_route)))]
+
+    for impact in impacts:
+        print(f"{describe(impact.scenario):30} {impact.disconnected:7} disconnected  "
+              f"{impact.affected:7} slower or lost  +{impact.extra_hours:10.1f} h")
+
+
+if __name__ == "__main__":
+    main()
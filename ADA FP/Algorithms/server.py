@@ -0,0 +1,492 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qsl, urlencode
+
+import numpy as np
+
+from contraction import ContractionHierarchy
+from instrumentation import span
+from query_cache import QueryCache
+from routing import ALGORITHMS, DATA_PATH, RouteNetwork
+from scenarios import MAX_SOURCES, Scenario, ScenarioEngine
+
+
+DEFAULT_PORT = 8765
+
+# Results kept in the server process, so repeated queries never reach a worker
+QUERY_CACHE_SIZE = 4096
+
+# A request still unanswered after this many seconds gets a 504; the worker finishes it
+# anyway, since a process pool task can't be interrupted
+REQUEST_TIMEOUT = 30.0
+
+# Limits on what a client may send
+MAX_BODY_BYTES = 1 << 20
+MAX_HEADERS = 100
+MAX_ALTERNATIVES = 10
+
+# Latencies kept per endpoint for the percentiles, and the window throughput is measured over
+LATENCY_WINDOW = 10_000
+THROUGHPUT_WINDOW = 10.0
+
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+               413: 'Payload Too Large', 500: 'Internal Server Error', 504: 'Gateway Timeout'}
+
+
+class RequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+# Per-worker state, set once by _init_worker
+_network = None
+_scenario_engine = None
+_scenario_sources = MAX_SOURCES
+
+
+def _init_worker(network_arrays, scenario_sources, hierarchy_arrays):
+    global _network, _scenario_sources
+    _network = RouteNetwork.from_edge_list(*network_arrays)
+    _scenario_sources = scenario_sources
+    # Networks rebuilt from arrays have no data path to find a saved index by, so the
+    # server hands over its own rather than have every worker contract the graph again
+    if hierarchy_arrays is not None:
+        _network._hierarchy = ContractionHierarchy(*hierarchy_arrays)
+
+
+def _find_route(query):
+    return _network.find_route(*query)
+
+
+def _alternative_routes(query):
+    start_airport, end_airport, k, airport_closure, route_closure, enable_delays, delay_seed = query
+    return _network.alternative_routes(start_airport, end_airport, k, airport_closure, route_closure,
+                                       enable_delays, delay_seed)
+
+
+def _evaluate_scenario(scenario):
+    # The shortest path trees are built on a worker's first scenario and kept after that
+    global _scenario_engine
+    if _scenario_engine is None:
+        _scenario_engine = ScenarioEngine(_network, max_sources=_scenario_sources)
+    return _scenario_engine.evaluate(scenario)
+
+
+class ServerMetrics:
+    # Request counts, errors and recent latencies per endpoint. Only touched from the
+    # event loop thread, so no locking.
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.started = time.monotonic()
+        self.requests = Counter()
+        self.errors = Counter()
+        self.cache_hits = Counter()
+        self.latencies = {}
+        self.finished = deque()
+        self.window = window
+        self.in_flight = 0
+
+    def record(self, endpoint, seconds, error=False):
+        now = time.monotonic()
+        self.requests[endpoint] += 1
+        if error:
+            self.errors[endpoint] += 1
+        self.latencies.setdefault(endpoint, deque(maxlen=self.window)).append(seconds)
+        self.finished.append(now)
+        while self.finished and self.finished[0] < now - THROUGHPUT_WINDOW:
+            self.finished.popleft()
+
+    def summary(self):
+        now = time.monotonic()
+        uptime = now - self.started
+        recent = sum(1 for finished in self.finished if finished >= now - THROUGHPUT_WINDOW)
+        endpoints = {}
+        for endpoint, latencies in self.latencies.items():
+            p50, p95, p99 = np.percentile(np.fromiter(latencies, float) * 1000, [50, 95, 99]).tolist()
+            endpoints[endpoint] = {'requests': self.requests[endpoint], 'errors': self.errors[endpoint],
+                                   'cache_hits': self.cache_hits[endpoint],
+                                   'latency_ms': {'p50': p50, 'p95': p95, 'p99': p99,
+                                                  'max': max(latencies) * 1000}}
+        total = sum(self.requests.values())
+        return {'uptime_s': uptime, 'in_flight': self.in_flight, 'requests': total,
+                'errors': sum(self.errors.values()),
+                'throughput_qps': recent / min(THROUGHPUT_WINDOW, uptime) if uptime else 0.0,
+                'mean_qps': total / uptime if uptime else 0.0, 'endpoints': endpoints}
+
+
+def route_json(result):
+    return {'path': result.path, 'flight_time': result.flight_time, 'nodes_expanded': result.nodes_expanded}
+
+
+def split_list(value):
+    # Lists come as JSON arrays in a POST body, or comma-separated / repeated in a query
+    # string. Only strings are split, so [src, dst] pairs inside an array stay whole.
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [item for item in value.split(',') if item]
+    if not isinstance(value, list):
+        raise RequestError(400, f"Expected a list, got {json.dumps(value)}")
+    return [item for part in value for item in (split_list(part) if isinstance(part, str) else [part])]
+
+
+class RouteServer:
+    # HTTP/JSON front end for one RouteNetwork. The graph is loaded once here and shipped
+    # to the worker processes as arrays; the event loop only parses requests, answers
+    # repeated queries from the shared cache and waits on the pool, so slow searches never
+    # hold up other clients. Every endpoint takes its parameters from the query string or
+    # a JSON object body:
+    #   /route         start, end, algorithm, airport_closure, route_closure, delays, delay_seed
+    #   /alternatives  start, end, k, airport_closure, route_closure, delays, delay_seed
+    #   /scenario      airports, routes  (closed together)
+    #   /metrics       throughput, latency percentiles and cache stats
+    #   /health
+
+    def __init__(self, network, workers=None, scenario_sources=MAX_SOURCES, timeout=REQUEST_TIMEOUT,
+                 hierarchy=None):
+        self.network = network
+        if network.query_cache is None:
+            network.query_cache = QueryCache(QUERY_CACHE_SIZE)
+        self.timeout = timeout
+        self.metrics = ServerMetrics()
+        network_arrays = (network.csr.airports, network.csr.endpoints, network.csr.edge_weights,
+                          network.coordinates, network.route_distances, network.route_stops)
+        # Built or loaded once here; without one, algorithm=ch is refused rather than left
+        # for every worker to build on its first request
+        self.hierarchy = hierarchy
+        hierarchy_arrays = hierarchy.arrays() if hierarchy is not None else None
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                        initargs=(network_arrays, scenario_sources, hierarchy_arrays))
+        self.handlers = {'route': self.route, 'alternatives': self.alternatives, 'scenario': self.scenario,
+                         'metrics': self.metrics_summary, 'health': self.health}
+        self.server = None
+        # Open connections, handler task to its writer
+        self.connections = {}
+
+    async def start(self, host='127.0.0.1', port=DEFAULT_PORT):
+        self.server = await asyncio.start_server(self.handle_connection, host, port)
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def close(self):
+        # Hang up on idle keep-alive clients so their handlers finish instead of being cancelled
+        if self.server is not None:
+            self.server.close()
+            for writer in self.connections.values():
+                writer.close()
+            await asyncio.gather(*self.connections, return_exceptions=True)
+            await self.server.wait_closed()
+        self.pool.shutdown(cancel_futures=True)
+
+    async def handle_connection(self, reader, writer):
+        # HTTP/1.1 with keep-alive, one request at a time per connection
+        self.connections[asyncio.current_task()] = writer
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except RequestError as error:
+                    write_response(writer, error.status, {'error': error.message}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                method, target, headers, body = request
+                status, payload = await self.dispatch(method, target, body)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            del self.connections[asyncio.current_task()]
+            writer.close()
+
+    async def dispatch(self, method, target, body):
+        path, _, query = target.partition('?')
+        endpoint = path.strip('/')
+        handler = self.handlers.get(endpoint)
+        if handler is None:
+            return 404, {'error': f"Unknown endpoint: /{endpoint}"}
+        if method not in ('GET', 'POST'):
+            return 405, {'error': f"Method not allowed: {method}"}
+
+        start_time = time.perf_counter()
+        self.metrics.in_flight += 1
+        status = 200
+        try:
+            with span('server.' + endpoint):
+                payload = await handler(self.parse_params(query, body))
+        except RequestError as error:
+            status, payload = error.status, {'error': error.message}
+        except asyncio.TimeoutError:
+            status, payload = 504, {'error': f"No answer within {self.timeout:g} s"}
+        except Exception as error:
+            status, payload = 500, {'error': f"{type(error).__name__}: {error}"}
+        finally:
+            self.metrics.in_flight -= 1
+        if endpoint != 'metrics':
+            self.metrics.record(endpoint, time.perf_counter() - start_time, error=status != 200)
+        return status, payload
+
+    def parse_params(self, query, body):
+        params = {}
+        for name, value in parse_qsl(query):
+            params[name] = value if name not in params else split_list(params[name]) + [value]
+        if body:
+            try:
+                posted = json.loads(body)
+            except ValueError:
+                raise RequestError(400, "Body is not valid JSON")
+            if not isinstance(posted, dict):
+                raise RequestError(400, "Body must be a JSON object")
+            params.update(posted)
+        return params
+
+    def airport(self, params, name):
+        airport = params.get(name)
+        if airport is None:
+            raise RequestError(400, f"Missing parameter: {name}")
+        return self.known_airport(airport)
+
+    def known_airport(self, airport):
+        if not isinstance(airport, str):
+            raise RequestError(400, f"Airports are codes like LCE, got {json.dumps(airport)}")
+        if airport not in self.network.csr.index:
+            raise RequestError(400, f"Unknown airport: {airport}")
+        return airport
+
+    def known_route(self, route):
+        # A route is "LCE-GCM" or a [src, dst] pair
+        pair = route.split('-') if isinstance(route, str) else route
+        if not isinstance(pair, list) or len(pair) != 2:
+            raise RequestError(400, f'Routes look like LCE-GCM or ["LCE", "GCM"], got {json.dumps(route)}')
+        return tuple(self.known_airport(airport) for airport in pair)
+
+    def number(self, params, name, default, kind=int):
+        value = params.get(name, default)
+        try:
+            return None if value is None else kind(value)
+        except (TypeError, ValueError):
+            raise RequestError(400, f"Parameter {name} must be a number")
+
+    def query(self, params):
+        # The closure and delay part shared by /route and /alternatives
+        airport_closure = params.get('airport_closure')
+        if airport_closure is not None:
+            self.known_airport(airport_closure)
+        route_closure = params.get('route_closure')
+        if route_closure is not None:
+            route_closure = self.known_route(route_closure)
+        enable_delays = str(params.get('delays', '')).lower() in ('1', 'true', 'yes')
+        delay_seed = self.number(params, 'delay_seed', None)
+        return airport_closure, route_closure, enable_delays, delay_seed
+
+    async def offload(self, key, function, argument, endpoint):
+        # Cached answers come straight back; the rest go to a worker and into the cache
+        cache = self.network.query_cache
+        if key is not None:
+            result = cache.get(key)
+            if result is not None:
+                self.metrics.cache_hits[endpoint] += 1
+                return result
+        loop = asyncio.get_running_loop()
+        result = await asyncio.wait_for(loop.run_in_executor(self.pool, function, argument), self.timeout)
+        if key is not None:
+            cache.put(key, result)
+        return result
+
+    async def route(self, params):
+        start_airport, end_airport = self.airport(params, 'start'), self.airport(params, 'end')
+        algorithm = params.get('algorithm', 'dijkstra')
+        if algorithm not in ALGORITHMS:
+            raise RequestError(400, f"Unknown algorithm: {algorithm}, expected one of {', '.join(ALGORITHMS)}")
+        if algorithm == 'ch' and self.hierarchy is None:
+            raise RequestError(400, "algorithm=ch needs the server started with --hierarchy")
+        airport_closure, route_closure, enable_delays, delay_seed = self.query(params)
+        key = self.network.query_key(algorithm, start_airport, end_airport, airport_closure, route_closure,
+                                     enable_delays, delay_seed)
+        result = await self.offload(key, _find_route, (algorithm, start_airport, end_airport, airport_closure,
+                                                       route_closure, enable_delays, delay_seed), 'route')
+        return route_json(result)
+
+    async def alternatives(self, params):
+        start_airport, end_airport = self.airport(params, 'start'), self.airport(params, 'end')
+        k = self.number(params, 'k', 3)
+        if not 1 <= k <= MAX_ALTERNATIVES:
+            raise RequestError(400, f"k must be between 1 and {MAX_ALTERNATIVES}")
+        airport_closure, route_closure, enable_delays, delay_seed = self.query(params)
+        key = self.network.query_key(f'alternatives-{k}', start_airport, end_airport, airport_closure,
+                                     route_closure, enable_delays, delay_seed)
+        routes = await self.offload(key, _alternative_routes, (start_airport, end_airport, k, airport_closure,
+                                                               route_closure, enable_delays, delay_seed),
+                                    'alternatives')
+        return {'routes': [route_json(route) for route in routes]}
+
+    async def scenario(self, params):
+        airports = [self.known_airport(airport) for airport in split_list(params.get('airports'))]
+        routes = [self.known_route(route) for route in split_list(params.get('routes'))]
+        scenario = Scenario(tuple(sorted(airports)), tuple(sorted(routes)))
+        key = ('scenario', scenario, self.network.version)
+        impact = await self.offload(key, _evaluate_scenario, scenario, 'scenario')
+        return {'airports': list(scenario.airports), 'routes': ['-'.join(route) for route in scenario.routes],
+                'extra_hours': impact.extra_hours, 'disconnected': impact.disconnected,
+                'affected': impact.affected}
+
+    async def metrics_summary(self, params):
+        summary = self.metrics.summary()
+        summary['query_cache'] = self.network.query_cache.stats()
+        summary['workers'] = self.workers
+        return summary
+
+    async def health(self, params):
+        return {'status': 'ok', 'airports': len(self.network.csr.airports), 'routes': self.network.csr.num_edges}
+
+
+async def read_request(reader):
+    # (method, target, lowercased headers, body) of the next request, None once the client is done
+    line = await reader.readline()
+    if not line.strip():
+        return None
+    try:
+        method, target, _ = line.decode('latin-1').split()
+    except ValueError:
+        raise RequestError(400, "Malformed request line")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        if len(headers) >= MAX_HEADERS:
+            raise RequestError(400, "Too many headers")
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get('content-length', 0))
+    except ValueError:
+        raise RequestError(400, "Bad Content-Length")
+    if length > MAX_BODY_BYTES:
+        raise RequestError(413, f"Body over {MAX_BODY_BYTES} bytes")
+    body = await reader.readexactly(length) if length else b''
+    return method.upper(), target, headers, body
+
+
+def write_response(writer, status, payload, keep_alive=True):
+    body = json.dumps(payload).encode()
+    head = (f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    writer.write(head.encode('latin-1') + body)
+
+
+async def read_response(reader):
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def load_test(host, port, targets, concurrency):
+    # Local client: `concurrency` keep-alive connections working through the GET targets.
+    # Returns (wall seconds, per-request latencies in seconds, non-200 answers).
+    targets = iter(targets)
+    latencies = []
+    failures = 0
+
+    async def client():
+        nonlocal failures
+        reader, writer = await asyncio.open_connection(host, port)
+        for target in targets:
+            start_time = time.perf_counter()
+            writer.write(f"GET {target} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode('latin-1'))
+            await writer.drain()
+            status, _ = await read_response(reader)
+            latencies.append(time.perf_counter() - start_time)
+            failures += status != 200
+        writer.close()
+        await writer.wait_closed()
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return time.perf_counter() - start_time, latencies, failures
+
+
+async def self_test(server, args):
+    # Serve on a free port and drive it with the local client: random route queries, each
+    # asked twice so the second round exercises the cache
+    from benchmark import make_queries
+
+    host, port = await server.start(args.host, 0)
+    queries = make_queries(server.network, args.load_test // 2, args.seed, delays=False)
+    targets = ['/route?' + urlencode({'start': start, 'end': end, 'algorithm': args.algorithm})
+               for start, end, _ in queries]
+    for label, batch in (("cold", targets), ("cached", targets)):
+        elapsed, latencies, failures = await load_test(host, port, batch, args.concurrency)
+        p50, p95, p99 = (np.percentile(latencies, [50, 95, 99]) * 1000).tolist()
+        print(f"{label:7} {len(latencies)} requests in {elapsed:.2f} s  {len(latencies) / elapsed:8.1f} q/s  "
+              f"p50 {p50:.1f} ms  p95 {p95:.1f} ms  p99 {p99:.1f} ms  {failures} failed")
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(b"GET /metrics HTTP/1.1\r\nConnection: close\r\n\r\n")
+    print(json.dumps((await read_response(reader))[1], indent=2))
+    writer.close()
+    await writer.wait_closed()
+
+
+async def serve(args):
+    network = RouteNetwork(args.data)
+    hierarchy = network.contraction_hierarchy() if args.hierarchy else None
+    server = RouteServer(network, args.workers, args.scenario_sources, args.timeout, hierarchy)
+    try:
+        if args.load_test:
+            await self_test(server, args)
+            return
+        host, port = await server.start(args.host, args.port)
+        print(f"Serving {len(network.csr.airports)} airports on http://{host}:{port}, "
+              f"workers: {server.workers}")
+        await server.server.serve_forever()
+    finally:
+        await server.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve route, alternative route and closure scenario "
+                                                 "queries over HTTP/JSON")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--workers', type=int, help="worker processes, default one per CPU")
+    parser.add_argument('--scenario-sources', type=int, default=MAX_SOURCES,
+                        help="origins sampled for /scenario on large networks")
+    parser.add_argument('--timeout', type=float, default=REQUEST_TIMEOUT)
+    parser.add_argument('--hierarchy', action='store_true',
+                        help="load or build the contraction hierarchy up front, needed for algorithm=ch")
+    parser.add_argument('--data', default=DATA_PATH)
+    parser.add_argument('--load-test', type=int, metavar='N',
+                        help="instead of serving, answer N route queries from a local client and report")
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--algorithm', choices=ALGORITHMS, default='dijkstra')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    if args.load_test and args.algorithm == 'ch' and not args.hierarchy:
+        parser.error("--algorithm ch needs --hierarchy")
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import heapq
+
+import numpy as np
+
+
+class ShortestPathTable:
+    # All-pairs distances and next hops for an undirected weighted graph, kept as dense
+    # n x n arrays. pred[s, t] is the airport before t on the shortest path from s, which
+    # is what lets a closure repair only the source rows whose shortest-path tree it touches.
+
+    def __init__(self, airports, adjacency, dist, next_hop, pred):
+        self.airports = airports
+        self.index = {airport: i for i, airport in enumerate(airports)}
+        self.adjacency = adjacency
+        self.dist = dist
+        self.next_hop = next_hop
+        self.pred = pred
+
+    @classmethod
+    def from_graph(cls, graph, weight='weight'):
+        airports = list(graph.nodes())
+        index = {airport: i for i, airport in enumerate(airports)}
+        adjacency = [{} for _ in airports]
+        for u, v, data in graph.edges(data=True):
+            adjacency[index[u]][index[v]] = data[weight]
+            adjacency[index[v]][index[u]] = data[weight]
+
+        n = len(airports)
+        table = cls(airports, adjacency,
+                    np.full((n, n), np.inf),
+                    np.full((n, n), -1, dtype=np.int32),
+                    np.full((n, n), -1, dtype=np.int32))
+        for source in range(n):
+            table._solve_row(source)
+        return table
+
+    def copy(self):
+        return ShortestPathTable(list(self.airports), [dict(edges) for edges in self.adjacency],
+                                 self.dist.copy(), self.next_hop.copy(), self.pred.copy())
+
+    def _solve_row(self, source):
+        # Single-source Dijkstra that rewrites row `source` of all three tables
+        dist = np.full(len(self.airports), np.inf)
+        pred = np.full(len(self.airports), -1, dtype=np.int32)
+        next_hop = np.full(len(self.airports), -1, dtype=np.int32)
+        dist[source] = 0.0
+        next_hop[source] = source
+        settled = [False] * len(self.airports)
+        heap = [(0.0, source)]
+
+        while heap:
+            d, u = heapq.heappop(heap)
+            if settled[u]:
+                continue
+            settled[u] = True
+            # Nodes settle in distance order, so the predecessor's first hop is already known
+            if u != source:
+                next_hop[u] = u if pred[u] == source else next_hop[pred[u]]
+            for v, w in self.adjacency[u].items():
+                nd = d + w
+                if nd < dist[v]:
+                    dist[v] = nd
+                    pred[v] = u
+                    heapq.heappush(heap, (nd, v))
+
+        self.dist[source] = dist
+        self.pred[source] = pred
+        self.next_hop[source] = next_hop
+
+    def remove_route(self, u, v):
+        if u not in self.index or v not in self.index:
+            return
+        a, b = self.index[u], self.index[v]
+        if b not in self.adjacency[a]:
+            return
+        del self.adjacency[a][b]
+        del self.adjacency[b][a]
+
+        # Only sources whose shortest-path tree used the edge can change
+        affected = np.flatnonzero((self.pred[:, b] == a) | (self.pred[:, a] == b))
+        for source in affected:
+            self._solve_row(source)
+
+    def remove_airport(self, airport):
+        if airport not in self.index:
+            return
+        c = self.index[airport]
+        for neighbour in self.adjacency[c]:
+            del self.adjacency[neighbour][c]
+        self.adjacency[c] = {}
+
+        # Sources that routed through the airport need a new tree, the rest just lose it
+        affected = np.flatnonzero((self.pred == c).any(axis=1))
+        self.dist[c, :] = np.inf
+        self.dist[:, c] = np.inf
+        self.next_hop[c, :] = -1
+        self.next_hop[:, c] = -1
+        self.pred[c, :] = -1
+        self.pred[:, c] = -1
+        for source in affected:
+            if source != c:
+                self._solve_row(source)
+
+    def distance(self, start_airport, end_airport):
+        if start_airport not in self.index or end_airport not in self.index:
+            return None
+        d = self.dist[self.index[start_airport], self.index[end_airport]]
+        return None if np.isinf(d) else float(d)
+
+    def path(self, start_airport, end_airport):
+        # Follow next hops towards the destination, O(path length)
+        if self.distance(start_airport, end_airport) is None:
+            return None
+        target = self.index[end_airport]
+        current = self.index[start_airport]
+        path = [start_airport]
+        while current != target:
+            current = int(self.next_hop[current, target])
+            path.append(self.airports[current])
+        return path
@@ -0,0 +1,77 @@
+import numpy as np
+
+
+def project(latitudes, longitudes):
+    # Equirectangular projection into world units: x grows east, y grows south like the screen
+    return np.column_stack([np.asarray(longitudes, dtype=np.float64),
+                            -np.asarray(latitudes, dtype=np.float64)])
+
+
+class GridIndex:
+    # Uniform grid over item bounding boxes (minx, miny, maxx, maxy). Points are boxes of
+    # zero size. Items spanning more than max_cells cells, such as long-haul routes, go to
+    # an overflow list that is tested with one vectorized bounding box check instead.
+
+    def __init__(self, bboxes, cell_size, max_cells=64):
+        self.bboxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+        self.cell_size = float(cell_size)
+        self.cells = {}
+
+        # Unplaceable items (NaN coordinates) get cell 0 here and are left out below
+        finite = np.isfinite(self.bboxes).all(axis=1)
+        cell_bounds = np.floor(np.where(finite[:, None], self.bboxes, 0) / self.cell_size).astype(np.int64)
+        spans = (cell_bounds[:, 2] - cell_bounds[:, 0] + 1) * (cell_bounds[:, 3] - cell_bounds[:, 1] + 1)
+        self.overflow = np.flatnonzero(finite & (spans > max_cells))
+
+        finite_boxes = self.bboxes[finite]
+        self.bounds = ((finite_boxes[:, 0].min(), finite_boxes[:, 1].min(),
+                        finite_boxes[:, 2].max(), finite_boxes[:, 3].max()) if len(finite_boxes) else None)
+        self.finite = np.flatnonzero(finite)
+
+        for item in np.flatnonzero(finite & (spans <= max_cells)).tolist():
+            x0, y0, x1, y1 = cell_bounds[item].tolist()
+            for cx in range(x0, x1 + 1):
+                for cy in range(y0, y1 + 1):
+                    self.cells.setdefault((cx, cy), []).append(item)
+
+    @classmethod
+    def from_points(cls, points, cell_size):
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        return cls(np.hstack([points, points]), cell_size)
+
+    @classmethod
+    def from_segments(cls, starts, ends, cell_size, max_cells=64):
+        starts = np.asarray(starts, dtype=np.float64).reshape(-1, 2)
+        ends = np.asarray(ends, dtype=np.float64).reshape(-1, 2)
+        return cls(np.hstack([np.minimum(starts, ends), np.maximum(starts, ends)]), cell_size, max_cells)
+
+    def query(self, rect):
+        # Sorted ids of items whose bounding box intersects rect = (minx, miny, maxx, maxy)
+        minx, miny, maxx, maxy = rect
+        if self.bounds is None:
+            return np.array([], dtype=np.int64)
+        if minx <= self.bounds[0] and miny <= self.bounds[1] and maxx >= self.bounds[2] and maxy >= self.bounds[3]:
+            # Zoomed out past everything indexed
+            return self.finite
+        x0, y0 = int(np.floor(minx / self.cell_size)), int(np.floor(miny / self.cell_size))
+        x1, y1 = int(np.floor(maxx / self.cell_size)), int(np.floor(maxy / self.cell_size))
+
+        if (x1 - x0 + 1) * (y1 - y0 + 1) > len(self.cells) // 4:
+            # Wide view: one vectorized box test over everything beats gathering the cells
+            candidates = self.finite
+        else:
+            candidates = []
+            for cx in range(x0, x1 + 1):
+                for cy in range(y0, y1 + 1):
+                    candidates.extend(self.cells.get((cx, cy), ()))
+
+            # Items spanning several cells come up once per cell; a mask drops the repeats
+            # cheaper than sorting them out
+            seen = np.zeros(len(self.bboxes), dtype=bool)
+            seen[np.asarray(candidates, dtype=np.int64)] = True
+            seen[self.overflow] = True
+            candidates = np.flatnonzero(seen)
+        boxes = self.bboxes[candidates]
+        hit = ((boxes[:, 0] <= maxx) & (boxes[:, 2] >= minx) &
+               (boxes[:, 1] <= maxy) & (boxes[:, 3] >= miny))
+        return candidates[hit]
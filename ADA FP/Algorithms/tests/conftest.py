@@ -0,0 +1,15 @@
+import os
+import sys
+
+import pytest
+
+# The modules live flat in the directory above, as the scripts expect
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmark import synthetic_network
+
+
+@pytest.fixture(scope='session')
+def network():
+    # Small and sparse enough for brute-force references, dense enough for real detours
+    return synthetic_network(40, 0.15, 1)
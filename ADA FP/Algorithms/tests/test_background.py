@@ -0,0 +1,42 @@
+import threading
+
+import pytest
+
+from background import SolverJob
+from benchmark import synthetic_network
+
+
+@pytest.fixture(scope='module')
+def search_network():
+    # Dense enough that the exhaustive search below runs past a few progress reports
+    return synthetic_network(200, 0.2, 1)
+
+
+def test_progress_reaches_the_job(search_network):
+    job = SolverJob(search_network.find_route, 'brute_force', 'S0173', 'S0062', delay_seed=4, use_cache=False)
+    assert job.wait(60)
+    assert job.error is None and not job.cancelled
+    expected = search_network.find_route('dijkstra', 'S0173', 'S0062', delay_seed=4, use_cache=False)
+    assert job.result.flight_time == pytest.approx(expected.flight_time, rel=1e-12)
+
+    expanded, best_time, lower_bound = job.progress
+    assert 0 < expanded <= job.result.nodes_expanded
+    assert lower_bound <= job.result.flight_time + 1e-9 <= best_time + 2e-9
+
+
+def test_cancel_stops_the_search(search_network):
+    # The search only starts once cancel() was asked for, so its first report raises
+    go = threading.Event()
+
+    def solve(progress):
+        go.wait()
+        return search_network.find_route('brute_force', 'S0173', 'S0062', delay_seed=4, progress=progress,
+                                         use_cache=False)
+
+    job = SolverJob(solve)
+    job.cancel()
+    go.set()
+    assert job.wait(60)
+    assert job.cancelled and job.error is None and job.result is None
+    # The report that raised still published how far the search got
+    assert job.progress[0] > 0
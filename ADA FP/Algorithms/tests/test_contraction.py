@@ -0,0 +1,68 @@
+import networkx as nx
+import numpy as np
+import pytest
+
+from benchmark import synthetic_network
+from contraction import ContractionHierarchy
+from routing import RouteNetwork
+
+
+def check_all_pairs(network, hierarchy):
+    # Every pair against networkx, over a route that exists and takes that time
+    graph = network.G
+    expected = dict(nx.all_pairs_dijkstra_path_length(graph))
+    for start in network.airports:
+        for end in network.airports:
+            path, flight_time = hierarchy.shortest_path(start, end)
+            if end not in expected[start]:
+                assert path is None
+                continue
+            assert flight_time == pytest.approx(expected[start][end], rel=1e-12, abs=1e-12)
+            assert path[0] == start and path[-1] == end
+            legs = sum(graph[u][v]['weight'] for u, v in zip(path, path[1:]))
+            assert legs == pytest.approx(expected[start][end], rel=1e-12, abs=1e-12)
+
+
+@pytest.mark.parametrize('size, density, seed', [(30, 0.1, 0), (40, 0.3, 1), (60, 0.05, 2)])
+def test_matches_networkx(size, density, seed):
+    network = synthetic_network(size, density, seed)
+    check_all_pairs(network, ContractionHierarchy.build(network.csr, network.version))
+
+
+@pytest.mark.parametrize('settle_limit, max_shortcuts_per_route', [(1, 4), (60, 0.5), (60, 0)])
+def test_witness_limits_and_core(settle_limit, max_shortcuts_per_route):
+    # Cut-short witness searches only add shortcuts, and whatever is left uncontracted is
+    # searched both ways as a core
+    network = synthetic_network(40, 0.3, 5)
+    hierarchy = ContractionHierarchy.build(network.csr, network.version, settle_limit=settle_limit,
+                                           max_shortcuts_per_route=max_shortcuts_per_route)
+    if max_shortcuts_per_route < 1:
+        assert hierarchy.core_size > 1
+    check_all_pairs(network, hierarchy)
+
+
+def test_disconnected_network():
+    # Two separate pairs of airports and a triangle
+    network = RouteNetwork.from_edge_list(['A', 'B', 'C', 'D', 'E', 'F', 'G'],
+                                          [(0, 1), (2, 3), (4, 5), (5, 6), (4, 6)],
+                                          [1.0, 2.0, 1.0, 1.0, 3.0], np.zeros((7, 2)))
+    check_all_pairs(network, ContractionHierarchy.build(network.csr, network.version))
+
+
+def test_save_and_load(tmp_path):
+    network = synthetic_network(30, 0.2, 3)
+    hierarchy = ContractionHierarchy.build(network.csr, network.version)
+    path = str(tmp_path / 'hierarchy.npz')
+    hierarchy.save(path)
+    assert ContractionHierarchy.load(path, 'another network') is None
+    check_all_pairs(network, ContractionHierarchy.load(path, network.version))
+    check_all_pairs(network, ContractionHierarchy(*hierarchy.arrays()))
+
+
+def test_ch_engine_uses_the_index_only_without_closures():
+    network = synthetic_network(30, 0.2, 4)
+    for start, end in [('S0000', 'S0029'), ('S0005', 'S0017')]:
+        plain = network.find_route('dijkstra', start, end, 'S0010', use_cache=False)
+        assert network.find_route('ch', start, end, 'S0010', use_cache=False).flight_time == plain.flight_time
+        indexed = network.find_route('ch', start, end, use_cache=False)
+        assert indexed.flight_time == pytest.approx(network.find_route('dijkstra', start, end).flight_time)
@@ -0,0 +1,98 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+import graph_cache
+from graph_cache import load_edge_list
+
+ROUTES_CSV = """\
+Airline,SourceAirport,DestinationAirport,Stops,SourceLatitude,SourceLongitude,DestinationLatitude,DestinationLongitude,Distance,FlightTime
+XX,LCE,GJA,0,15.74,-86.85,16.44,-85.91,127.0,0h 9m
+XX,LCE,PEU,1,15.74,-86.85,15.26,-83.78,333.2,0h 24m
+XX,PEU,GJA,0,15.26,-83.78,16.44,-85.91,250.5,1h 30m
+"""
+
+
+@pytest.fixture
+def routes(tmp_path, monkeypatch):
+    # A small routes CSV, and a count of how often it really gets parsed
+    path = tmp_path / 'routes.csv'
+    path.write_text(ROUTES_CSV)
+    reads = []
+    read_edge_list = graph_cache.read_edge_list
+
+    def counted(data_path):
+        reads.append(data_path)
+        return read_edge_list(data_path)
+
+    monkeypatch.setattr(graph_cache, 'read_edge_list', counted)
+    return str(path), str(tmp_path / 'cache'), reads
+
+
+def set_mtime(path, mtime_ns):
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_cold_then_warm(routes):
+    path, cache_dir, reads = routes
+    airports, edges, weights, coordinates, distances, stops = load_edge_list(path, cache_dir)
+    assert airports.tolist() == ['LCE', 'PEU', 'GJA']
+    assert edges.tolist() == [[0, 2], [0, 1], [1, 2]]
+    np.testing.assert_allclose(weights, [0.15, 0.4, 1.5])
+    np.testing.assert_allclose(coordinates, [[15.74, -86.85], [15.26, -83.78], [16.44, -85.91]])
+    np.testing.assert_allclose(distances, [127.0, 333.2, 250.5])
+    assert stops.tolist() == [0, 1, 0]
+
+    warm = load_edge_list(path, cache_dir)
+    assert len(reads) == 1
+    assert all(isinstance(array, np.memmap) for array in warm)
+    np.testing.assert_array_equal(warm[2], weights)
+
+
+def test_touched_but_unchanged_file_is_not_reparsed(routes):
+    path, cache_dir, reads = routes
+    load_edge_list(path, cache_dir)
+    set_mtime(path, os.stat(path).st_mtime_ns + 10**9)
+    load_edge_list(path, cache_dir)
+    assert len(reads) == 1
+    # The new mtime is recorded, so the next start skips the hash too
+    with open(os.path.join(cache_dir, 'meta.json')) as f:
+        assert json.load(f)['mtime_ns'] == os.stat(path).st_mtime_ns
+
+
+def test_same_size_edit_is_caught_by_the_hash(routes):
+    path, cache_dir, reads = routes
+    load_edge_list(path, cache_dir)
+    mtime_ns = os.stat(path).st_mtime_ns
+    with open(path, 'w') as f:
+        f.write(ROUTES_CSV.replace('1h 30m', '2h 30m'))
+    set_mtime(path, mtime_ns + 10**9)
+    weights = load_edge_list(path, cache_dir)[2]
+    assert len(reads) == 2
+    assert weights[2] == pytest.approx(2.5)
+
+
+def test_resized_file_is_reparsed(routes):
+    path, cache_dir, reads = routes
+    load_edge_list(path, cache_dir)
+    mtime_ns = os.stat(path).st_mtime_ns
+    with open(path, 'a') as f:
+        f.write("XX,GJA,MIA,0,16.44,-85.91,25.79,-80.29,1200.0,1h 25m\n")
+    # Even with the old mtime, a different size means a different file
+    set_mtime(path, mtime_ns)
+    airports = load_edge_list(path, cache_dir)[0]
+    assert len(reads) == 2
+    assert 'MIA' in airports.tolist()
+
+
+@pytest.mark.parametrize('meta', ['{"version": 0}', 'not json'])
+def test_stale_or_broken_meta_rebuilds(routes, meta):
+    path, cache_dir, reads = routes
+    load_edge_list(path, cache_dir)
+    with open(os.path.join(cache_dir, 'meta.json'), 'w') as f:
+        f.write(meta)
+    load_edge_list(path, cache_dir)
+    load_edge_list(path, cache_dir)
+    assert len(reads) == 2
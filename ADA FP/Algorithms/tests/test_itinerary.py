@@ -0,0 +1,60 @@
+from itertools import permutations
+
+import numpy as np
+import pytest
+
+from itinerary import branch_and_bound, held_karp, plan_itinerary, tour_time
+
+
+def brute_force(start_times, times, end_times):
+    return min(tour_time(list(order), start_times, times, end_times)
+               for order in permutations(range(len(start_times))))
+
+
+def random_instance(k, seed, symmetric):
+    rng = np.random.default_rng(seed)
+    points = rng.uniform(0, 10, (k + 2, 2))
+    lengths = np.linalg.norm(points[:, None] - points[None, :], axis=2)
+    if not symmetric:
+        lengths = lengths * rng.uniform(1.0, 1.5, lengths.shape)
+    return lengths[0, 1:k + 1], lengths[1:k + 1, 1:k + 1], lengths[1:k + 1, k + 1]
+
+
+@pytest.mark.parametrize('k', [1, 2, 5, 7])
+@pytest.mark.parametrize('symmetric', [True, False])
+@pytest.mark.parametrize('seed', range(4))
+def test_solvers_match_permutations(k, symmetric, seed):
+    start_times, times, end_times = random_instance(k, seed, symmetric)
+    expected = brute_force(start_times, times, end_times)
+    for solve in (held_karp, branch_and_bound):
+        flight_time, order = solve(start_times, times, end_times)
+        assert sorted(order) == list(range(k))
+        assert flight_time == pytest.approx(expected, rel=1e-12)
+        assert tour_time(order, start_times, times, end_times) == pytest.approx(expected, rel=1e-12)
+
+
+def test_unreachable_stop():
+    start_times, times, end_times = random_instance(4, 0, True)
+    times = times.copy()
+    times[2, :] = times[:, 2] = np.inf
+    start_times = start_times.copy()
+    start_times[2] = np.inf
+    assert held_karp(start_times, times, end_times)[1] is None
+    assert branch_and_bound(start_times, times, end_times)[1] is None
+
+
+@pytest.mark.parametrize('method', ['held_karp', 'branch_and_bound'])
+def test_plan_matches_permutations(network, method):
+    stops = ['S0003', 'S0011', 'S0017', 'S0025', 'S0032']
+    itinerary = plan_itinerary(network, 'S0000', stops, 'S0039', method=method)
+
+    def leg(a, b):
+        return network.find_route('dijkstra', a, b).flight_time
+
+    expected = min(sum(leg(a, b) for a, b in zip(order, order[1:]))
+                   for order in (('S0000',) + p + ('S0039',) for p in permutations(stops)))
+    assert itinerary.flight_time == pytest.approx(expected, rel=1e-9)
+    assert sorted(itinerary.order[1:-1]) == stops
+    assert sum(itinerary.legs) == pytest.approx(itinerary.flight_time, rel=1e-12)
+    assert itinerary.path[0] == 'S0000' and itinerary.path[-1] == 'S0039'
+    assert all(stop in itinerary.path for stop in stops)
@@ -0,0 +1,42 @@
+from itertools import islice
+
+import networkx as nx
+import pytest
+
+from benchmark import make_queries
+
+
+def path_time(graph, path):
+    return sum(graph[u][v]['weight'] for u, v in zip(path, path[1:]))
+
+
+@pytest.mark.parametrize('delays', [False, True])
+def test_matches_networkx(network, delays):
+    k = 8
+    for start, end, delay_seed in make_queries(network, 15, 3, delays):
+        edge_weights = network.adjusted_edge_weights(delay_seed=delay_seed)
+        graph = nx.Graph()
+        graph.add_weighted_edges_from((u, v, w) for (u, v), w in
+                                      zip(network.csr.edge_pairs(), edge_weights.tolist()))
+        expected = [path_time(graph, path) for path in
+                    islice(nx.shortest_simple_paths(graph, start, end, weight='weight'), k)]
+
+        routes = network.alternative_routes(start, end, k, delay_seed=delay_seed, use_cache=False)
+        assert [route.flight_time for route in routes] == pytest.approx(expected, rel=1e-12)
+        # Loopless, distinct, and each taking the time it reports
+        assert len({tuple(route.path) for route in routes}) == len(routes)
+        for route in routes:
+            assert route.path[0] == start and route.path[-1] == end
+            assert len(set(route.path)) == len(route.path)
+            assert path_time(graph, route.path) == pytest.approx(route.flight_time, rel=1e-12)
+
+
+def test_closures(network):
+    # A closed end airport leaves no route at all
+    assert network.alternative_routes('S0000', 'S0039', 3, airport_closure='S0039', use_cache=False) == []
+    # A closed route is never flown, in either direction
+    routes = network.alternative_routes('S0000', 'S0039', 5, route_closure='S0000-S0001', use_cache=False)
+    assert routes
+    for route in routes:
+        legs = set(zip(route.path, route.path[1:]))
+        assert ('S0000', 'S0001') not in legs and ('S0001', 'S0000') not in legs
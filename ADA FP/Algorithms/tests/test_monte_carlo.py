@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from monte_carlo import DELAY_HIGH, candidate_edges, sample_delays, simulate_delays
+
+
+@pytest.mark.parametrize('start, end', [('S0000', 'S0039'), ('S0004', 'S0021'), ('S0012', 'S0030')])
+def test_matches_per_scenario_dijkstra(network, start, end):
+    report = simulate_delays(network, start, end, scenarios=50, seed=9)
+    csr = network.csr
+    edge_weights = network.adjusted_edge_weights()
+    # Rebuild every scenario's weights: sampled delays on the candidate legs, and the
+    # undelayed time elsewhere, the most favourable those legs could ever be
+    legs = candidate_edges(csr, edge_weights, csr.index[start], csr.index[end], DELAY_HIGH)
+    delays = sample_delays(50, len(legs), 9)
+    for scenario, best_time in enumerate(report.best_times):
+        weights = edge_weights.copy()
+        weights[legs] *= delays[scenario]
+        _, flight_time = csr.dijkstra(start, end, csr.half_edge_weights(weights))
+        assert best_time == pytest.approx(flight_time, rel=1e-12)
+
+    assert sum(route.wins for route in report.routes) == 50
+    for route in report.routes:
+        assert route.path[0] == start and route.path[-1] == end
+        assert route.mean_regret >= -1e-9
+
+
+def test_closures_and_unreachable(network):
+    # Closing the start leaves nothing to simulate
+    assert simulate_delays(network, 'S0000', 'S0001', scenarios=10, seed=1, airport_closure='S0000') is None
+    assert simulate_delays(network, 'S0000', 'nowhere', scenarios=10) is None
+    report = simulate_delays(network, 'S0000', 'S0039', scenarios=20, seed=2, airport_closure='S0020')
+    assert all('S0020' not in route.path for route in report.routes)
+    assert np.all(np.isfinite(report.best_times))
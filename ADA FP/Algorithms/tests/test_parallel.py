@@ -0,0 +1,49 @@
+import pytest
+
+from benchmark import make_queries, synthetic_network
+from parallel import RoutingPool
+
+
+@pytest.fixture(scope='module')
+def pool_network():
+    return synthetic_network(120, 0.2, 4)
+
+
+@pytest.fixture(scope='module')
+def pool(pool_network):
+    with RoutingPool(pool_network, 2) as pool:
+        yield pool
+
+
+def test_exhaustive_search_matches_serial(pool_network, pool):
+    csr = pool_network.csr
+    expanded = tasks = 0
+    for start, end, delay_seed in make_queries(pool_network, 15, 8):
+        serial = pool_network.find_route('brute_force', start, end, delay_seed=delay_seed, use_cache=False)
+        parallel = pool.exhaustive_search(start, end, delay_seed=delay_seed)
+        assert parallel.flight_time == pytest.approx(serial.flight_time, rel=1e-12)
+        assert parallel.path[0] == start and parallel.path[-1] == end
+        expanded += parallel.nodes_expanded
+        source = csr.index[start]
+        tasks += int(csr.offsets[source + 1] - csr.offsets[source])
+    # One task per leg out of the start, each expanding just its start if it pruned its
+    # first leg; the workers have to get further than that
+    assert expanded > tasks
+
+    closed = pool.exhaustive_search('S0000', 'S0050', airport_closure='S0050')
+    assert closed.path is None
+
+
+@pytest.mark.parametrize('algorithm', ['dijkstra', 'astar'])
+def test_solve_batch_matches_single_queries(pool_network, pool, algorithm):
+    queries = [(start, end, 'S0007' if i % 3 == 0 else None, None, delay_seed)
+               for i, (start, end, delay_seed) in enumerate(make_queries(pool_network, 60, 2))]
+    results = pool.solve_batch(queries, algorithm)
+    assert len(results) == len(queries)
+    for (start, end, airport_closure, route_closure, delay_seed), result in zip(queries, results):
+        weights = pool_network.query_weights(airport_closure, route_closure, delay_seed=delay_seed)
+        _, expected = pool_network.solve('dijkstra', weights, start, end)
+        if result.path is None:
+            assert expected is None
+        else:
+            assert result.flight_time == pytest.approx(expected, rel=1e-12)
@@ -0,0 +1,52 @@
+import networkx as nx
+import numpy as np
+import pytest
+
+from benchmark import synthetic_network
+from geo import AVERAGE_SPEED_KMH
+from pareto import pareto_routes
+from routing import RouteNetwork
+
+
+@pytest.fixture(scope='module')
+def network():
+    # Recorded distances and scheduled stops that disagree with flight time, so the three
+    # criteria pull apart and the front has more than one route
+    base = synthetic_network(25, 0.3, 2)
+    csr = base.csr
+    rng = np.random.default_rng(2)
+    distances = csr.edge_weights * AVERAGE_SPEED_KMH * rng.uniform(0.5, 3.0, csr.num_edges)
+    stops = rng.integers(0, 2, csr.num_edges)
+    return RouteNetwork.from_edge_list(csr.airports, csr.endpoints, csr.edge_weights, base.coordinates,
+                                       distances, stops)
+
+
+def enumerated_front(network, start, end, max_stops):
+    # Every simple path within the stop limit, reduced to its non-dominated criteria
+    csr = network.csr
+    vectors = set()
+    for path in nx.all_simple_paths(network.G, start, end, cutoff=max_stops + 1):
+        edges = [csr.edge_id(csr.index[u], csr.index[v]) for u, v in zip(path, path[1:])]
+        hops = int((network.route_stops[edges] + 1).sum())
+        if hops - 1 <= max_stops:
+            vectors.add((float(csr.edge_weights[edges].sum()), hops - 1,
+                         float(network.route_distances[edges].sum())))
+    return {v for v in vectors
+            if not any(o != v and o[0] <= v[0] and o[1] <= v[1] and o[2] <= v[2] for o in vectors)}
+
+
+def rounded(vectors):
+    return sorted((round(t, 9), s, round(d, 6)) for t, s, d in vectors)
+
+
+@pytest.mark.parametrize('start, end', [('S0000', 'S0024'), ('S0003', 'S0017'), ('S0010', 'S0011'),
+                                        ('S0005', 'S0020')])
+@pytest.mark.parametrize('max_stops', [1, 3])
+def test_matches_path_enumeration(network, start, end, max_stops):
+    front = pareto_routes(network, start, end, max_front=1000, max_stops=max_stops)
+    expected = enumerated_front(network, start, end, max_stops)
+    assert rounded((route.flight_time, route.stops, route.distance) for route in front) == rounded(expected)
+    for route in front:
+        assert route.path[0] == start and route.path[-1] == end
+        assert len(set(route.path)) == len(route.path)
+    assert [route.flight_time for route in front] == sorted(route.flight_time for route in front)
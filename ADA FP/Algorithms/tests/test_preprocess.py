@@ -0,0 +1,60 @@
+import importlib.util
+import os
+
+import numpy as np
+import pytest
+
+from geo import AVERAGE_SPEED_KMH
+from graph_cache import load_edge_list, read_routes_table
+
+# preprocess.py lives next to the data rather than with the routing modules
+PREPROCESS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                               'Preprocessing and scrapping', 'preprocess.py')
+spec = importlib.util.spec_from_file_location('preprocess', PREPROCESS_PATH)
+preprocess = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(preprocess)
+
+AIRPORTS_DAT = """\
+1,"Lanceiras","La Ceiba","Honduras","LCE","MHLC",15.74,-86.85,49,-6,"U","America/Tegucigalpa","airport","OurAirports"
+2,"Guanaja","Guanaja","Honduras","GJA","MHNJ",16.44,-85.91,49,-6,"U","America/Tegucigalpa","airport","OurAirports"
+3,"Puerto Lempira","Puerto Lempira","Honduras",\\N,"MHPL",15.26,-83.78,33,-6,"U","America/Tegucigalpa","airport","OurAirports"
+"""
+
+# The repeated LCE-GJA route lands in a later chunk and the ZZZ route has no known airport;
+# both are dropped
+ROUTES_DAT = """\
+XX,1,LCE,1,GJA,2,,0,320
+XX,1,GJA,2,LCE,1,,0,320
+XX,1,LCE,1,MHPL,3,,1,320
+YY,2,LCE,1,GJA,2,,0,737
+XX,1,LCE,1,ZZZ,9,,0,320
+"""
+
+
+@pytest.fixture(params=['.parquet', '.feather'])
+def dataset(request, tmp_path):
+    routes_path, airports_path = tmp_path / 'routes.dat', tmp_path / 'airports.dat'
+    routes_path.write_text(ROUTES_DAT)
+    airports_path.write_text(AIRPORTS_DAT)
+    output_path = str(tmp_path / ('routes' + request.param))
+    rows = preprocess.build_dataset(str(routes_path), str(airports_path), output_path, chunksize=2)
+    assert rows == 3
+    return output_path
+
+
+def test_columns_are_projected(dataset):
+    table = read_routes_table(dataset, ['SourceAirport', 'DestinationAirport', 'FlightTime_Hours', 'FlightTime'])
+    # FlightTime is only in the notebook's CSV, so it is skipped rather than an error
+    assert list(table.columns) == ['SourceAirport', 'DestinationAirport', 'FlightTime_Hours']
+    assert table['SourceAirport'].tolist() == ['LCE', 'GJA', 'LCE']
+    assert table['DestinationAirport'].tolist() == ['GJA', 'LCE', 'MHPL']
+
+
+def test_edge_list_from_columnar_output(dataset, tmp_path):
+    airports, edges, weights, coordinates, distances, stops = load_edge_list(dataset, str(tmp_path / 'cache'))
+    assert airports.tolist() == ['LCE', 'GJA', 'MHPL']
+    assert edges.tolist() == [[0, 1], [1, 0], [0, 2]]
+    np.testing.assert_allclose(coordinates, [[15.74, -86.85], [16.44, -85.91], [15.26, -83.78]])
+    np.testing.assert_allclose(weights, distances / AVERAGE_SPEED_KMH)
+    assert distances[0] == pytest.approx(distances[1])
+    assert stops.tolist() == [0, 0, 1]
@@ -0,0 +1,74 @@
+import pytest
+
+from benchmark import synthetic_network
+from query_cache import QueryCache
+from routing import RouteNetwork, RouteResult
+
+
+@pytest.fixture
+def cached_network():
+    network = synthetic_network(30, 0.2, 7)
+    network.query_cache = QueryCache(8)
+    return network
+
+
+def test_least_recently_used_goes_first():
+    cache = QueryCache(2)
+    cache.put('a', RouteResult(['A'], 0.0))
+    cache.put('b', RouteResult(['B'], 0.0))
+    assert cache.get('a').path == ['A']
+    cache.put('c', RouteResult(['C'], 0.0))
+    assert cache.get('b') is None
+    assert cache.get('a').path == ['A'] and cache.get('c').path == ['C']
+    assert cache.stats() == {'size': 2, 'max_size': 2, 'hits': 3, 'misses': 1, 'evictions': 1, 'hit_rate': 0.75}
+
+
+def test_save_and_load(cached_network, tmp_path):
+    network = cached_network
+    first = network.find_route('astar', 'S0001', 'S0020', 'S0005', ('S0001', 'S0002'), delay_seed=3)
+    routes = network.alternative_routes('S0004', 'S0027', 3)
+    missing = network.find_route('dijkstra', 'S0001', 'S0005', 'S0005')
+    path = str(tmp_path / 'queries.json')
+    network.query_cache.save(path)
+
+    loaded = QueryCache.load(path, 8)
+    assert loaded.entries == network.query_cache.entries
+    network.query_cache = loaded
+    assert network.find_route('astar', 'S0001', 'S0020', 'S0005', ('S0001', 'S0002'), delay_seed=3) == first
+    assert network.alternative_routes('S0004', 'S0027', 3) == routes
+    assert network.find_route('dijkstra', 'S0001', 'S0005', 'S0005') == missing
+    assert loaded.hits == 3 and loaded.misses == 0
+
+    # Only the most recent entries fit a smaller cache, and a bad file loads empty
+    assert list(QueryCache.load(path, 1).entries) == list(loaded.entries)[-1:]
+    (tmp_path / 'broken.json').write_text('[[')
+    assert not QueryCache.load(str(tmp_path / 'broken.json')).entries
+
+
+def test_keys_carry_the_network_version(cached_network):
+    # Same airports, every flight twice as long: a shared cache must not mix them up
+    network = cached_network
+    csr = network.csr
+    slower = RouteNetwork.from_edge_list(csr.airports, csr.endpoints, csr.edge_weights * 2, network.coordinates)
+    slower.query_cache = network.query_cache
+    assert slower.version != network.version
+
+    fast = network.find_route('dijkstra', 'S0000', 'S0029')
+    slow = slower.find_route('dijkstra', 'S0000', 'S0029')
+    assert slow.flight_time == pytest.approx(2 * fast.flight_time)
+    assert network.query_cache.hits == 0 and len(network.query_cache.entries) == 2
+
+
+def test_delayed_runs_stay_out(cached_network):
+    network = cached_network
+    cache = network.query_cache
+    # Unseeded delays are random every run, and the UI's freshly drawn seeds never repeat
+    network.find_route('dijkstra', 'S0002', 'S0011', enable_delays=True)
+    network.find_route('dijkstra', 'S0002', 'S0011', delay_seed=12345, use_cache=False)
+    network.alternative_routes('S0002', 'S0011', 2, delay_seed=12345, use_cache=False)
+    assert not cache.entries and cache.hits == cache.misses == 0
+
+    # A seed asked for again is the same run, so that one is kept
+    seeded = network.find_route('dijkstra', 'S0002', 'S0011', delay_seed=12345)
+    assert network.find_route('dijkstra', 'S0002', 'S0011', delay_seed=12345) == seeded
+    assert cache.hits == 1 and len(cache.entries) == 1
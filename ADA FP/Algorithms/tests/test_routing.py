@@ -0,0 +1,74 @@
+import networkx as nx
+import numpy as np
+import pytest
+
+from benchmark import make_queries
+from routing import RouteNetwork
+
+
+def reference_graph(network, edge_weights):
+    # The network as a networkx graph, closed legs left out
+    graph = nx.Graph()
+    graph.add_nodes_from(network.csr.airports)
+    for (u, v), w in zip(network.csr.edge_pairs(), edge_weights.tolist()):
+        if w != float('inf'):
+            graph.add_edge(u, v, weight=w)
+    return graph
+
+
+def path_time(graph, path):
+    return sum(graph[u][v]['weight'] for u, v in zip(path, path[1:]))
+
+
+def check_route(graph, result, start, end):
+    # Same time as networkx, over a route that exists and takes that time
+    try:
+        expected = nx.dijkstra_path_length(graph, start, end)
+    except nx.NetworkXNoPath:
+        assert result.path is None
+        return
+    assert result.flight_time == pytest.approx(expected, rel=1e-12)
+    assert result.path[0] == start and result.path[-1] == end
+    assert path_time(graph, result.path) == pytest.approx(expected, rel=1e-12)
+
+
+@pytest.mark.parametrize('algorithm', ['dijkstra', 'astar', 'brute_force'])
+@pytest.mark.parametrize('delays', [False, True])
+def test_matches_networkx(network, algorithm, delays):
+    for start, end, delay_seed in make_queries(network, 30, 7, delays):
+        graph = reference_graph(network, network.adjusted_edge_weights(delay_seed=delay_seed))
+        result = network.find_route(algorithm, start, end, delay_seed=delay_seed, use_cache=False)
+        check_route(graph, result, start, end)
+
+
+@pytest.mark.parametrize('algorithm', ['dijkstra', 'astar', 'brute_force'])
+def test_matches_networkx_with_closures(network, algorithm):
+    rng = np.random.default_rng(3)
+    pairs = list(network.csr.edge_pairs())
+    for start, end, _ in make_queries(network, 30, 11, delays=False):
+        closed_airport = network.airports[int(rng.integers(len(network.airports)))]
+        closed_route = '-'.join(pairs[int(rng.integers(len(pairs)))])
+        graph = reference_graph(network, network.adjusted_edge_weights(closed_airport, closed_route))
+        result = network.find_route(algorithm, start, end, closed_airport, closed_route, use_cache=False)
+        if closed_airport in (start, end):
+            assert result.path is None
+        else:
+            check_route(graph, result, start, end)
+
+
+def test_batch_matches_single_queries(network):
+    queries = [(start, end, None, None, delay_seed) for start, end, delay_seed in make_queries(network, 40, 5)]
+    for query, result in zip(queries, network.solve_batch(queries)):
+        single = network.find_route('dijkstra', query[0], query[1], delay_seed=query[4], use_cache=False)
+        assert result.flight_time == pytest.approx(single.flight_time, rel=1e-12)
+
+
+def test_exhaustive_search_improves_on_its_seed():
+    # The direct leg is the route with the fewest legs, the detour through C and D is faster
+    network = RouteNetwork.from_edge_list(['A', 'B', 'C', 'D'], [(0, 1), (0, 2), (2, 3), (3, 1)],
+                                          [10.0, 1.0, 1.0, 1.0], np.zeros((4, 2)))
+    csr = network.csr
+    assert csr.fewest_legs_route(csr.index['A'], csr.index['B']) == ([0, 1], 10.0)
+    stats = {}
+    assert csr.exhaustive_search('A', 'B', stats=stats) == (['A', 'C', 'D', 'B'], 3.0)
+    assert stats['nodes_expanded'] > 1
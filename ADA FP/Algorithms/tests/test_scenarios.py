@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from benchmark import synthetic_network
+from routing import RouteNetwork
+from scenarios import Scenario, ScenarioEngine, rank_impacts
+
+
+@pytest.fixture(scope='module')
+def scenario_network():
+    # A synthetic network with a spur hung off S0004 (P1 - P2) and a leaf on P1, so closing
+    # S0004, P1 or the S0004-P1 route cuts destinations off entirely
+    base = synthetic_network(25, 0.12, 3)
+    airports = base.csr.airports + ['P1', 'P2', 'P3']
+    edges = np.vstack([base.csr.endpoints, [[4, 25], [25, 26], [25, 27]]])
+    weights = np.concatenate([base.csr.edge_weights, [2.0, 1.5, 0.5]])
+    coordinates = np.vstack([base.coordinates, np.zeros((3, 2))])
+    return RouteNetwork.from_edge_list(airports, edges, weights, coordinates)
+
+
+def reference_impact(network, scenario):
+    # The same measure from a plain Dijkstra per pair over the network with the closure applied
+    airport_closure = scenario.airports[0] if scenario.airports else None
+    route_closure = scenario.routes[0] if scenario.routes else None
+    weights = network.query_weights(airport_closure, route_closure)
+    extra_hours = 0.0
+    disconnected = affected = 0
+    for start in network.airports:
+        for end in network.airports:
+            if start == end or airport_closure in (start, end):
+                continue
+            _, before = network.solve('dijkstra', None, start, end)
+            if before is None:
+                continue
+            _, after = network.solve('dijkstra', weights, start, end)
+            if after is None:
+                disconnected += 1
+                affected += 1
+            elif after > before + 1e-9:
+                extra_hours += after - before
+                affected += 1
+    return extra_hours, disconnected, affected
+
+
+def check_sweep(network, impacts):
+    assert impacts == rank_impacts(impacts)
+    for impact in impacts:
+        extra_hours, disconnected, affected = reference_impact(network, impact.scenario)
+        assert impact.disconnected == disconnected
+        assert impact.affected == affected
+        assert impact.extra_hours == pytest.approx(extra_hours, rel=1e-9, abs=1e-9)
+
+
+def test_airport_sweep_matches_dijkstra(scenario_network):
+    impacts = ScenarioEngine(scenario_network).sweep_airports()
+    assert len(impacts) == len(scenario_network.airports)
+    check_sweep(scenario_network, impacts)
+    # Closing the spur's root strands the rest of the spur from every other airport
+    by_airport = {impact.scenario.airports[0]: impact for impact in impacts}
+    assert by_airport['S0004'].disconnected >= 2 * 3 * 24
+    assert impacts[0].disconnected == max(impact.disconnected for impact in impacts)
+
+
+def test_route_sweep_matches_dijkstra(scenario_network):
+    engine = ScenarioEngine(scenario_network)
+    impacts = engine.sweep_routes(list(scenario_network.csr.edge_pairs()))
+    check_sweep(scenario_network, impacts)
+    spur = next(impact for impact in impacts if impact.scenario.routes == (('S0004', 'P1'),))
+    assert spur.disconnected > 0
+
+
+def test_sampled_sources(scenario_network):
+    # Only the sampled origins count, each to every destination
+    engine = ScenarioEngine(scenario_network, sources=['S0001', 'P2'])
+    impact = engine.evaluate(Scenario(airports=('P1',)))
+    # P2 loses every destination but P1, and S0001 loses P2 and P3
+    assert impact.disconnected == (len(scenario_network.airports) - 2) + 2
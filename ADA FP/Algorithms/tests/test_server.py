@@ -0,0 +1,124 @@
+import asyncio
+import json
+
+import pytest
+
+from benchmark import synthetic_network
+from scenarios import Scenario, ScenarioEngine
+from server import RouteServer, read_response
+
+
+@pytest.fixture(scope='module')
+def server():
+    # Its own network, since the server gives it a query cache
+    server = RouteServer(synthetic_network(30, 0.2, 6), workers=1)
+    yield server
+    server.pool.shutdown()
+
+
+def exchange(server, requests):
+    # Serve on a free port and send (method, target, body) requests over one keep-alive
+    # connection; answers come back as (status, payload)
+    async def run():
+        host, port = await server.start('127.0.0.1', 0)
+        reader, writer = await asyncio.open_connection(host, port)
+        answers = []
+        for method, target, body in requests:
+            body = body if isinstance(body, bytes) else json.dumps(body).encode() if body is not None else b''
+            writer.write(f"{method} {target} HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n".encode('latin-1')
+                         + body)
+            await writer.drain()
+            answers.append(await read_response(reader))
+        writer.close()
+        await writer.wait_closed()
+        server.server.close()
+        await server.server.wait_closed()
+        return answers
+
+    return asyncio.run(run())
+
+
+def test_health(server):
+    [(status, payload)] = exchange(server, [('GET', '/health', None)])
+    assert status == 200
+    assert payload == {'status': 'ok', 'airports': 30, 'routes': server.network.csr.num_edges}
+
+
+def test_route_matches_find_route(server):
+    network = server.network
+    answers = exchange(server, [
+        ('GET', '/route?start=S0000&end=S0029&algorithm=astar', None),
+        ('POST', '/route', {'start': 'S0003', 'end': 'S0021', 'airport_closure': 'S0010',
+                            'route_closure': ['S0003', 'S0004'], 'delay_seed': 7}),
+        ('GET', '/route?start=S0003&end=S0021&route_closure=S0003-S0004', None),
+    ])
+    expected = [network.find_route('astar', 'S0000', 'S0029', use_cache=False),
+                network.find_route('dijkstra', 'S0003', 'S0021', 'S0010', ('S0003', 'S0004'), delay_seed=7,
+                                   use_cache=False),
+                network.find_route('dijkstra', 'S0003', 'S0021', route_closure=('S0003', 'S0004'),
+                                   use_cache=False)]
+    for (status, payload), route in zip(answers, expected):
+        assert status == 200
+        assert payload['path'] == route.path
+        assert payload['flight_time'] == pytest.approx(route.flight_time, rel=1e-12)
+
+
+def test_alternatives(server):
+    [(status, payload)] = exchange(server, [('POST', '/alternatives',
+                                             {'start': 'S0001', 'end': 'S0025', 'k': 3, 'airport_closure': 'S0012'})])
+    assert status == 200
+    routes = server.network.alternative_routes('S0001', 'S0025', 3, 'S0012', use_cache=False)
+    assert [route['path'] for route in payload['routes']] == [route.path for route in routes]
+
+
+def test_scenario_takes_route_pairs(server):
+    engine = ScenarioEngine(server.network)
+    expected = engine.evaluate(Scenario(('S0005',), (('S0000', 'S0001'), ('S0002', 'S0003'))))
+    answers = exchange(server, [
+        ('POST', '/scenario', {'airports': ['S0005'], 'routes': [['S0000', 'S0001'], 'S0002-S0003']}),
+        ('GET', '/scenario?airports=S0005&routes=S0000-S0001,S0002-S0003', None),
+    ])
+    for status, payload in answers:
+        assert status == 200
+        assert payload['routes'] == ['S0000-S0001', 'S0002-S0003']
+        assert payload['extra_hours'] == pytest.approx(expected.extra_hours)
+        assert payload['disconnected'] == expected.disconnected
+
+
+@pytest.mark.parametrize('method, target, body, status', [
+    ('POST', '/route', b'{not json', 400),
+    ('POST', '/route', ['S0000', 'S0001'], 400),
+    ('GET', '/route?start=S0000', None, 400),
+    ('GET', '/route?start=S0000&end=XXX', None, 400),
+    ('POST', '/route', {'start': ['S0000'], 'end': 'S0001'}, 400),
+    ('POST', '/route', {'start': 'S0000', 'end': 'S0001', 'airport_closure': 5}, 400),
+    ('POST', '/route', {'start': 'S0000', 'end': 'S0001', 'airport_closure': ['S0002']}, 400),
+    ('POST', '/route', {'start': 'S0000', 'end': 'S0001', 'route_closure': 'S0000'}, 400),
+    ('POST', '/route', {'start': 'S0000', 'end': 'S0001', 'route_closure': {'S0000': 'S0001'}}, 400),
+    ('GET', '/route?start=S0000&end=S0001&algorithm=fastest', None, 400),
+    ('GET', '/route?start=S0000&end=S0001&algorithm=ch', None, 400),
+    ('GET', '/route?start=S0000&end=S0001&delay_seed=soon', None, 400),
+    ('GET', '/alternatives?start=S0000&end=S0001&k=0', None, 400),
+    ('POST', '/scenario', {'routes': [['S0000']]}, 400),
+    ('POST', '/scenario', {'routes': 7}, 400),
+    ('POST', '/scenario', {'airports': [['S0000', 'S0001']]}, 400),
+    ('GET', '/nowhere', None, 404),
+    ('DELETE', '/route', None, 405),
+])
+def test_malformed_requests(server, method, target, body, status):
+    [(answer, payload)] = exchange(server, [(method, target, body)])
+    assert answer == status
+    assert 'error' in payload
+
+
+def test_repeated_queries_come_from_the_cache(server):
+    before = server.metrics.cache_hits['route']
+    target = '/route?start=S0007&end=S0019'
+    answers = exchange(server, [('GET', target, None), ('GET', target, None),
+                                ('GET', target + '&delays=1', None), ('GET', target + '&delays=1', None),
+                                ('GET', '/metrics', None)])
+    assert answers[0] == answers[1]
+    # Delays without a seed are random every time, so neither of those is cached
+    assert server.metrics.cache_hits['route'] == before + 1
+    status, metrics = answers[-1]
+    assert status == 200 and metrics['endpoints']['route']['cache_hits'] == before + 1
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from benchmark import synthetic_network
+from routing import MAX_CLOSURE_TABLES
+from shortest_paths import ShortestPathTable
+
+
+def check_same_as_fresh(table, graph, closed=None):
+    # Distances match a table built from scratch, and every path is real and that long. A
+    # closed airport keeps its place in the table but can't even reach itself.
+    fresh = ShortestPathTable.from_graph(graph)
+    assert table.airports == fresh.airports
+    if closed is not None:
+        fresh.dist[fresh.index[closed], fresh.index[closed]] = np.inf
+    np.testing.assert_allclose(table.dist, fresh.dist, rtol=1e-12)
+    for start in table.airports:
+        for end in table.airports:
+            path = table.path(start, end)
+            if fresh.distance(start, end) is None:
+                assert path is None
+                continue
+            assert path[0] == start and path[-1] == end
+            legs = sum(graph[u][v]['weight'] for u, v in zip(path, path[1:]))
+            assert legs == pytest.approx(table.distance(start, end), rel=1e-12)
+
+
+@pytest.mark.parametrize('airport, route', [('S0004', None), (None, ('S0000', 'S0001')),
+                                            ('S0010', ('S0002', 'S0003')), ('S0031', None)])
+def test_repair_matches_a_fresh_build(airport, route):
+    network = synthetic_network(32, 0.1, 5)
+    table = ShortestPathTable.from_graph(network.G).copy()
+    graph = network.G.copy()
+    if airport is not None:
+        table.remove_airport(airport)
+        graph.remove_edges_from(list(graph.edges(airport)))
+    if route is not None:
+        table.remove_route(*route)
+        if graph.has_edge(*route):
+            graph.remove_edge(*route)
+    check_same_as_fresh(table, graph, airport)
+
+
+def test_repair_cuts_a_chain():
+    # On a chain every route is the only way across, and every airport splits it
+    network = synthetic_network(12, 0.0, 1)
+    table = ShortestPathTable.from_graph(network.G)
+    table.remove_route('S0005', 'S0006')
+    assert table.distance('S0000', 'S0011') is None
+    assert table.path('S0006', 'S0011')[0] == 'S0006'
+    table.remove_airport('S0002')
+    assert table.distance('S0001', 'S0003') is None
+    assert table.distance('S0003', 'S0005') is not None
+
+
+def test_closure_tables_are_evicted_least_recently_used_first():
+    network = synthetic_network(20, 0.2, 2)
+    airports = network.airports
+    closures = airports[:MAX_CLOSURE_TABLES]
+    for airport in closures:
+        network.shortest_path_table(airport)
+    # Using the first one again keeps it; the next new closure pushes out the second
+    first = network.shortest_path_table(closures[0])
+    network.shortest_path_table(airports[MAX_CLOSURE_TABLES])
+    assert len(network._tables) == MAX_CLOSURE_TABLES + 1
+    assert (None, None) in network._tables
+    assert (closures[1], None) not in network._tables
+    assert network.shortest_path_table(closures[0]) is first
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from spatial_index import GridIndex, project
+
+
+def brute_force(bboxes, rect):
+    minx, miny, maxx, maxy = rect
+    return np.flatnonzero((bboxes[:, 0] <= maxx) & (bboxes[:, 2] >= minx) &
+                          (bboxes[:, 1] <= maxy) & (bboxes[:, 3] >= miny))
+
+
+def random_rects(rng, count):
+    corners = rng.uniform([-180, -90], [180, 90], size=(count, 2))
+    sizes = rng.uniform(0, 40, size=(count, 2)) ** 1.5 / 10
+    return np.hstack([corners, corners + sizes])
+
+
+def test_points_match_a_brute_force_scan():
+    rng = np.random.default_rng(0)
+    latitudes, longitudes = rng.uniform(-60, 75, 2000), rng.uniform(-180, 180, 2000)
+    points = project(latitudes, longitudes)
+    assert (points[:, 1] == -latitudes).all()
+    index = GridIndex.from_points(points, 5.0)
+    for rect in random_rects(rng, 300):
+        assert index.query(rect).tolist() == brute_force(index.bboxes, rect).tolist()
+
+
+@pytest.mark.parametrize('max_cells', [1, 4, 64])
+def test_segments_match_a_brute_force_scan(max_cells):
+    # Long routes land in the overflow list with a small max_cells, short ones in the cells
+    rng = np.random.default_rng(max_cells)
+    starts = rng.uniform([-180, -75], [180, 60], size=(1500, 2))
+    ends = starts + rng.normal(0, 15, size=(1500, 2))
+    ends[::7] = starts[::7] + [150, 40]
+    ends[::50] = [[np.nan, np.nan]]
+    index = GridIndex.from_segments(starts, ends, 5.0, max_cells)
+    assert len(index.overflow) > 0
+    assert not np.isin(np.arange(0, 1500, 50), index.query((-1000, -1000, 1000, 1000))).any()
+    for rect in random_rects(rng, 300):
+        hits = index.query(rect)
+        assert hits.tolist() == brute_force(index.bboxes, rect).tolist()
+
+
+def test_zoomed_out_returns_every_item():
+    index = GridIndex.from_points([[0, 0], [10, 10], [np.nan, 1]], 1.0)
+    assert index.query((-50, -50, 50, 50)).tolist() == [0, 1]
+    assert index.query((9, 9, 11, 11)).tolist() == [1]
+    assert index.query((2, 2, 3, 3)).tolist() == []
+
+
+def test_empty_index():
+    index = GridIndex.from_points(np.zeros((0, 2)), 1.0)
+    assert index.query((0, 0, 1, 1)).tolist() == []
@@ -0,0 +1,64 @@
+import heapq
+
+import numpy as np
+import pytest
+
+from timetable import Timetable
+
+
+def reference_arrival(timetable, source, target, depart_after, closed):
+    # Time-dependent Dijkstra over airports: from an airport reached at time t every flight
+    # leaving at or after t plus its connection time can be taken, the origin needs none.
+    # Earlier arrival never boards fewer flights, so the first time an airport is settled
+    # is its earliest arrival.
+    arrival = {source: depart_after}
+    heap = [(depart_after, source)]
+    settled = set()
+    while heap:
+        t, u = heapq.heappop(heap)
+        if u in settled:
+            continue
+        settled.add(u)
+        if u == target:
+            return t
+        ready = t if u == source else t + timetable.min_connection[u]
+        for c in np.flatnonzero((timetable.origins == u) & (timetable.departures >= ready) & ~closed):
+            v, a = int(timetable.destinations[c]), float(timetable.arrivals[c])
+            if a < arrival.get(v, float('inf')):
+                arrival[v] = a
+                heapq.heappush(heap, (a, v))
+    return None
+
+
+@pytest.fixture(scope='module')
+def timetable(network):
+    ends = network.csr.endpoints
+    edges = np.vstack([ends, ends[:, ::-1]])
+    weights = np.concatenate([network.csr.edge_weights, network.csr.edge_weights])
+    return Timetable.synthetic(network.csr.airports, edges, weights, days=3, seed=5)
+
+
+@pytest.mark.parametrize('closure', [(None, None), ('S0007', None), (None, 'S0000-S0001')])
+def test_matches_time_dependent_dijkstra(timetable, closure):
+    rng = np.random.default_rng(6)
+    closed = timetable.closed_connections(*closure)
+    for _ in range(40):
+        source, target = rng.choice(len(timetable.airports), 2, replace=False).tolist()
+        depart_after = float(rng.uniform(0, 24))
+        journey = timetable.earliest_arrival(timetable.airports[source], timetable.airports[target],
+                                             depart_after, *closure)
+        expected = reference_arrival(timetable, source, target, depart_after, closed)
+        if expected is None:
+            assert journey is None
+            continue
+        assert journey.arrival == pytest.approx(expected, rel=1e-12)
+
+        # The legs chain up, respect connection times and fly open flights
+        assert journey.legs[0].origin == timetable.airports[source]
+        assert journey.legs[-1].destination == timetable.airports[target]
+        assert journey.departure >= depart_after
+        for leg, after in zip(journey.legs, journey.legs[1:]):
+            assert after.origin == leg.destination
+            assert after.departure >= leg.arrival + timetable.min_connection[timetable.index[leg.destination]]
+        for leg in journey.legs:
+            assert closure[0] not in (leg.origin, leg.destination)
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from viewport import Viewport, bundle_segments, most_important
+
+SCREEN = (100, 50, 800, 600)
+
+
+@pytest.fixture
+def viewport():
+    return Viewport((-40.0, 10.0), 3.7, SCREEN)
+
+
+def test_world_screen_round_trip(viewport):
+    rng = np.random.default_rng(0)
+    world = rng.uniform([-150, -60], [60, 80], size=(200, 2))
+    screen = viewport.to_screen(world)
+    back = np.array([viewport.to_world(point) for point in screen])
+    # Screen points are whole pixels, so the way back is off by at most half a pixel
+    assert np.abs(back - world).max() <= 0.5 / viewport.scale + 1e-9
+
+    pixels = rng.integers([100, 50], [900, 650], size=(200, 2))
+    assert (viewport.to_screen([viewport.to_world(pixel) for pixel in pixels]) == pixels).all()
+    assert viewport.to_screen_point(viewport.center) == (500, 350)
+
+
+def test_world_rect_covers_the_screen(viewport):
+    minx, miny, maxx, maxy = viewport.world_rect
+    assert viewport.to_screen_point((minx, miny)) == (100, 50)
+    assert viewport.to_screen_point((maxx, maxy)) == (900, 650)
+
+
+def test_fit_shows_every_point():
+    points = np.array([[-120.0, -45.0], [30.0, 10.0], [5.0, -60.0], [np.nan, 3.0]])
+    viewport = Viewport.fit(points, SCREEN, margin=60)
+    screen = viewport.to_screen(points[:3])
+    assert (screen >= [160, 110]).all() and (screen <= [840, 590]).all()
+    # The wider side fills the screen up to the margin
+    assert screen[:, 0].min() == 160 and screen[:, 0].max() == 840
+    # No finite points at all still gives a usable view
+    assert Viewport.fit([[np.nan, np.nan]], SCREEN).scale > 0
+
+
+def test_pan_and_zoom(viewport):
+    point = (-30.0, 20.0)
+    x, y = viewport.to_screen_point(point)
+    assert viewport.panned(15, -8).to_screen_point(point) == (x + 15, y - 8)
+
+    anchor = (640, 210)
+    under_anchor = viewport.to_world(anchor)
+    zoomed = viewport.zoomed(2.5, anchor)
+    assert zoomed.scale == pytest.approx(viewport.scale * 2.5)
+    assert zoomed.to_world(anchor) == pytest.approx(under_anchor)
+    assert viewport.zoomed(1e6, anchor, max_scale=50).scale == 50
+    assert viewport.zoomed(1e-6, min_scale=0.5).center == viewport.center
+
+
+def test_most_important():
+    ids = np.array([3, 5, 8, 9, 12])
+    importance = np.zeros(13)
+    importance[[5, 9, 12]] = [10, 30, 20]
+    assert most_important(ids, importance, 3).tolist() == [5, 9, 12]
+    assert most_important(ids, importance, 10) is ids
+
+
+def test_bundle_segments():
+    # The same on-screen line both ways, one a pixel off, and a segment inside one cell
+    starts = np.array([[0, 0], [41, 1], [5, 5]])
+    ends = np.array([[40, 0], [1, 0], [6, 6]])
+    assert bundle_segments(starts, ends, 4).tolist() == [[2, 2, 42, 2]]
@@ -0,0 +1,173 @@
+import argparse
+from collections import namedtuple
+
+import numpy as np
+
+from graph_cache import load_edge_list
+from routing import DATA_PATH, parse_route
+
+
+# Minimum connection time in hours, hubs get longer ones
+MIN_CONNECTION_HOURS = 0.5
+HUB_CONNECTION_HOURS = 1.0
+HUB_PERCENTILE = 95
+
+Leg = namedtuple('Leg', ['origin', 'destination', 'departure', 'arrival'])
+Journey = namedtuple('Journey', ['legs', 'departure', 'arrival'])
+
+
+def format_clock(hours):
+    # Hours since the start of the timetable as "day D HH:MM"
+    minutes = int(round(hours * 60))
+    day, minutes = divmod(minutes, 24 * 60)
+    return f"day {day} {minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def parse_clock(text):
+    # "HH:MM" on day 0, or "D HH:MM"
+    day, _, clock = text.strip().rpartition(' ')
+    hours, _, minutes = clock.partition(':')
+    return int(day or 0) * 24 + int(hours) + int(minutes or 0) / 60
+
+
+class Timetable:
+    # Directed flights as connection arrays sorted by departure time, queried with the
+    # connection scan algorithm. Times are hours since the start of day 0. Every flight
+    # is its own trip, so changing planes always needs the airport's minimum connection
+    # time, except at the origin.
+
+    def __init__(self, airports, origins, destinations, departures, arrivals, min_connection):
+        self.airports = list(airports)
+        self.index = {airport: i for i, airport in enumerate(self.airports)}
+        order = np.argsort(departures, kind='stable')
+        self.origins = np.asarray(origins, dtype=np.int32)[order]
+        self.destinations = np.asarray(destinations, dtype=np.int32)[order]
+        self.departures = np.asarray(departures, dtype=np.float64)[order]
+        self.arrivals = np.asarray(arrivals, dtype=np.float64)[order]
+        self.min_connection = np.asarray(min_connection, dtype=np.float64)
+
+        # The scan loop runs on plain lists, indexing numpy scalars costs far more
+        self._connections = (self.origins.tolist(), self.destinations.tolist(),
+                             self.departures.tolist(), self.arrivals.tolist())
+
+    @classmethod
+    def synthetic(cls, airports, edges, weights, days=2, seed=0):
+        # OpenFlights has routes but no schedules. Each directed route gets 1-4 daily
+        # flights spread evenly over the day from a random first departure, with the
+        # route's flight time as duration. Busier airports get hub connection times.
+        rng = np.random.default_rng(seed)
+        edges = np.asarray(edges).reshape(-1, 2)
+        weights = np.asarray(weights, dtype=np.float64)
+        per_day = rng.integers(1, 5, len(edges))
+        first = rng.uniform(0, 24, len(edges)) / per_day
+
+        flights = np.repeat(np.arange(len(edges)), per_day * days)
+        # n-th flight of its route, counted across all days
+        nth = np.arange(len(flights)) - np.repeat(np.cumsum(per_day * days) - per_day * days, per_day * days)
+        departures = first[flights] + nth * 24 / per_day[flights]
+
+        degrees = np.bincount(edges.ravel(), minlength=len(airports))
+        min_connection = np.where(degrees > np.percentile(degrees, HUB_PERCENTILE),
+                                  HUB_CONNECTION_HOURS, MIN_CONNECTION_HOURS)
+        return cls(airports, edges[flights, 0], edges[flights, 1], departures,
+                   departures + weights[flights], min_connection)
+
+    @property
+    def num_connections(self):
+        return len(self.departures)
+
+    def closed_connections(self, airport_closure=None, route_closure=None):
+        # Flights touching the closed airport or flying the closed route, in either direction
+        closed = np.zeros(self.num_connections, dtype=bool)
+        if airport_closure in self.index:
+            c = self.index[airport_closure]
+            closed |= (self.origins == c) | (self.destinations == c)
+        route_closure = parse_route(route_closure)
+        if route_closure is not None and all(airport in self.index for airport in route_closure):
+            a, b = (self.index[airport] for airport in route_closure)
+            closed |= ((self.origins == a) & (self.destinations == b)) | ((self.origins == b) & (self.destinations == a))
+        return closed
+
+    def earliest_arrival(self, start_airport, end_airport, depart_after=0.0,
+                         airport_closure=None, route_closure=None, stats=None):
+        if start_airport not in self.index or end_airport not in self.index:
+            return None
+        source, target = self.index[start_airport], self.index[end_airport]
+        if source == target:
+            return Journey([], depart_after, depart_after)
+
+        origins, destinations, departures, arrivals = self._connections
+        closed = None
+        if airport_closure is not None or route_closure is not None:
+            closed = self.closed_connections(airport_closure, route_closure).tolist()
+
+        n = len(self.airports)
+        min_connection = self.min_connection.tolist()
+        arrival = [float('inf')] * n
+        # Earliest time a flight out of each airport can be boarded
+        ready = [float('inf')] * n
+        arrival[source] = ready[source] = depart_after
+        via = [-1] * n
+
+        # Connections are sorted by departure, so the scan starts at the first one leaving
+        # after depart_after and stops once nothing left can beat the best arrival at target
+        first = int(np.searchsorted(self.departures, depart_after, side='left'))
+        scanned = 0
+        for c in range(first, len(departures)):
+            departure = departures[c]
+            if departure >= arrival[target]:
+                break
+            scanned += 1
+            u = origins[c]
+            if departure < ready[u] or (closed is not None and closed[c]):
+                continue
+            v = destinations[c]
+            if arrivals[c] < arrival[v]:
+                arrival[v] = arrivals[c]
+                ready[v] = arrivals[c] + min_connection[v]
+                via[v] = c
+
+        if stats is not None:
+            stats['connections_scanned'] = scanned
+        if arrival[target] == float('inf'):
+            return None
+
+        legs = []
+        stop = target
+        while stop != source:
+            c = via[stop]
+            legs.append(Leg(self.airports[origins[c]], self.airports[destinations[c]],
+                            departures[c], arrivals[c]))
+            stop = origins[c]
+        legs.reverse()
+        return Journey(legs, legs[0].departure, legs[-1].arrival)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Earliest arrival over a synthetic flight timetable")
+    parser.add_argument('start')
+    parser.add_argument('end')
+    parser.add_argument('--depart', default='0:00', help="earliest departure, HH:MM or 'D HH:MM'")
+    parser.add_argument('--days', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--airport-closure')
+    parser.add_argument('--route-closure')
+    parser.add_argument('--data', default=DATA_PATH)
+    args = parser.parse_args(argv)
+
+    airports, edges, weights = load_edge_list(args.data)[:3]
+    timetable = Timetable.synthetic(airports, edges, weights, args.days, args.seed)
+    journey = timetable.earliest_arrival(args.start, args.end, parse_clock(args.depart),
+                                         args.airport_closure, args.route_closure)
+    if journey is None:
+        print("No valid path available!")
+        return
+
+    for leg in journey.legs:
+        print(f"{leg.origin} -> {leg.destination}  {format_clock(leg.departure)} - {format_clock(leg.arrival)}")
+    print(f"Arrives {format_clock(journey.arrival)}, "
+          f"{journey.arrival - parse_clock(args.depart):.2f}h after the requested departure")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import numpy as np
+
+
+class Viewport:
+    # Maps projected world coordinates onto a screen rectangle with a uniform scale.
+    # Immutable: panning and zooming return a new viewport, so it can key render caches.
+    def __init__(self, center, scale, screen_rect):
+        self.center = (float(center[0]), float(center[1]))
+        self.scale = float(scale)
+        self.screen_rect = screen_rect
+
+    @classmethod
+    def fit(cls, points, screen_rect, margin=60, min_span=1.0):
+        # Smallest view that shows every point with `margin` pixels to spare
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        points = points[np.isfinite(points).all(axis=1)]
+        if len(points) == 0:
+            points = np.zeros((1, 2))
+        low, high = points.min(axis=0), points.max(axis=0)
+        span = np.maximum(high - low, min_span)
+        x, y, width, height = screen_rect
+        scale = min((width - 2 * margin) / span[0], (height - 2 * margin) / span[1])
+        return cls((low + high) / 2, scale, screen_rect)
+
+    @property
+    def world_rect(self):
+        x, y, width, height = self.screen_rect
+        half_w, half_h = width / 2 / self.scale, height / 2 / self.scale
+        return (self.center[0] - half_w, self.center[1] - half_h,
+                self.center[0] + half_w, self.center[1] + half_h)
+
+    def to_screen(self, points):
+        points = np.asarray(points, dtype=np.float64)
+        x, y, width, height = self.screen_rect
+        origin = np.array([x + width / 2, y + height / 2])
+        return np.rint((points - self.center) * self.scale + origin).astype(int)
+
+    def to_screen_point(self, point):
+        sx, sy = self.to_screen(point).tolist()
+        return sx, sy
+
+    def to_world(self, point):
+        x, y, width, height = self.screen_rect
+        return (self.center[0] + (point[0] - x - width / 2) / self.scale,
+                self.center[1] + (point[1] - y - height / 2) / self.scale)
+
+    def panned(self, dx, dy):
+        # Drag the map by (dx, dy) screen pixels
+        return Viewport((self.center[0] - dx / self.scale, self.center[1] - dy / self.scale),
+                        self.scale, self.screen_rect)
+
+    def zoomed(self, factor, anchor=None, min_scale=0.0, max_scale=float('inf')):
+        # Scale by `factor` keeping the world point under the screen point `anchor` in place
+        scale = min(max(self.scale * factor, min_scale), max_scale)
+        if anchor is None:
+            return Viewport(self.center, scale, self.screen_rect)
+        wx, wy = self.to_world(anchor)
+        ratio = self.scale / scale
+        return Viewport((wx + (self.center[0] - wx) * ratio, wy + (self.center[1] - wy) * ratio),
+                        scale, self.screen_rect)
+
+
+def most_important(ids, importance, limit):
+    # At most `limit` of the ids, those with the highest importance, in id order
+    if len(ids) <= limit:
+        return ids
+    keep = np.argpartition(-importance[ids], limit - 1)[:limit]
+    return np.sort(ids[keep])
+
+
+def bundle_segments(starts, ends, pixels):
+    # Snap screen segments to a `pixels` grid and merge the ones that then coincide, in
+    # either direction, so a dense view draws each on-screen line once
+    starts = np.asarray(starts) // pixels
+    ends = np.asarray(ends) // pixels
+    swap = (starts[:, 0] > ends[:, 0]) | ((starts[:, 0] == ends[:, 0]) & (starts[:, 1] > ends[:, 1]))
+    first = np.where(swap[:, None], ends, starts)
+    second = np.where(swap[:, None], starts, ends)
+    keys = np.unique(np.hstack([first, second]), axis=0)
+    keys = keys[(keys[:, 0] != keys[:, 2]) | (keys[:, 1] != keys[:, 3])]
+    return keys * pixels + pixels // 2
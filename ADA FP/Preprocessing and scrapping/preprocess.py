@@ -0,0 +1,150 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc
+import pyarrow.parquet
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'Algorithms'))
+
+from geo import AVERAGE_SPEED_KMH, haversine  # noqa: E402
+
+
+ROUTES_URL = "https://raw.githubusercontent.com/jpatokal/openflights/master/data/routes.dat"
+AIRPORTS_URL = "https://raw.githubusercontent.com/jpatokal/openflights/master/data/airports.dat"
+OUTPUT_PATH = os.path.join(HERE, 'routes and distances.parquet')
+
+ROUTE_COLUMNS = [
+    "Airline", "AirlineID", "SourceAirport", "SourceAirportID",
+    "DestinationAirport", "DestinationAirportID", "Codeshare",
+    "Stops", "Equipment"
+]
+AIRPORT_COLUMNS = [
+    "AirportID", "Name", "City", "Country", "IATA", "ICAO", "Latitude",
+    "Longitude", "Altitude", "Timezone", "DST", "TzDatabaseTimeZone",
+    "Type", "Source"
+]
+STRING_COLUMNS = ["Airline", "SourceAirport", "DestinationAirport", "Equipment"]
+
+# Same columns as the notebook's CSV, except flight time is stored as decimal hours
+# instead of an "Xh Ym" string
+OUTPUT_SCHEMA = pa.schema([
+    ('Airline', pa.string()),
+    ('SourceAirport', pa.string()),
+    ('SourceAirportID', pa.float64()),
+    ('DestinationAirport', pa.string()),
+    ('DestinationAirportID', pa.float64()),
+    ('Stops', pa.int32()),
+    ('Equipment', pa.string()),
+    ('SourceType', pa.string()),
+    ('DestinationType', pa.string()),
+    ('SourceLatitude', pa.float64()),
+    ('SourceLongitude', pa.float64()),
+    ('DestinationLatitude', pa.float64()),
+    ('DestinationLongitude', pa.float64()),
+    ('Distance', pa.float64()),
+    ('FlightTime_Hours', pa.float64()),
+])
+
+
+def read_airport_locations(airports_path):
+    # (Latitude, Longitude) lookups by IATA and by ICAO code, first airport wins on clashes
+    airports = pd.read_csv(airports_path, header=None, names=AIRPORT_COLUMNS,
+                           usecols=['IATA', 'ICAO', 'Latitude', 'Longitude'], na_values='\\N')
+    lookups = {}
+    for code_type in ('IATA', 'ICAO'):
+        located = airports.dropna(subset=[code_type]).drop_duplicates(code_type)
+        lookups[code_type] = located.set_index(code_type)[['Latitude', 'Longitude']]
+    return lookups
+
+
+def locate(codes, lookups):
+    # Per row: 3 letter codes are looked up as IATA, anything else as ICAO
+    is_iata = codes.str.len().to_numpy() == 3
+    by_iata = lookups['IATA'].reindex(codes).to_numpy()
+    by_icao = lookups['ICAO'].reindex(codes).to_numpy()
+    location = np.where(is_iata[:, None], by_iata, by_icao)
+    code_type = np.where(is_iata, 'IATA', 'ICAO')
+    return code_type, location[:, 0], location[:, 1]
+
+
+def process_chunk(routes, lookups):
+    routes = routes.dropna(subset=['SourceAirport', 'DestinationAirport'])
+    source_type, source_lat, source_lon = locate(routes['SourceAirport'], lookups)
+    destination_type, destination_lat, destination_lon = locate(routes['DestinationAirport'], lookups)
+    distance = haversine(source_lat, source_lon, destination_lat, destination_lon)
+
+    chunk = pd.DataFrame({
+        'Airline': routes['Airline'].to_numpy(),
+        'SourceAirport': routes['SourceAirport'].to_numpy(),
+        'SourceAirportID': routes['SourceAirportID'].to_numpy(dtype=np.float64),
+        'DestinationAirport': routes['DestinationAirport'].to_numpy(),
+        'DestinationAirportID': routes['DestinationAirportID'].to_numpy(dtype=np.float64),
+        'Stops': routes['Stops'].fillna(0).to_numpy(dtype=np.int32),
+        'Equipment': routes['Equipment'].to_numpy(),
+        'SourceType': source_type,
+        'DestinationType': destination_type,
+        'SourceLatitude': source_lat,
+        'SourceLongitude': source_lon,
+        'DestinationLatitude': destination_lat,
+        'DestinationLongitude': destination_lon,
+        'Distance': distance,
+        'FlightTime_Hours': distance / AVERAGE_SPEED_KMH,
+    })
+    return chunk[~np.isnan(distance)]
+
+
+def open_writer(output_path):
+    if output_path.endswith('.feather'):
+        return pa.ipc.new_file(output_path, OUTPUT_SCHEMA)
+    return pa.parquet.ParquetWriter(output_path, OUTPUT_SCHEMA)
+
+
+def build_dataset(routes_path=ROUTES_URL, airports_path=AIRPORTS_URL, output_path=OUTPUT_PATH,
+                  chunksize=20000):
+    # Streams routes.dat through in chunks and appends each one to the output file. A
+    # route keeps its first occurrence, as in the notebook, so pairs seen in earlier
+    # chunks are dropped from later ones.
+    lookups = read_airport_locations(airports_path)
+    seen = set()
+    rows = 0
+    root, extension = os.path.splitext(output_path)
+    tmp_path = root + '.tmp' + extension
+    with open_writer(tmp_path) as writer:
+        for routes in pd.read_csv(routes_path, header=None, names=ROUTE_COLUMNS, na_values='\\N',
+                                  dtype={column: str for column in STRING_COLUMNS},
+                                  chunksize=chunksize):
+            chunk = process_chunk(routes, lookups)
+            chunk = chunk.drop_duplicates(subset=['SourceAirport', 'DestinationAirport'])
+            keys = (chunk['SourceAirport'] + '-' + chunk['DestinationAirport']).tolist()
+            fresh = np.fromiter((key not in seen for key in keys), dtype=bool, count=len(keys))
+            chunk = chunk[fresh]
+            seen.update(keys)
+            if len(chunk):
+                writer.write_table(pa.Table.from_pandas(chunk, schema=OUTPUT_SCHEMA, preserve_index=False))
+            rows += len(chunk)
+    # Only replace the old dataset once the new one is complete
+    os.replace(tmp_path, output_path)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the routes and distances dataset from OpenFlights")
+    parser.add_argument('--routes', default=ROUTES_URL, help="routes.dat path or URL")
+    parser.add_argument('--airports', default=AIRPORTS_URL, help="airports.dat path or URL")
+    parser.add_argument('--output', default=OUTPUT_PATH, help=".parquet or .feather file to write")
+    parser.add_argument('--chunksize', type=int, default=20000)
+    args = parser.parse_args(argv)
+
+    start_time = time.perf_counter()
+    rows = build_dataset(args.routes, args.airports, args.output, args.chunksize)
+    print(f"Wrote {rows} routes to {args.output} in {time.perf_counter() - start_time:.1f}s")
+
+
+if __name__ == "__main__":
+    main()